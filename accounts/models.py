@@ -22,6 +22,12 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Регистрации по дням (аналитика)
+            models.Index(fields=['date_joined'], name='user_date_joined_idx'),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.email})"
 
@@ -9,6 +9,8 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model, logout
 from django.contrib.auth.decorators import login_required
 from orders.models import Order
+from orders import guest_cart
+from orders.cart_cache import refresh_cart_cache
 from orders.serializers import OrderSerializer
 from .serializers import (
     UserSerializer, 
@@ -42,6 +44,16 @@ class CustomTokenObtainPairView(TokenObtainPairView):
             if user:
                 user_data = UserSerializer(user).data
                 response.data['user'] = user_data
+                
+                # Переносим гостевую корзину одним пакетом
+                cart_token = guest_cart.get_request_token(request)
+                if cart_token:
+                    adjustments = guest_cart.merge_guest_cart(user, cart_token)
+                    if adjustments is not None:
+                        refresh_cart_cache(user.id)
+                        response.data['cart_merge'] = {'adjustments': adjustments}
+                    # Перенесённый, пустой или просроченный — токен больше не нужен
+                    guest_cart.drop_client_token(response)
         
         return response
 
@@ -79,7 +91,7 @@ class UserOrderHistoryView(generics.ListAPIView):
     
     def get_queryset(self):
         """Return orders for the current user."""
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+        return Order.objects.filter(user=self.request.user).prefetch_related('items').order_by('-created_at')
 
 
 @api_view(['POST'])
@@ -116,7 +128,7 @@ def user_dashboard_view(request):
     order_count = orders.count()
     
     # Get recent orders (last 5)
-    recent_orders = orders.order_by('-created_at')[:5]
+    recent_orders = orders.prefetch_related('items').order_by('-created_at')[:5]
     
     return Response({
         'user': UserSerializer(user).data,
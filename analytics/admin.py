@@ -1,9 +1,45 @@
 from django.contrib import admin
-from .models import CartAnalytics
+from .models import CartAnalytics, DailySales, InventoryForecast
 
 
 @admin.register(CartAnalytics)
 class CartAnalyticsAdmin(admin.ModelAdmin):
-    list_display = ('date', 'total_carts', 'total_items', 'total_value')
-    list_filter = ('date',)
-    readonly_fields = ('date',)
\ No newline at end of file
+    list_display = (
+        'bucket', 'granularity', 'total_carts', 'total_items', 'total_value',
+        'abandoned_carts', 'abandoned_value'
+    )
+    list_filter = ('granularity', 'date')
+    readonly_fields = ('date', 'bucket', 'granularity')
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = (
+        'date', 'orders_count', 'paid_orders_count', 'revenue',
+        'items_sold', 'new_users', 'new_customers'
+    )
+    date_hierarchy = 'date'
+
+    # Строки пересчитываются из заказов (backfill_sales_rollups), вручную не правятся
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(InventoryForecast)
+class InventoryForecastAdmin(admin.ModelAdmin):
+    list_display = (
+        'product', 'status', 'available_quantity', 'daily_velocity',
+        'days_of_cover', 'reorder_quantity', 'computed_at'
+    )
+    list_filter = ('status',)
+    search_fields = ('product__name',)
+
+    # Строки пишет compute_inventory_forecasts
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
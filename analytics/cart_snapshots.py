@@ -0,0 +1,102 @@
+"""
+Cart statistics: one aggregate over cart items, hourly/daily snapshots and trends.
+
+``snapshot_cart_analytics`` (run hourly) stores the current totals in the
+hour bucket and overwrites the day bucket, so a day row ends up holding the
+last snapshot of that day. Live statistics are the same aggregate, cached for
+``CART_STATS_CACHE_TTL`` seconds.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from orders.models import CartItem
+from .models import CartAnalytics
+
+CART_STATS_CACHE_KEY = 'analytics:cart-stats'
+
+GRANULARITIES = ('hour', 'day')
+
+
+def cart_totals(now=None):
+    """
+    Totals over all carts with items, and over abandoned ones, in a single query.
+
+    A cart is abandoned when it has not changed for ``CART_ABANDONED_AFTER_HOURS``.
+    """
+    now = now or timezone.now()
+    threshold = now - timedelta(hours=getattr(settings, 'CART_ABANDONED_AFTER_HOURS', 1))
+    abandoned = Q(cart__updated_at__lt=threshold)
+    value = F('quantity') * F('product__price')
+    money = DecimalField(max_digits=12, decimal_places=2)
+
+    return CartItem.objects.aggregate(
+        total_carts=Count('cart_id', distinct=True),
+        total_items=Coalesce(Sum('quantity'), 0),
+        total_value=Coalesce(Sum(value, output_field=money), Decimal('0'), output_field=money),
+        abandoned_carts=Count('cart_id', distinct=True, filter=abandoned),
+        abandoned_items=Coalesce(Sum('quantity', filter=abandoned), 0),
+        abandoned_value=Coalesce(
+            Sum(value, filter=abandoned, output_field=money), Decimal('0'), output_field=money
+        ),
+    )
+
+
+def live_cart_stats():
+    """Current cart totals, cached briefly so dashboards don't re-aggregate on every poll."""
+    stats = cache.get(CART_STATS_CACHE_KEY)
+    if stats is None:
+        stats = {**cart_totals(), 'computed_at': timezone.now()}
+        cache.set(CART_STATS_CACHE_KEY, stats, getattr(settings, 'CART_STATS_CACHE_TTL', 60))
+    return stats
+
+
+def bucket_start(moment, granularity):
+    """Start of the local hour or day containing ``moment``."""
+    local = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        local = local.replace(hour=0)
+    return local
+
+
+def take_cart_snapshot(now=None):
+    """Write the current totals into this hour's and this day's rows."""
+    now = now or timezone.now()
+    totals = cart_totals(now)
+    for granularity in GRANULARITIES:
+        bucket = bucket_start(now, granularity)
+        CartAnalytics.objects.update_or_create(
+            granularity=granularity,
+            bucket=bucket,
+            defaults={**totals, 'date': bucket.date()}
+        )
+    cache.set(
+        CART_STATS_CACHE_KEY,
+        {**totals, 'computed_at': now},
+        getattr(settings, 'CART_STATS_CACHE_TTL', 60)
+    )
+    return totals
+
+
+def cart_trends(granularity, since):
+    """Snapshot rows from ``since`` with average basket size and value."""
+    rows = []
+    for snapshot in CartAnalytics.objects.filter(granularity=granularity, bucket__gte=since):
+        carts = snapshot.total_carts
+        rows.append({
+            'bucket': snapshot.bucket.isoformat(),
+            'total_carts': carts,
+            'total_items': snapshot.total_items,
+            'total_value': float(snapshot.total_value),
+            'avg_basket_items': round(snapshot.total_items / carts, 2) if carts else 0,
+            'avg_basket_value': round(float(snapshot.total_value) / carts, 2) if carts else 0,
+            'abandoned_carts': snapshot.abandoned_carts,
+            'abandoned_items': snapshot.abandoned_items,
+            'abandoned_value': float(snapshot.abandoned_value),
+        })
+    return rows
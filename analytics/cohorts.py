@@ -0,0 +1,149 @@
+"""
+Cohort and retention analytics.
+
+Users are grouped by signup month. For each cohort we report conversion,
+repeat-purchase rate, median time to first order, a retention row (share of
+the cohort ordering in each month after signup) and an LTV curve (cumulative
+paid revenue per cohort user).
+
+Everything comes from two queries: cohort sizes, and one windowed extract of
+the cohorts' orders (first-order time and order number per user computed by
+the database). The extract is folded in a single Python pass and the result
+is cached for ``COHORT_CACHE_TTL`` seconds.
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from statistics import median
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, F, Min, Window
+from django.db.models.functions import RowNumber, TruncMonth
+from django.utils import timezone
+
+from orders.models import Order
+
+User = get_user_model()
+
+COHORT_CACHE_KEY = 'analytics:cohorts:{months}'
+MAX_COHORT_MONTHS = 36
+
+
+def _month_index(moment):
+    local = timezone.localtime(moment)
+    return local.year * 12 + local.month - 1
+
+
+def _month_label(index):
+    return f'{index // 12:04d}-{index % 12 + 1:02d}'
+
+
+def _percent(part, whole):
+    return round(part / whole * 100, 1) if whole else 0
+
+
+def cohort_start(months, now=None):
+    """Aware start of the signup month ``months - 1`` months before the current one."""
+    index = _month_index(now or timezone.now()) - (months - 1)
+    return timezone.make_aware(datetime(index // 12, index % 12 + 1, 1))
+
+
+def compute_cohorts(months=12, now=None):
+    """Cohort table for users who signed up in the last ``months`` months."""
+    now = now or timezone.now()
+    current = _month_index(now)
+    start = cohort_start(months, now)
+
+    sizes = {
+        _month_index(row['month']): row['users']
+        for row in User.objects.filter(date_joined__gte=start)
+        .annotate(month=TruncMonth('date_joined'))
+        .values('month')
+        .annotate(users=Count('id'))
+        .order_by()
+    }
+
+    extract = (
+        Order.objects
+        .filter(user__date_joined__gte=start)
+        .exclude(status='cancelled')
+        .annotate(
+            first_order_at=Window(Min('created_at'), partition_by=[F('user_id')]),
+            order_number_for_user=Window(
+                RowNumber(), partition_by=[F('user_id')], order_by=F('created_at').asc()
+            ),
+        )
+        .values_list(
+            'user_id', 'user__date_joined', 'created_at', 'first_order_at',
+            'order_number_for_user', 'total_amount', 'payment_status'
+        )
+    )
+
+    buyers = defaultdict(set)
+    repeaters = defaultdict(set)
+    days_to_first = defaultdict(list)
+    active = defaultdict(lambda: defaultdict(set))
+    revenue = defaultdict(lambda: defaultdict(Decimal))
+
+    for user_id, joined, created, first_order_at, number, amount, payment_status in extract:
+        cohort = _month_index(joined)
+        offset = _month_index(created) - cohort
+        if number == 1:
+            buyers[cohort].add(user_id)
+            days_to_first[cohort].append((first_order_at - joined).total_seconds() / 86400)
+        elif number == 2:
+            repeaters[cohort].add(user_id)
+        active[cohort][offset].add(user_id)
+        if payment_status == 'paid':
+            revenue[cohort][offset] += amount
+
+    cohorts = []
+    for cohort in range(current - months + 1, current + 1):
+        size = sizes.get(cohort, 0)
+        span = current - cohort + 1
+        cumulative = Decimal('0')
+        ltv = []
+        for offset in range(span):
+            cumulative += revenue[cohort][offset]
+            ltv.append(round(float(cumulative) / size, 2) if size else 0)
+        cohorts.append({
+            'cohort': _month_label(cohort),
+            'users': size,
+            'buyers': len(buyers[cohort]),
+            'conversion_rate': _percent(len(buyers[cohort]), size),
+            'repeat_rate': _percent(len(repeaters[cohort]), len(buyers[cohort])),
+            'median_days_to_first_order': (
+                round(median(days_to_first[cohort]), 1) if days_to_first[cohort] else None
+            ),
+            'retention': [
+                _percent(len(active[cohort][offset]), size) for offset in range(span)
+            ],
+            'ltv': ltv,
+        })
+
+    total_users = sum(row['users'] for row in cohorts)
+    total_buyers = sum(row['buyers'] for row in cohorts)
+    total_repeaters = sum(len(users) for users in repeaters.values())
+    return {
+        'months': months,
+        'cohorts': cohorts,
+        'totals': {
+            'users': total_users,
+            'buyers': total_buyers,
+            'conversion_rate': _percent(total_buyers, total_users),
+            'repeat_rate': _percent(total_repeaters, total_buyers),
+        },
+        'computed_at': now.isoformat(),
+    }
+
+
+def cohort_report(months=12):
+    """Cached ``compute_cohorts``."""
+    key = COHORT_CACHE_KEY.format(months=months)
+    report = cache.get(key)
+    if report is None:
+        report = compute_cohorts(months)
+        cache.set(key, report, getattr(settings, 'COHORT_CACHE_TTL', 60 * 60))
+    return report
@@ -0,0 +1,344 @@
+"""
+Admin dashboard widgets.
+
+Each section of the dashboard is a widget with its own cache TTL and
+invalidation triggers:
+
+* orders, revenue, top, users — read the daily rollups; dropped by
+  ``refresh_daily_rollups``;
+* products — dropped on product/category writes and by
+  ``compute_inventory_forecasts``;
+* recent_orders — dropped on order writes and bulk transitions;
+* carts — short TTL only (``live_cart_stats`` is cached itself).
+
+Cache keys include the local date, so day-relative figures ("today", "last
+30 days") roll over at midnight. ``dashboard_widgets`` assembles widgets from
+cache and computes the misses in a thread pool, one DB connection per
+thread. Under ``DB_POOL_MODE=pool`` those threads share the worker's psycopg
+pool with the gunicorn request threads, so only the pool's headroom
+(``max_size - GUNICORN_THREADS``) is used. Every widget reports how long it
+took to compute.
+"""
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from orders.models import Order
+from products.models import Category, Product
+from .cart_snapshots import live_cart_stats
+from .inventory import forecast_payload
+from .models import DailyOrderStatus, DailyProductSales, DailySales, InventoryForecast
+
+# Виджеты, которые читают дневные агрегаты
+ROLLUP_WIDGETS = ('orders', 'revenue', 'top', 'users')
+
+
+def _in_range(date_from, date_to=None):
+    condition = Q(date__gte=date_from)
+    if date_to is not None:
+        condition &= Q(date__lt=date_to)
+    return condition
+
+
+def _sales_totals(**aggregates):
+    totals = DailySales.objects.aggregate(**aggregates)
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def orders_widget(today):
+    totals = _sales_totals(
+        total=Sum('orders_count'),
+        today=Sum('orders_count', filter=Q(date=today)),
+        week=Sum('orders_count', filter=_in_range(today - timedelta(days=7))),
+        month=Sum('orders_count', filter=_in_range(today - timedelta(days=30))),
+    )
+
+    # Заказы по статусам и по статусу оплаты
+    by_field = {'status': {}, 'payment_status': {}}
+    raw_statuses = (
+        DailyOrderStatus.objects
+        .values('field', 'value')
+        .annotate(cnt=Sum('count'))
+        .order_by()
+    )
+    for entry in raw_statuses:
+        if entry['cnt']:
+            by_field[entry['field']][entry['value']] = entry['cnt']
+
+    return {
+        'orders': {
+            **totals,
+            'by_status': by_field['status'],
+            'by_payment': by_field['payment_status'],
+        },
+    }
+
+
+def revenue_widget(today):
+    month_ago = today - timedelta(days=30)
+    totals = _sales_totals(
+        paid_total=Sum('paid_orders_count'),
+        revenue_total=Sum('revenue'),
+        revenue_month=Sum('revenue', filter=_in_range(month_ago)),
+        revenue_prev_month=Sum('revenue', filter=_in_range(today - timedelta(days=60), month_ago)),
+    )
+    # Выручка только по оплаченным
+    revenue_total = float(totals['revenue_total'])
+    revenue_month = float(totals['revenue_month'])
+    revenue_prev_month = float(totals['revenue_prev_month'])
+    avg_order = revenue_total / totals['paid_total'] if totals['paid_total'] else 0
+
+    revenue_growth = 0
+    if revenue_prev_month > 0:
+        revenue_growth = round(((revenue_month - revenue_prev_month) / revenue_prev_month) * 100, 1)
+
+    revenue_by_day = []
+    raw_revenue = DailySales.objects.filter(
+        date__gte=month_ago, paid_orders_count__gt=0
+    ).values('date', 'revenue', 'paid_orders_count')
+    for item in raw_revenue:
+        revenue_by_day.append({
+            'date': item['date'].isoformat(),
+            'revenue': float(item['revenue']),
+            'count': item['paid_orders_count'],
+        })
+
+    return {
+        'revenue': {
+            'total': revenue_total,
+            'month': revenue_month,
+            'prev_month': revenue_prev_month,
+            'growth_percent': revenue_growth,
+            'average_order': round(avg_order, 2),
+            'by_day': revenue_by_day,
+        },
+    }
+
+
+def top_widget(today):
+    month_ago = today - timedelta(days=30)
+    top_products = []
+    raw_top = (
+        DailyProductSales.objects
+        .filter(date__gte=month_ago)
+        .values('product_id', 'product_name')
+        .annotate(total_sold=Sum('quantity'), total_revenue=Sum('revenue'))
+        .order_by('-total_sold')[:10]
+    )
+    for p in raw_top:
+        top_products.append({
+            'product__id': p['product_id'],
+            'product__name': p['product_name'],
+            'total_sold': p['total_sold'],
+            'total_revenue': float(p['total_revenue'] or 0),
+        })
+
+    top_categories = []
+    raw_categories = (
+        DailyProductSales.objects
+        .filter(date__gte=month_ago, category__isnull=False)
+        .values('category_id', 'category__name')
+        .annotate(total_sold=Sum('quantity'), total_revenue=Sum('revenue'))
+        .order_by('-total_sold')[:10]
+    )
+    for c in raw_categories:
+        top_categories.append({
+            'id': c['category_id'],
+            'name': c['category__name'],
+            'total_sold': c['total_sold'],
+            'total_revenue': float(c['total_revenue'] or 0),
+        })
+
+    return {'top_products': top_products, 'top_categories': top_categories}
+
+
+def users_widget(today):
+    totals = _sales_totals(
+        total=Sum('new_users'),
+        new_week=Sum('new_users', filter=_in_range(today - timedelta(days=7))),
+        new_month=Sum('new_users', filter=_in_range(today - timedelta(days=30))),
+        with_orders=Sum('new_customers'),
+    )
+    totals['conversion_rate'] = (
+        round((totals['with_orders'] / totals['total'] * 100), 1) if totals['total'] > 0 else 0
+    )
+    return {'users': totals}
+
+
+def products_widget(today):
+    counts = Product.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(is_active=True)),
+        out_of_stock=Count('id', filter=Q(stock_quantity=0)),
+    )
+
+    # Мало на складе — по запасу в днях из compute_inventory_forecasts
+    low_stock = InventoryForecast.objects.filter(
+        status__in=('critical', 'low'), product__is_active=True
+    )
+    low_stock_list = [
+        forecast_payload(forecast)
+        for forecast in low_stock.select_related('product').order_by('days_of_cover')[:10]
+    ]
+
+    out_of_stock_list = []
+    for p in Product.objects.filter(stock_quantity=0)[:10]:
+        out_of_stock_list.append({
+            'id': p.id,
+            'name': p.name,
+            'price': float(p.price),
+        })
+
+    # Товары по категориям
+    products_by_category = []
+    for cat in Category.objects.annotate(product_count=Count('product')).order_by('-product_count'):
+        products_by_category.append({
+            'id': cat.id,
+            'name': cat.name,
+            'product_count': cat.product_count,
+        })
+
+    return {
+        'products': {
+            **counts,
+            'low_stock': low_stock.count(),
+            'categories_count': len(products_by_category),
+            'low_stock_list': low_stock_list,
+            'out_of_stock_list': out_of_stock_list,
+            'by_category': products_by_category,
+        },
+    }
+
+
+def recent_orders_widget(today):
+    recent_orders = []
+    for order in Order.objects.select_related('user').order_by('-created_at')[:10]:
+        recent_orders.append({
+            'id': order.id,
+            'order_number': order.order_number,
+            'total_amount': float(order.total_amount),
+            'status': order.status,
+            'payment_status': order.payment_status,
+            'created_at': order.created_at.isoformat(),
+            'user__first_name': order.user.first_name if order.user else '',
+            'user__last_name': order.user.last_name if order.user else '',
+            'user__email': order.user.email if order.user else '',
+        })
+    return {'recent_orders': recent_orders}
+
+
+def carts_widget(today):
+    cart_stats = live_cart_stats()
+    return {
+        'carts': {
+            'total_carts': cart_stats['total_carts'],
+            'total_items': cart_stats['total_items'],
+            'total_value': float(cart_stats['total_value']),
+            'abandoned_carts': cart_stats['abandoned_carts'],
+            'abandoned_value': float(cart_stats['abandoned_value']),
+        },
+    }
+
+
+# Виджет -> (функция, TTL по умолчанию в секундах); TTL страхует, если сигнал не дошёл
+WIDGETS = {
+    'orders': (orders_widget, 5 * 60),
+    'revenue': (revenue_widget, 5 * 60),
+    'top': (top_widget, 15 * 60),
+    'users': (users_widget, 15 * 60),
+    'products': (products_widget, 60 * 60),
+    'recent_orders': (recent_orders_widget, 5 * 60),
+    'carts': (carts_widget, 60),
+}
+
+
+def widget_ttl(name):
+    return getattr(settings, 'DASHBOARD_WIDGET_TTLS', {}).get(name, WIDGETS[name][1])
+
+
+def _widget_key(name, today):
+    return f'analytics:widget:{name}:{today.isoformat()}'
+
+
+def invalidate_widgets(*names):
+    """Drop today's cached copies of ``names``."""
+    cache.delete_many([_widget_key(name, timezone.localdate()) for name in names])
+
+
+def invalidate_widgets_on_commit(*names):
+    transaction.on_commit(lambda: invalidate_widgets(*names))
+
+
+def _compute(name, today):
+    started = time.perf_counter()
+    data = WIDGETS[name][0](today)
+    return {
+        'data': data,
+        'ms': round((time.perf_counter() - started) * 1000, 1),
+        'computed_at': timezone.now().isoformat(),
+    }
+
+
+def _compute_in_thread(name, today):
+    try:
+        return _compute(name, today)
+    finally:
+        # Соединение потока пула не переиспользуется — закрыть (вернуть в пул psycopg)
+        connections.close_all()
+
+
+def _widget_workers(missing):
+    """Threads for ``missing`` widgets, within the DB pool's headroom."""
+    workers = min(getattr(settings, 'DASHBOARD_WIDGET_WORKERS', 4), missing)
+    pool = settings.DATABASES['default'].get('OPTIONS', {}).get('pool')
+    if pool:
+        # Пул общий с потоками запросов gunicorn: отнимать у них соединения нельзя,
+        # иначе при полной нагрузке запросы ждут DB_POOL_TIMEOUT и падают
+        options = pool if isinstance(pool, dict) else {}
+        max_size = options.get('max_size') or options.get('min_size', 4)
+        headroom = max_size - getattr(settings, 'GUNICORN_THREADS', 1)
+        workers = min(workers, max(1, headroom))
+    return workers
+
+
+def dashboard_widgets(names):
+    """
+    ``{name: {'data', 'ms', 'computed_at', 'cached'}}`` for ``names``.
+
+    Cached widgets are read with one ``get_many``; misses are computed
+    concurrently (sequentially inside a transaction, whose uncommitted rows
+    other connections would not see).
+    """
+    today = timezone.localdate()
+    keys = {name: _widget_key(name, today) for name in names}
+    cached = cache.get_many(keys.values())
+
+    results = {}
+    for name, key in keys.items():
+        if key in cached:
+            results[name] = {**cached[key], 'cached': True}
+    missing = [name for name in names if name not in results]
+
+    workers = _widget_workers(len(missing))
+    if workers > 1 and not connection.in_atomic_block:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Контекст запроса (чтение с реплики) — в каждый поток
+            futures = {
+                name: executor.submit(contextvars.copy_context().run, _compute_in_thread, name, today)
+                for name in missing
+            }
+            computed = {name: future.result() for name, future in futures.items()}
+    else:
+        computed = {name: _compute(name, today) for name in missing}
+
+    for name, result in computed.items():
+        cache.set(keys[name], result, widget_ttl(name))
+        results[name] = {**result, 'cached': False}
+    return results
@@ -0,0 +1,145 @@
+"""
+Real-time analytics events for the admin dashboard.
+
+Signal handlers ``publish`` small events (new order, payment, cart add,
+stock-out) after commit. The cache backend is the cross-worker bus: every
+event gets a sequence number from ``cache.incr`` and is stored under its own
+key for ``EVENT_STREAM_RETENTION`` seconds.
+
+Each worker runs one ``EventHub`` per event loop: a single poller reads new
+events from the cache and fans them out to the in-process subscriber queues,
+so cache load depends on the number of workers, not on open dashboard tabs.
+A slow subscriber loses its oldest events instead of blocking the others.
+"""
+import asyncio
+import logging
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ('order.created', 'order.paid', 'cart.item_added', 'product.out_of_stock')
+
+SEQ_KEY = 'analytics:events:seq'
+# Больше событий за один опрос не читаем — отстающий воркер догоняет с хвоста
+MAX_BATCH = 500
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def _event_key(seq):
+    return f'analytics:events:{seq}'
+
+
+def _retention():
+    return getattr(settings, 'EVENT_STREAM_RETENTION', 5 * 60)
+
+
+def publish(event_type, data):
+    """Put an event on the bus; returns its sequence number."""
+    cache.add(SEQ_KEY, 0, None)
+    seq = cache.incr(SEQ_KEY)
+    cache.set(
+        _event_key(seq),
+        {'id': seq, 'type': event_type, 'data': data, 'at': timezone.now().isoformat()},
+        _retention()
+    )
+    return seq
+
+
+def publish_on_commit(event_type, data):
+    def send():
+        try:
+            publish(event_type, data)
+        except Exception:
+            # Поток событий не должен ронять запись заказа
+            logger.exception('Failed to publish %s event', event_type)
+
+    transaction.on_commit(send)
+
+
+async def read_events(after, upto=None):
+    """
+    Events with sequence numbers in ``(after, upto]`` (``upto`` — the current one).
+
+    Returns ``(events, last_seq)``; an event whose number was taken but which
+    is not stored yet stops the batch so it is picked up on the next read.
+    """
+    if upto is None:
+        upto = await cache.aget(SEQ_KEY) or 0
+    if upto <= after:
+        return [], after
+    after = max(after, upto - MAX_BATCH)
+
+    stored = await cache.aget_many([_event_key(seq) for seq in range(after + 1, upto + 1)])
+    events = []
+    for seq in range(after + 1, upto + 1):
+        event = stored.get(_event_key(seq))
+        if event is None:
+            break
+        events.append(event)
+        after = seq
+    return events, after
+
+
+class EventHub:
+    """Fans events from the cache bus out to the subscribers of one event loop."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.last_seq = None
+        self._task = None
+
+    async def subscribe(self):
+        queue = asyncio.Queue(maxsize=getattr(settings, 'EVENT_STREAM_QUEUE_SIZE', 100))
+        if self.last_seq is None:
+            self.last_seq = await cache.aget(SEQ_KEY) or 0
+        self.subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._poll())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def dispatch(self, events):
+        for queue in self.subscribers:
+            for event in events:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(event)
+
+    async def _poll(self):
+        interval = getattr(settings, 'EVENT_STREAM_POLL_INTERVAL', 1.0)
+        stalled = None
+        while self.subscribers:
+            try:
+                current = await cache.aget(SEQ_KEY) or 0
+                if current < self.last_seq:
+                    # Счётчик сброшен (кэш очищен) — начинаем заново
+                    self.last_seq = 0
+                events, last = await read_events(self.last_seq, current)
+                # Номер занят, а событие так и не записано — пропускаем его со второй попытки
+                if last < current and not events:
+                    if stalled == last:
+                        last += 1
+                    stalled = last
+                self.last_seq = last
+                self.dispatch(events)
+            except Exception:
+                logger.exception('Analytics event poll failed')
+            await asyncio.sleep(interval)
+        # Подписчиков нет — следующий стартует с текущего номера
+        self.last_seq = None
+
+
+def get_hub():
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = EventHub()
+    return hub
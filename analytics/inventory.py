@@ -0,0 +1,128 @@
+"""
+Inventory analytics: sales velocity, days of cover and reorder suggestions.
+
+``compute_inventory_forecasts`` (run by the management command of the same
+name) reads units sold per product over the last ``INVENTORY_VELOCITY_DAYS``
+days with one grouped query over order items and the stock levels with one
+more, then stores one ``InventoryForecast`` row per active product:
+
+* daily_velocity = units sold / days in the window (shorter for new products)
+* days_of_cover  = available quantity / daily_velocity
+* reorder_quantity, once cover drops below lead time + safety days, brings
+  stock up to ``INVENTORY_TARGET_COVER_DAYS`` of sales after the lead time.
+
+The dashboard low-stock list and the report endpoint read the stored rows.
+"""
+import math
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from orders.models import OrderItem
+from products.models import Product
+from .models import InventoryForecast
+
+# Статусы, для которых предлагается дозаказ
+REORDER_STATUSES = ('out_of_stock', 'critical', 'low')
+
+
+def inventory_settings():
+    return {
+        'velocity_days': getattr(settings, 'INVENTORY_VELOCITY_DAYS', 28),
+        'lead_time_days': getattr(settings, 'INVENTORY_LEAD_TIME_DAYS', 7),
+        'safety_days': getattr(settings, 'INVENTORY_SAFETY_DAYS', 3),
+        'target_cover_days': getattr(settings, 'INVENTORY_TARGET_COVER_DAYS', 30),
+    }
+
+
+def forecast_product(units_sold, window_days, available, params):
+    """``(velocity, days_of_cover, reorder_quantity, status)`` for one product."""
+    velocity = units_sold / window_days if window_days else 0
+    if velocity:
+        cover = available / velocity
+    else:
+        cover = None
+
+    lead = params['lead_time_days']
+    if not available:
+        status = 'out_of_stock'
+    elif not velocity:
+        status = 'no_sales'
+    elif cover < lead:
+        status = 'critical'
+    elif cover < lead + params['safety_days']:
+        status = 'low'
+    else:
+        status = 'ok'
+
+    reorder = 0
+    if velocity and status in REORDER_STATUSES:
+        reorder = max(0, math.ceil(velocity * (lead + params['target_cover_days'])) - available)
+    return velocity, cover, reorder, status
+
+
+def compute_inventory_forecasts(now=None):
+    """Recompute and store forecasts for all active products. Returns the number stored."""
+    now = now or timezone.now()
+    params = inventory_settings()
+    window = params['velocity_days']
+    since = now - timedelta(days=window)
+
+    sold = dict(
+        OrderItem.objects
+        .filter(order__created_at__gte=since, product__isnull=False)
+        .exclude(order__status='cancelled')
+        .values('product_id')
+        .annotate(units=Sum('quantity'))
+        .order_by()
+        .values_list('product_id', 'units')
+    )
+
+    rows = []
+    products = Product.objects.filter(is_active=True).values_list(
+        'id', 'stock_quantity', 'reserved_quantity', 'created_at'
+    )
+    for product_id, stock, reserved, created_at in products:
+        # Новый товар: скорость считается за дни, что он продаётся
+        days = min(window, max(1, math.ceil((now - created_at).total_seconds() / 86400)))
+        units = sold.get(product_id, 0)
+        available = max(0, stock - reserved)
+        velocity, cover, reorder, status = forecast_product(units, days, available, params)
+        rows.append(InventoryForecast(
+            product_id=product_id,
+            units_sold=units,
+            daily_velocity=Decimal(str(round(velocity, 3))),
+            available_quantity=available,
+            days_of_cover=None if cover is None else Decimal(str(round(cover, 1))),
+            reorder_quantity=reorder,
+            status=status,
+            computed_at=now,
+        ))
+
+    with transaction.atomic():
+        InventoryForecast.objects.all().delete()
+        InventoryForecast.objects.bulk_create(rows, batch_size=500)
+
+    from .dashboard import invalidate_widgets
+    invalidate_widgets('products')
+    return len(rows)
+
+
+def forecast_payload(forecast):
+    product = forecast.product
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': float(product.price),
+        'stock_quantity': product.stock_quantity,
+        'available_quantity': forecast.available_quantity,
+        'units_sold': forecast.units_sold,
+        'daily_velocity': float(forecast.daily_velocity),
+        'days_of_cover': None if forecast.days_of_cover is None else float(forecast.days_of_cover),
+        'reorder_quantity': forecast.reorder_quantity,
+        'status': forecast.status,
+    }
@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from analytics.rollups import dirty_rollup_days, missing_rollup_days, refresh_daily_rollups, rollup_date
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        'Досчитывает дневные агрегаты продаж: дни без агрегатов с начала истории '
+        'плюс последние --recent дней. Запускать раз в сутки (ночью); '
+        'с --dirty — раз в минуту.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recent',
+            type=int,
+            default=2,
+            help='Сколько последних дней пересчитать всегда (по умолчанию 2: вчера и сегодня)',
+        )
+        parser.add_argument('--date-from', help='Пересчитать все дни начиная с даты (YYYY-MM-DD)')
+        parser.add_argument('--date-to', help='Последний пересчитываемый день (YYYY-MM-DD)')
+        parser.add_argument(
+            '--dirty',
+            action='store_true',
+            help='Пересчитать только дни, изменённые после последнего пересчёта',
+        )
+
+    def _history_start(self):
+        firsts = [
+            Order.objects.aggregate(first=Min('created_at'))['first'],
+            get_user_model().objects.aggregate(first=Min('date_joined'))['first'],
+        ]
+        firsts = [rollup_date(moment) for moment in firsts if moment is not None]
+        return min(firsts) if firsts else None
+
+    def handle(self, *args, **options):
+        if options['dirty']:
+            days = dirty_rollup_days()
+            refresh_daily_rollups(days)
+            self.stdout.write(self.style.SUCCESS(f'Пересчитано дней: {len(days)}'))
+            return
+
+        today = timezone.localdate()
+        date_to = parse_date(options['date_to']) if options['date_to'] else today
+        if date_to is None:
+            raise CommandError('Неверный формат --date-to, ожидается YYYY-MM-DD')
+
+        if options['date_from']:
+            date_from = parse_date(options['date_from'])
+            if date_from is None:
+                raise CommandError('Неверный формат --date-from, ожидается YYYY-MM-DD')
+            days = [date_from + timedelta(days=n) for n in range((date_to - date_from).days + 1)]
+        else:
+            start = self._history_start()
+            days = missing_rollup_days(start, date_to) if start else []
+            days += [date_to - timedelta(days=n) for n in range(max(options['recent'], 0))]
+            days += dirty_rollup_days()
+
+        refresh_daily_rollups(days)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано дней: {len(set(days))}')
+        )
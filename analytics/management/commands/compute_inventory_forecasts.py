@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from analytics.inventory import compute_inventory_forecasts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает скорость продаж, запас в днях и дозаказ по товарам. Запускать раз в день.'
+
+    def handle(self, *args, **options):
+        stored = compute_inventory_forecasts()
+
+        self.stdout.write(self.style.SUCCESS(f'Прогнозов сохранено: {stored}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from analytics.cart_snapshots import take_cart_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Сохраняет снимок корзин (часовой и дневной). Запускать раз в час.'
+
+    def handle(self, *args, **options):
+        totals = take_cart_snapshot()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Корзин: {totals["total_carts"]}, товаров: {totals["total_items"]}, '
+                f'брошенных: {totals["abandoned_carts"]}'
+            )
+        )
@@ -0,0 +1,76 @@
+import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_buckets(apps, schema_editor):
+    CartAnalytics = apps.get_model('analytics', 'CartAnalytics')
+    for row in CartAnalytics.objects.all():
+        row.bucket = timezone.make_aware(datetime.datetime.combine(row.date, datetime.time.min))
+        row.save(update_fields=['bucket'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0002_sales_rollups"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="cartanalytics",
+            unique_together=set(),
+        ),
+        migrations.AlterModelOptions(
+            name="cartanalytics",
+            options={"ordering": ["bucket"]},
+        ),
+        migrations.AlterField(
+            model_name="cartanalytics",
+            name="date",
+            field=models.DateField(),
+        ),
+        migrations.AddField(
+            model_name="cartanalytics",
+            name="granularity",
+            field=models.CharField(
+                choices=[("hour", "Час"), ("day", "День")], default="day", max_length=4
+            ),
+        ),
+        migrations.AddField(
+            model_name="cartanalytics",
+            name="bucket",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name="cartanalytics",
+            name="abandoned_carts",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="cartanalytics",
+            name="abandoned_items",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="cartanalytics",
+            name="abandoned_value",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name="cartanalytics",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(fill_buckets, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="cartanalytics",
+            name="bucket",
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterUniqueTogether(
+            name="cartanalytics",
+            unique_together={("granularity", "bucket")},
+        ),
+    ]
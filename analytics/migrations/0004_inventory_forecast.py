@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0003_cart_analytics_buckets"),
+        ("products", "0007_product_affinity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventoryForecast",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("units_sold", models.PositiveIntegerField(default=0)),
+                (
+                    "daily_velocity",
+                    models.DecimalField(decimal_places=3, default=0, max_digits=10),
+                ),
+                ("available_quantity", models.PositiveIntegerField(default=0)),
+                (
+                    "days_of_cover",
+                    models.DecimalField(
+                        blank=True, decimal_places=1, max_digits=10, null=True
+                    ),
+                ),
+                ("reorder_quantity", models.PositiveIntegerField(default=0)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("out_of_stock", "Нет в наличии"),
+                            ("critical", "Закончится до поставки"),
+                            ("low", "Пора заказать"),
+                            ("ok", "Достаточно"),
+                            ("no_sales", "Нет продаж"),
+                        ],
+                        default="ok",
+                        max_length=20,
+                    ),
+                ),
+                ("computed_at", models.DateTimeField()),
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="inventory_forecast",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["status", "days_of_cover"],
+                        name="inventory_status_cover_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0004_inventory_forecast"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dailysales",
+            name="dirty",
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
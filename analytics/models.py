@@ -5,15 +5,128 @@ User = get_user_model()
 
 
 class CartAnalytics(models.Model):
-    """Cart analytics model for tracking cart statistics."""
-    
-    date = models.DateField(auto_now_add=True)
+    """Snapshot of cart totals for one hour or one day (see ``snapshot_cart_analytics``)."""
+
+    GRANULARITY_CHOICES = [
+        ('hour', 'Час'),
+        ('day', 'День'),
+    ]
+
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES, default='day')
+    # Начало часа или суток (локальное время)
+    bucket = models.DateTimeField()
+    date = models.DateField()
     total_carts = models.PositiveIntegerField(default=0)
     total_items = models.PositiveIntegerField(default=0)
     total_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)
-    
+    abandoned_carts = models.PositiveIntegerField(default=0)
+    abandoned_items = models.PositiveIntegerField(default=0)
+    abandoned_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('granularity', 'bucket')
+        ordering = ['bucket']
+
+    def __str__(self):
+        return f"Cart Analytics ({self.granularity}) for {self.bucket}"
+
+
+class DailySales(models.Model):
+    """Per-day order, revenue and signup totals; the dashboard reads these instead of orders."""
+
+    date = models.DateField(unique=True)
+    orders_count = models.PositiveIntegerField(default=0)
+    paid_orders_count = models.PositiveIntegerField(default=0)
+    # Выручка только по оплаченным заказам
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    items_sold = models.PositiveIntegerField(default=0)
+    new_users = models.PositiveIntegerField(default=0)
+    # Пользователи, сделавшие в этот день первый заказ
+    new_customers = models.PositiveIntegerField(default=0)
+    # Заказы дня менялись после пересчёта — досчитает backfill_sales_rollups --dirty
+    dirty = models.BooleanField(default=False, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = 'Daily sales'
+
+    def __str__(self):
+        return f"Sales for {self.date}"
+
+
+class DailyProductSales(models.Model):
+    """Items sold per product (and its category) per day, cancelled orders excluded."""
+
+    date = models.DateField()
+    product = models.ForeignKey(
+        'products.Product', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    product_name = models.CharField(max_length=200)
+    category = models.ForeignKey(
+        'products.Category', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
     class Meta:
-        unique_together = ('date',)
-    
+        indexes = [
+            models.Index(fields=['date', 'product'], name='daily_product_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_name} x{self.quantity} on {self.date}"
+
+
+class DailyOrderStatus(models.Model):
+    """Number of orders created on ``date`` that are currently in a given status."""
+
+    FIELD_CHOICES = [
+        ('status', 'Статус заказа'),
+        ('payment_status', 'Статус оплаты'),
+    ]
+
+    date = models.DateField()
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    value = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('date', 'field', 'value')
+
+    def __str__(self):
+        return f"{self.date} {self.field}={self.value}: {self.count}"
+
+
+class InventoryForecast(models.Model):
+    """Sales velocity, days of cover and reorder suggestion per product (see ``compute_inventory_forecasts``)."""
+
+    STATUS_CHOICES = [
+        ('out_of_stock', 'Нет в наличии'),
+        ('critical', 'Закончится до поставки'),
+        ('low', 'Пора заказать'),
+        ('ok', 'Достаточно'),
+        ('no_sales', 'Нет продаж'),
+    ]
+
+    product = models.OneToOneField(
+        'products.Product', on_delete=models.CASCADE, related_name='inventory_forecast'
+    )
+    # Продано за окно расчёта и среднее в день
+    units_sold = models.PositiveIntegerField(default=0)
+    daily_velocity = models.DecimalField(max_digits=10, decimal_places=3, default=0)
+    available_quantity = models.PositiveIntegerField(default=0)
+    # None — продаж за окно не было
+    days_of_cover = models.DecimalField(max_digits=10, decimal_places=1, null=True, blank=True)
+    reorder_quantity = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ok')
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'days_of_cover'], name='inventory_status_cover_idx'),
+        ]
+
     def __str__(self):
-        return f"Cart Analytics for {self.date}"
\ No newline at end of file
+        return f"{self.product_id}: {self.status}, cover {self.days_of_cover}"
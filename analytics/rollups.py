@@ -0,0 +1,178 @@
+"""
+Daily sales rollups.
+
+``DailySales``, ``DailyProductSales`` and ``DailyOrderStatus`` hold per-day
+aggregates so the dashboard never scans the whole order history. A day is
+always recomputed as a whole from the orders created on it (using the
+``created_at`` index), which keeps updates idempotent: signals schedule the
+affected days after commit, and ``backfill_sales_rollups`` repairs anything
+that was missed.
+
+Rebuilding a day is far heavier than the write that triggered it, so a day is
+recomputed inline at most once per ``ROLLUP_REFRESH_DEBOUNCE`` seconds (a
+cache flag per day). Writes inside that window only mark the day ``dirty``;
+``backfill_sales_rollups --dirty`` (every minute from cron) picks them up.
+"""
+import logging
+from datetime import datetime, time, timedelta
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from .dashboard import ROLLUP_WIDGETS, invalidate_widgets
+from .models import DailyOrderStatus, DailyProductSales, DailySales
+from .timeseries import invalidate_series_buckets
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+ROLLUP_STATUS_FIELDS = ('status', 'payment_status')
+
+
+def rollup_date(moment):
+    """Local calendar day a timestamp belongs to."""
+    return timezone.localdate(moment)
+
+
+def day_bounds(day):
+    """Aware ``[start, end)`` of a local calendar day."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return start, end
+
+
+def _compute_day(day):
+    start, end = day_bounds(day)
+    orders = Order.objects.filter(created_at__gte=start, created_at__lt=end)
+
+    totals = orders.aggregate(
+        orders_count=Count('id'),
+        paid_orders_count=Count('id', filter=Q(payment_status='paid')),
+        revenue=Coalesce(
+            Sum('total_amount', filter=Q(payment_status='paid')),
+            0, output_field=DecimalField()
+        ),
+    )
+
+    products = list(
+        OrderItem.objects
+        .filter(order__created_at__gte=start, order__created_at__lt=end)
+        .exclude(order__status='cancelled')
+        .values('product_id', 'product_name', 'product__category_id')
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum(F('quantity') * F('price')))
+        .order_by()
+    )
+
+    statuses = []
+    for field in ROLLUP_STATUS_FIELDS:
+        for entry in orders.values(field).annotate(count=Count('id')).order_by():
+            statuses.append((field, entry[field], entry['count']))
+
+    new_customers = (
+        orders.exclude(user__order__created_at__lt=start)
+        .values('user_id').distinct().count()
+    )
+    new_users = User.objects.filter(date_joined__gte=start, date_joined__lt=end).count()
+
+    return {
+        **totals,
+        'items_sold': sum(row['total_quantity'] for row in products),
+        'new_users': new_users,
+        'new_customers': new_customers,
+    }, products, statuses
+
+
+def refresh_daily_rollups(days):
+    """Recompute the rollups of the given local days."""
+    days = sorted(set(days))
+    for day in days:
+        with transaction.atomic():
+            # Строка дня блокируется до пересчёта — параллельный пересчёт того же дня ждёт
+            DailySales.objects.get_or_create(date=day)
+            DailySales.objects.select_for_update().get(date=day)
+            totals, products, statuses = _compute_day(day)
+            DailySales.objects.filter(date=day).update(**totals, dirty=False, updated_at=timezone.now())
+
+            DailyProductSales.objects.filter(date=day).delete()
+            DailyProductSales.objects.bulk_create([
+                DailyProductSales(
+                    date=day,
+                    product_id=row['product_id'],
+                    product_name=row['product_name'],
+                    category_id=row['product__category_id'],
+                    quantity=row['total_quantity'],
+                    revenue=row['total_revenue'],
+                )
+                for row in products
+            ])
+
+            DailyOrderStatus.objects.filter(date=day).delete()
+            DailyOrderStatus.objects.bulk_create([
+                DailyOrderStatus(date=day, field=field, value=value, count=count)
+                for field, value, count in statuses
+            ])
+
+    invalidate_series_buckets(days)
+    invalidate_widgets(*ROLLUP_WIDGETS)
+
+
+def _debounce_key(day):
+    return f'analytics:rollup:debounce:{day.isoformat()}'
+
+
+def mark_days_dirty(days):
+    """Flag ``days`` for the next ``backfill_sales_rollups --dirty`` run."""
+    for day in days:
+        # Строки дня ещё нет — создаём сразу помеченной
+        if not DailySales.objects.filter(date=day).update(dirty=True):
+            DailySales.objects.get_or_create(date=day, defaults={'dirty': True})
+
+
+def _refresh_after_commit(days):
+    debounce = getattr(settings, 'ROLLUP_REFRESH_DEBOUNCE', 60)
+    if debounce > 0:
+        # Первое изменение дня за окно пересчитывает его сразу, остальные только помечают
+        now = {day for day in days if cache.add(_debounce_key(day), 1, timeout=debounce)}
+    else:
+        now = days
+    try:
+        mark_days_dirty(days - now)
+        if now:
+            refresh_daily_rollups(now)
+    except Exception:
+        # Ответ пользователю не ломаем — ночной backfill досчитает день
+        logger.exception('Failed to refresh sales rollups for %s', sorted(days))
+
+
+def schedule_rollup_refresh(days):
+    """Recompute ``days`` once the current transaction commits."""
+    days = set(days)
+    if days:
+        transaction.on_commit(partial(_refresh_after_commit, days))
+
+
+def dirty_rollup_days():
+    """Days whose orders changed after their last recompute."""
+    return list(DailySales.objects.filter(dirty=True).values_list('date', flat=True))
+
+
+def missing_rollup_days(start, end):
+    """Days in ``[start, end]`` that have no ``DailySales`` row yet."""
+    existing = set(
+        DailySales.objects.filter(date__gte=start, date__lte=end).values_list('date', flat=True)
+    )
+    day = start
+    missing = []
+    while day <= end:
+        if day not in existing:
+            missing.append(day)
+        day += timedelta(days=1)
+    return missing
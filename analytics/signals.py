@@ -0,0 +1,119 @@
+"""
+Signals for analytics app: keep daily sales rollups and dashboard widgets
+current, and feed the real-time event stream.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from orders.models import CartItem, Order
+from orders.signals import orders_transitioned
+from products.models import Category, Product
+from .dashboard import invalidate_widgets_on_commit
+from .events import publish_on_commit
+from .rollups import rollup_date, schedule_rollup_refresh
+
+# Поля заказа, от которых зависят дневные агрегаты
+ROLLUP_ORDER_FIELDS = {'status', 'payment_status', 'total_amount', 'user'}
+
+# Поля товара, которые показывает виджет products (резерв в нём не участвует)
+WIDGET_PRODUCT_FIELDS = {'name', 'price', 'is_active', 'stock_quantity', 'category'}
+
+
+@receiver(post_save, sender=Order)
+def refresh_rollups_on_order_save(sender, instance, created, update_fields=None, **kwargs):
+    invalidate_widgets_on_commit('recent_orders')
+    if not created and update_fields and not ROLLUP_ORDER_FIELDS & set(update_fields):
+        return
+    schedule_rollup_refresh([rollup_date(instance.created_at)])
+
+
+@receiver(post_delete, sender=Order)
+def refresh_rollups_on_order_delete(sender, instance, **kwargs):
+    invalidate_widgets_on_commit('recent_orders')
+    schedule_rollup_refresh([rollup_date(instance.created_at)])
+
+
+@receiver(orders_transitioned)
+def refresh_rollups_on_transition(sender, created_at, **kwargs):
+    """Set-based status updates bypass ``post_save``."""
+    invalidate_widgets_on_commit('recent_orders')
+    schedule_rollup_refresh(rollup_date(moment) for moment in created_at)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_products_widget_on_save(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields and not WIDGET_PRODUCT_FIELDS & set(update_fields):
+        return
+    invalidate_widgets_on_commit('products')
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_products_widget(sender, **kwargs):
+    invalidate_widgets_on_commit('products')
+
+
+@receiver(post_save, sender=get_user_model())
+def refresh_rollups_on_signup(sender, instance, created, **kwargs):
+    if created:
+        schedule_rollup_refresh([rollup_date(instance.date_joined)])
+
+
+# ═══ Поток событий ═══
+# Значения полей при загрузке — чтобы post_save видел переход (оплачен, закончился)
+
+@receiver(post_init, sender=Order)
+def remember_order_payment_status(sender, instance, **kwargs):
+    instance._loaded_payment_status = instance.__dict__.get('payment_status')
+
+
+@receiver(post_init, sender=Product)
+def remember_product_stock(sender, instance, **kwargs):
+    instance._loaded_stock_quantity = instance.__dict__.get('stock_quantity')
+
+
+@receiver(post_init, sender=CartItem)
+def remember_cart_item_quantity(sender, instance, **kwargs):
+    instance._loaded_quantity = instance.__dict__.get('quantity')
+
+
+@receiver(post_save, sender=Order)
+def publish_order_events(sender, instance, created, **kwargs):
+    data = {
+        'id': instance.id,
+        'order_number': instance.order_number,
+        'total_amount': str(instance.total_amount),
+    }
+    if created:
+        publish_on_commit('order.created', data)
+    elif instance.payment_status == 'paid' and instance._loaded_payment_status not in (None, 'paid'):
+        publish_on_commit('order.paid', data)
+    instance._loaded_payment_status = instance.payment_status
+
+
+@receiver(orders_transitioned)
+def publish_transition_payments(sender, order_ids, moves=None, **kwargs):
+    for order_id in (moves or {}).get(('payment_status', 'paid'), []):
+        publish_on_commit('order.paid', {'id': order_id})
+
+
+@receiver(post_save, sender=CartItem)
+def publish_cart_add(sender, instance, created, **kwargs):
+    if created:
+        added = instance.quantity
+    elif instance._loaded_quantity is not None:
+        added = instance.quantity - instance._loaded_quantity
+    else:
+        added = 0
+    if added > 0:
+        publish_on_commit('cart.item_added', {'product_id': instance.product_id, 'quantity': added})
+    instance._loaded_quantity = instance.quantity
+
+
+@receiver(post_save, sender=Product)
+def publish_stock_out(sender, instance, created, **kwargs):
+    if not created and instance.stock_quantity == 0 and instance._loaded_stock_quantity:
+        publish_on_commit('product.out_of_stock', {'id': instance.id, 'name': instance.name})
+    instance._loaded_stock_quantity = instance.stock_quantity
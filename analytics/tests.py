@@ -2,7 +2,7 @@
 Tests for analytics app.
 """
 import pytest
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth import get_user_model
 from hypothesis import given, strategies as st
 from decimal import Decimal
@@ -24,6 +24,974 @@ class TestAnalyticsBasic(TestCase):
         self.assertEqual(app.name, 'analytics')
 
 
+# Каждая запись пересчитывает день сразу — без окна ROLLUP_REFRESH_DEBOUNCE
+@override_settings(ROLLUP_REFRESH_DEBOUNCE=0)
+class TestSalesRollups(TestCase):
+    """Test daily sales rollups, their incremental refresh and the dashboard."""
+    
+    def setUp(self):
+        """Set up customer, admin and a product."""
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@test.com',
+            password='testpass123'
+        )
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@test.com',
+            password='testpass123',
+            role='admin',
+            is_staff=True
+        )
+        self.category = Category.objects.create(name='Test Category', slug='test-category')
+        self.product = Product.objects.create(
+            name='Test Product',
+            slug='test-product',
+            description='Test description',
+            price=Decimal('100.00'),
+            category=self.category,
+            stock_quantity=100
+        )
+    
+    def _create_order(self, number, quantity=2, **fields):
+        from orders.models import Order, OrderItem
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(
+                user=self.customer,
+                order_number=number,
+                total_amount=Decimal('100.00') * quantity,
+                shipping_address='Test Address',
+                **fields
+            )
+            OrderItem.objects.create(
+                order=order, product=self.product, quantity=quantity, price=Decimal('100.00')
+            )
+        return order
+    
+    def test_order_creation_updates_rollups(self):
+        """Test that a new order is counted in today's rollup after commit."""
+        from django.utils import timezone
+        from .models import DailyOrderStatus, DailyProductSales, DailySales
+        
+        self._create_order('ORD-ROLLUP-1', quantity=3)
+        
+        day = DailySales.objects.get(date=timezone.localdate())
+        self.assertEqual(day.orders_count, 1)
+        self.assertEqual(day.paid_orders_count, 0)
+        self.assertEqual(day.items_sold, 3)
+        self.assertEqual(day.new_users, 2)
+        self.assertEqual(day.new_customers, 1)
+        
+        product_row = DailyProductSales.objects.get(date=day.date)
+        self.assertEqual(product_row.product_id, self.product.id)
+        self.assertEqual(product_row.category_id, self.category.id)
+        self.assertEqual(product_row.revenue, Decimal('300.00'))
+        self.assertEqual(
+            DailyOrderStatus.objects.get(date=day.date, field='status', value='pending').count, 1
+        )
+    
+    def test_transitions_update_rollups(self):
+        """Test that set-based state machine updates reach the rollups."""
+        from django.utils import timezone
+        from orders.state_machine import transition_orders
+        from .models import DailyOrderStatus, DailyProductSales, DailySales
+        
+        order = self._create_order('ORD-ROLLUP-2')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_orders([order.id], {'status': 'paid', 'payment_status': 'paid'})
+        
+        day = DailySales.objects.get(date=timezone.localdate())
+        self.assertEqual(day.paid_orders_count, 1)
+        self.assertEqual(day.revenue, Decimal('200.00'))
+        self.assertFalse(DailyOrderStatus.objects.filter(value='pending').exists())
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_orders([order.id], {'status': 'cancelled'})
+        
+        day.refresh_from_db()
+        self.assertEqual(day.items_sold, 0)
+        self.assertFalse(DailyProductSales.objects.exists())
+        self.assertEqual(
+            DailyOrderStatus.objects.get(field='status', value='cancelled').count, 1
+        )
+    
+    def test_backfill_command_fills_gaps(self):
+        """Test that the backfill command creates rows for days without rollups."""
+        from datetime import timedelta
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from orders.models import Order
+        from .models import DailySales
+        
+        order = self._create_order('ORD-ROLLUP-3')
+        old_day = timezone.localdate() - timedelta(days=5)
+        Order.objects.filter(id=order.id).update(created_at=timezone.now() - timedelta(days=5))
+        DailySales.objects.all().delete()
+        
+        call_command('backfill_sales_rollups', stdout=StringIO())
+        
+        self.assertEqual(DailySales.objects.get(date=old_day).orders_count, 1)
+        self.assertEqual(DailySales.objects.get(date=timezone.localdate()).orders_count, 0)
+        self.assertEqual(DailySales.objects.count(), 6)
+    
+    @override_settings(ROLLUP_REFRESH_DEBOUNCE=60)
+    def test_refresh_is_debounced(self):
+        """Test that writes within the window mark the day dirty for the cron run."""
+        from io import StringIO
+        from django.core.cache import cache
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import DailySales
+        
+        cache.clear()
+        self.addCleanup(cache.clear)
+        
+        self._create_order('ORD-ROLLUP-6')
+        day = DailySales.objects.get(date=timezone.localdate())
+        self.assertEqual(day.orders_count, 1)
+        self.assertFalse(day.dirty)
+        
+        # Второй заказ в том же окне — день не пересчитывается, только помечается
+        self._create_order('ORD-ROLLUP-7')
+        day.refresh_from_db()
+        self.assertEqual(day.orders_count, 1)
+        self.assertTrue(day.dirty)
+        
+        call_command('backfill_sales_rollups', '--dirty', stdout=StringIO())
+        day.refresh_from_db()
+        self.assertEqual(day.orders_count, 2)
+        self.assertFalse(day.dirty)
+    
+    def test_dashboard_reads_rollups(self):
+        """Test that the dashboard totals come from rollups, not from order history."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from rest_framework.test import APIClient
+        
+        self._create_order('ORD-ROLLUP-4', payment_status='paid')
+        self._create_order('ORD-ROLLUP-5')
+        
+        client = APIClient()
+        client.force_authenticate(user=self.admin_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/analytics/dashboard/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['orders']['total'], 2)
+        self.assertEqual(data['orders']['today'], 2)
+        self.assertEqual(data['orders']['by_payment'], {'paid': 1, 'pending': 1})
+        self.assertEqual(data['revenue']['total'], 200.0)
+        self.assertEqual(data['revenue']['average_order'], 200.0)
+        self.assertEqual(data['top_products'][0]['total_sold'], 4)
+        self.assertEqual(data['top_categories'][0]['id'], self.category.id)
+        self.assertEqual(data['users']['total'], 2)
+        self.assertEqual(data['users']['with_orders'], 1)
+        
+        # Из истории заказов — только 10 последних для списка
+        order_queries = [
+            query['sql'] for query in queries.captured_queries
+            if '"orders_order"' in query['sql'] or '"orders_orderitem"' in query['sql']
+        ]
+        self.assertEqual(len(order_queries), 1)
+        self.assertIn('LIMIT 10', order_queries[0])
+
+
+class TestCartSnapshots(TestCase):
+    """Test cart aggregates, hourly/daily snapshots and the trends endpoint."""
+    
+    def setUp(self):
+        """Set up an admin, two carts and products."""
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@test.com',
+            password='testpass123',
+            role='admin',
+            is_staff=True
+        )
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.products = [
+            Product.objects.create(
+                name=f'Product {i}',
+                slug=f'product-{i}',
+                description='Test description',
+                price=Decimal('100.00') * (i + 1),
+                category=category,
+                stock_quantity=100
+            )
+            for i in range(2)
+        ]
+        self.carts = []
+        for i in range(2):
+            user = User.objects.create_user(
+                username=f'user{i}',
+                email=f'user{i}@test.com',
+                password='testpass123'
+            )
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=self.products[0], quantity=2)
+            CartItem.objects.create(cart=cart, product=self.products[1], quantity=1)
+            self.carts.append(cart)
+        
+        # Первая корзина не менялась два часа — брошенная
+        from datetime import timedelta
+        from django.utils import timezone
+        Cart.objects.filter(id=self.carts[0].id).update(updated_at=timezone.now() - timedelta(hours=2))
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin_user)
+    
+    def test_cart_totals_single_query(self):
+        """Test that totals and abandoned totals come from one aggregate."""
+        from .cart_snapshots import cart_totals
+        
+        with self.assertNumQueries(1):
+            totals = cart_totals()
+        
+        self.assertEqual(totals['total_carts'], 2)
+        self.assertEqual(totals['total_items'], 6)
+        self.assertEqual(totals['total_value'], Decimal('800.00'))
+        self.assertEqual(totals['abandoned_carts'], 1)
+        self.assertEqual(totals['abandoned_items'], 3)
+        self.assertEqual(totals['abandoned_value'], Decimal('400.00'))
+    
+    def test_snapshot_writes_hour_and_day_rows(self):
+        """Test that a snapshot upserts one hourly and one daily row."""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import CartAnalytics
+        
+        call_command('snapshot_cart_analytics', stdout=StringIO())
+        call_command('snapshot_cart_analytics', stdout=StringIO())
+        
+        self.assertEqual(CartAnalytics.objects.filter(granularity='hour').count(), 1)
+        day = CartAnalytics.objects.get(granularity='day')
+        self.assertEqual(timezone.localtime(day.bucket).hour, 0)
+        self.assertEqual(day.total_carts, 2)
+        self.assertEqual(day.abandoned_value, Decimal('400.00'))
+    
+    def test_trends_endpoint(self):
+        """Test that trends report basket size and abandoned value per bucket."""
+        from .cart_snapshots import take_cart_snapshot
+        
+        take_cart_snapshot()
+        
+        response = self.client.get('/api/analytics/cart-trends/', {'granularity': 'hour'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        row = response.json()['results'][0]
+        self.assertEqual(row['avg_basket_items'], 3)
+        self.assertEqual(row['avg_basket_value'], 400.0)
+        self.assertEqual(row['abandoned_value'], 400.0)
+        
+        response = self.client.get('/api/analytics/cart-trends/', {'granularity': 'week'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_live_stats_are_cached(self):
+        """Test that live cart statistics are served from cache on repeat calls."""
+        response = self.client.get('/api/analytics/cart-statistics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['total_value'], 800.0)
+        
+        CartItem.objects.all().delete()
+        response = self.client.get('/api/analytics/real-time-cart/')
+        self.assertEqual(response.json()['total_carts'], 2)
+
+
+class TestCohortAnalytics(TestCase):
+    """Test signup-month cohorts, retention and LTV."""
+    
+    def setUp(self):
+        """Set up two cohorts: last month (two users) and this month (one user)."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from orders.models import Order
+        
+        self.now = timezone.now()
+        this_month = timezone.localtime(self.now).replace(day=1, hour=12, minute=0, second=0, microsecond=0)
+        last_month = (this_month - timedelta(days=1)).replace(day=1)
+        
+        def user(name, joined):
+            created = User.objects.create_user(
+                username=name, email=f'{name}@test.com', password='testpass123'
+            )
+            User.objects.filter(id=created.id).update(date_joined=joined)
+            return created
+        
+        def order(customer, number, created_at, amount='100.00', **fields):
+            created = Order.objects.create(
+                user=customer,
+                order_number=number,
+                total_amount=Decimal(amount),
+                shipping_address='Test Address',
+                **{'payment_status': 'paid', **fields}
+            )
+            Order.objects.filter(id=created.id).update(created_at=created_at)
+        
+        loyal = user('loyal', last_month)
+        once = user('once', last_month)
+        fresh = user('fresh', this_month)
+        
+        # loyal: заказ через 2 дня после регистрации и повторный в этом месяце
+        order(loyal, 'ORD-COHORT-1', last_month + timedelta(days=2))
+        order(loyal, 'ORD-COHORT-2', this_month + timedelta(hours=1), amount='300.00')
+        # once: только отменённый заказ — не покупатель
+        order(once, 'ORD-COHORT-3', last_month + timedelta(days=3), status='cancelled')
+        # fresh: неоплаченный заказ через 4 дня
+        order(fresh, 'ORD-COHORT-4', this_month + timedelta(days=4), payment_status='pending')
+        
+        self.admin_user = User.objects.create_user(
+            username='admin', email='admin@test.com', password='testpass123', is_staff=True
+        )
+        User.objects.filter(id=self.admin_user.id).update(date_joined=last_month - timedelta(days=40))
+    
+    def test_cohort_matrix(self):
+        """Test conversion, repeat rate, retention and LTV per cohort."""
+        from .cohorts import compute_cohorts
+        
+        with self.assertNumQueries(2):
+            report = compute_cohorts(months=2, now=self.now)
+        
+        last, current = report['cohorts']
+        self.assertEqual(last['users'], 2)
+        self.assertEqual(last['buyers'], 1)
+        self.assertEqual(last['conversion_rate'], 50.0)
+        self.assertEqual(last['repeat_rate'], 100.0)
+        self.assertEqual(last['median_days_to_first_order'], 2.0)
+        self.assertEqual(last['retention'], [50.0, 50.0])
+        self.assertEqual(last['ltv'], [50.0, 200.0])
+        
+        self.assertEqual(current['users'], 1)
+        self.assertEqual(current['retention'], [100.0])
+        self.assertEqual(current['ltv'], [0])
+        self.assertEqual(report['totals']['buyers'], 2)
+    
+    def test_cohort_endpoint_is_cached(self):
+        """Test that the endpoint caches the computed report."""
+        client = APIClient()
+        client.force_authenticate(user=self.admin_user)
+        
+        response = client.get('/api/analytics/cohorts/', {'months': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['cohorts']), 2)
+        
+        with self.assertNumQueries(0):
+            from .cohorts import cohort_report
+            cohort_report(2)
+
+
+class TestRevenueSeries(TestCase):
+    """Test the revenue time series: granularity, dimensions, zero-fill and caching."""
+    
+    def setUp(self):
+        """Set up paid and pending orders on two days."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from orders.models import Order, OrderItem
+        
+        self.today = timezone.localdate()
+        self.admin_user = User.objects.create_user(
+            username='admin', email='admin@test.com', password='testpass123', is_staff=True
+        )
+        customer = User.objects.create_user(
+            username='customer', email='customer@test.com', password='testpass123'
+        )
+        bread = Category.objects.create(name='Bread', slug='bread')
+        pasta = Category.objects.create(name='Pasta', slug='pasta')
+        self.bread = Product.objects.create(
+            name='Bread', slug='bread', description='Test', price=Decimal('100.00'),
+            category=bread, stock_quantity=10, manufacturer='Mill'
+        )
+        self.pasta = Product.objects.create(
+            name='Pasta', slug='pasta', description='Test', price=Decimal('50.00'),
+            category=pasta, stock_quantity=10
+        )
+        
+        def order(number, days_ago, payment_status, delivery_method='courier'):
+            with self.captureOnCommitCallbacks(execute=True):
+                created = Order.objects.create(
+                    user=customer,
+                    order_number=number,
+                    total_amount=Decimal('200.00'),
+                    shipping_address='Test Address',
+                    payment_status=payment_status,
+                    delivery_method=delivery_method
+                )
+                Order.objects.filter(id=created.id).update(
+                    created_at=timezone.now() - timedelta(days=days_ago)
+                )
+                OrderItem.objects.create(order=created, product=self.bread, quantity=1, price=Decimal('100.00'))
+                OrderItem.objects.create(order=created, product=self.pasta, quantity=2, price=Decimal('50.00'))
+            return created
+        
+        order('ORD-TS-1', 2, 'paid')
+        order('ORD-TS-2', 2, 'pending', delivery_method='pickup')
+        order('ORD-TS-3', 0, 'paid')
+        
+        from .rollups import refresh_daily_rollups
+        refresh_daily_rollups([self.today - timedelta(days=2), self.today])
+    
+    def test_daily_series_from_rollups_zero_filled(self):
+        """Test one point per day with empty days zero-filled."""
+        from datetime import timedelta
+        from .timeseries import revenue_series
+        
+        with self.assertNumQueries(1):
+            series = revenue_series(self.today - timedelta(days=3), self.today, 'day')
+        
+        self.assertEqual([point['orders'] for point in series], [0, 2, 0, 1])
+        self.assertEqual([point['revenue'] for point in series], [0, 200.0, 0, 200.0])
+    
+    def test_dimensions(self):
+        """Test item-level and order-level dimensions."""
+        from datetime import timedelta
+        from .timeseries import revenue_series
+        
+        series = revenue_series(self.today - timedelta(days=2), self.today, 'month', ['category'])
+        by_category = {}
+        for point in series:
+            by_category[point['category']] = by_category.get(point['category'], 0) + point['revenue']
+        self.assertEqual(by_category, {'Bread': 200.0, 'Pasta': 200.0})
+        
+        series = revenue_series(self.today, self.today, 'hour', ['delivery_method', 'payment_status'])
+        self.assertEqual(len(series), 24)
+        self.assertEqual({(point['delivery_method'], point['payment_status']) for point in series}, {('courier', 'paid')})
+        self.assertEqual(sum(point['orders'] for point in series), 1)
+    
+    def test_cache_invalidated_per_bucket(self):
+        """Test that cached buckets are reused and only refreshed days are recomputed."""
+        from datetime import timedelta
+        from .rollups import refresh_daily_rollups
+        from .timeseries import revenue_series
+        
+        date_from = self.today - timedelta(days=3)
+        revenue_series(date_from, self.today, 'day')
+        with self.assertNumQueries(0):
+            revenue_series(date_from, self.today, 'day')
+        
+        from .models import DailySales
+        DailySales.objects.filter(date=self.today).update(revenue=Decimal('999.00'))
+        refresh_daily_rollups([self.today - timedelta(days=3)])
+        
+        # Сегодняшний интервал не сбрасывался — остаётся в кэше
+        series = revenue_series(date_from, self.today, 'day')
+        self.assertEqual(series[-1]['revenue'], 200.0)
+    
+    def test_endpoint_validation(self):
+        """Test the endpoint response and parameter errors."""
+        client = APIClient()
+        client.force_authenticate(user=self.admin_user)
+        
+        response = client.get('/api/analytics/revenue-series/', {'granularity': 'week', 'dims': 'payment_status'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['dims'], ['payment_status'])
+        
+        response = client.get('/api/analytics/revenue-series/', {'dims': 'colour'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = client.get('/api/analytics/revenue-series/', {'granularity': 'hour', 'from': '2020-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestInventoryForecasts(TestCase):
+    """Test sales velocity, days of cover and reorder suggestions."""
+    
+    def setUp(self):
+        """Set up products with different sales and stock."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from orders.models import Order, OrderItem
+        
+        customer = User.objects.create_user(
+            username='customer', email='customer@test.com', password='testpass123'
+        )
+        self.manager = User.objects.create_user(
+            username='manager', email='manager@test.com', password='testpass123', role='manager'
+        )
+        category = Category.objects.create(name='Bread', slug='bread')
+        
+        def product(slug, stock, reserved=0):
+            created = Product.objects.create(
+                name=slug.title(), slug=slug, description='Test', price=Decimal('100.00'),
+                category=category, stock_quantity=stock, reserved_quantity=reserved
+            )
+            Product.objects.filter(id=created.id).update(created_at=timezone.now() - timedelta(days=60))
+            return created
+        
+        # 28 шт. за 28 дней = 1 в день
+        self.fast = product('fast', stock=8, reserved=3)
+        self.steady = product('steady', stock=100)
+        self.idle = product('idle', stock=5)
+        self.empty = product('empty', stock=0)
+        
+        for number, status_value in enumerate(['delivered', 'delivered', 'cancelled']):
+            order = Order.objects.create(
+                user=customer, order_number=f'ORD-INV-{number}', total_amount=Decimal('100.00'),
+                shipping_address='Test Address', status=status_value
+            )
+            Order.objects.filter(id=order.id).update(created_at=timezone.now() - timedelta(days=3))
+            OrderItem.objects.create(order=order, product=self.fast, quantity=14, price=Decimal('100.00'))
+            OrderItem.objects.create(order=order, product=self.steady, quantity=14, price=Decimal('100.00'))
+            OrderItem.objects.create(order=order, product=self.empty, quantity=1, price=Decimal('100.00'))
+    
+    def test_forecast_product(self):
+        """Test the per-product math."""
+        from .inventory import forecast_product
+        
+        params = {'lead_time_days': 7, 'safety_days': 3, 'target_cover_days': 30}
+        self.assertEqual(forecast_product(28, 28, 5, params), (1.0, 5.0, 32, 'critical'))
+        self.assertEqual(forecast_product(28, 28, 8, params), (1.0, 8.0, 29, 'low'))
+        self.assertEqual(forecast_product(28, 28, 100, params), (1.0, 100.0, 0, 'ok'))
+        self.assertEqual(forecast_product(0, 28, 5, params), (0, None, 0, 'no_sales'))
+        self.assertEqual(forecast_product(0, 28, 0, params), (0, None, 0, 'out_of_stock'))
+    
+    def test_compute_stores_rows(self):
+        """Test that forecasts are stored per active product and cancelled orders are ignored."""
+        from .inventory import compute_inventory_forecasts
+        from .models import InventoryForecast
+        
+        with self.assertNumQueries(6):
+            stored = compute_inventory_forecasts()
+        
+        self.assertEqual(stored, 4)
+        fast = InventoryForecast.objects.get(product=self.fast)
+        self.assertEqual(fast.units_sold, 28)
+        self.assertEqual(fast.available_quantity, 5)
+        self.assertEqual(fast.days_of_cover, Decimal('5.0'))
+        self.assertEqual(fast.status, 'critical')
+        self.assertEqual(fast.reorder_quantity, 32)
+        self.assertEqual(InventoryForecast.objects.get(product=self.idle).status, 'no_sales')
+        self.assertEqual(InventoryForecast.objects.get(product=self.empty).status, 'out_of_stock')
+        
+        # Повторный запуск заменяет строки
+        Product.objects.filter(id=self.idle.id).update(is_active=False)
+        self.assertEqual(compute_inventory_forecasts(), 3)
+        self.assertEqual(InventoryForecast.objects.count(), 3)
+    
+    def test_report_and_dashboard_read_stored_rows(self):
+        """Test the manager report and the dashboard low-stock list."""
+        from .inventory import compute_inventory_forecasts
+        compute_inventory_forecasts()
+        
+        client = APIClient()
+        client.force_authenticate(user=self.manager)
+        response = client.get('/api/analytics/inventory/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual([row['id'] for row in data['results']], [self.empty.id, self.fast.id])
+        self.assertEqual(data['summary']['ok'], 1)
+        
+        response = client.get('/api/analytics/inventory/', {'status': 'gone'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        customer = User.objects.get(email='customer@test.com')
+        client.force_authenticate(user=customer)
+        self.assertEqual(client.get('/api/analytics/inventory/').status_code, status.HTTP_403_FORBIDDEN)
+        
+        admin = User.objects.create_user(
+            username='admin', email='admin@test.com', password='testpass123', is_staff=True
+        )
+        client.force_authenticate(user=admin)
+        products = client.get('/api/analytics/dashboard/').json()['products']
+        self.assertEqual(products['low_stock'], 1)
+        self.assertEqual(products['low_stock_list'][0]['id'], self.fast.id)
+        self.assertEqual(products['low_stock_list'][0]['days_of_cover'], 5.0)
+
+
+@override_settings(ROLLUP_REFRESH_DEBOUNCE=0)
+class TestDashboardWidgets(TestCase):
+    """Test per-widget caching, invalidation and timings of the dashboard."""
+    
+    def setUp(self):
+        """Set up an admin, a product and a paid order."""
+        from orders.models import Order
+        
+        self.admin_user = User.objects.create_user(
+            username='admin', email='admin@test.com', password='testpass123', is_staff=True
+        )
+        category = Category.objects.create(name='Bread', slug='bread')
+        self.product = Product.objects.create(
+            name='Bread', slug='bread', description='Test', price=Decimal('100.00'),
+            category=category, stock_quantity=0
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(
+                user=self.admin_user, order_number='ORD-DASH-1', total_amount=Decimal('100.00'),
+                shipping_address='Test Address', payment_status='paid'
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin_user)
+    
+    def test_composite_served_from_cache(self):
+        """Test that the second request reads every widget from cache."""
+        from .dashboard import WIDGETS
+        
+        response = self.client.get('/api/analytics/dashboard/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(set(data['widgets']), set(WIDGETS))
+        self.assertFalse(any(widget['cached'] for widget in data['widgets'].values()))
+        self.assertEqual(data['orders']['total'], 1)
+        self.assertEqual(data['revenue']['total'], 100.0)
+        self.assertEqual(data['products']['out_of_stock'], 1)
+        self.assertEqual(data['recent_orders'][0]['order_number'], 'ORD-DASH-1')
+        self.assertIn('products;dur=', response['Server-Timing'])
+        
+        # Сессия и пользователь DRF — без запросов к данным виджетов
+        with self.assertNumQueries(0):
+            data = self.client.get('/api/analytics/dashboard/').json()
+        self.assertTrue(all(widget['cached'] for widget in data['widgets'].values()))
+    
+    def test_invalidation_triggers(self):
+        """Test that writes drop only the widgets they affect."""
+        from orders.models import Order
+        from .dashboard import dashboard_widgets
+        
+        dashboard_widgets(['orders', 'products', 'recent_orders', 'carts'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.stock_quantity = 5
+            self.product.save()
+        cached = {name: widget['cached'] for name, widget in dashboard_widgets(['orders', 'products']).items()}
+        self.assertEqual(cached, {'orders': True, 'products': False})
+        
+        # Резерв не показывается в виджете — кэш не сбрасывается
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.reserve(1)
+        self.assertTrue(dashboard_widgets(['products'])['products']['cached'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(
+                user=self.admin_user, order_number='ORD-DASH-2', total_amount=Decimal('50.00'),
+                shipping_address='Test Address'
+            )
+        widgets = dashboard_widgets(['orders', 'products', 'recent_orders', 'carts'])
+        self.assertEqual(
+            {name: widget['cached'] for name, widget in widgets.items()},
+            {'orders': False, 'products': True, 'recent_orders': False, 'carts': True}
+        )
+        self.assertEqual(widgets['orders']['data']['orders']['total'], 2)
+    
+    def test_single_widget_endpoint(self):
+        """Test one widget per request and 404 for unknown widgets."""
+        response = self.client.get('/api/analytics/dashboard/users/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['widget'], 'users')
+        self.assertFalse(data['cached'])
+        self.assertIn('ms', data)
+        self.assertEqual(data['users']['total'], 1)
+        
+        response = self.client.get('/api/analytics/dashboard/secrets/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestDashboardWidgetsConcurrency(TransactionTestCase):
+    """Test that cache misses are computed in worker threads."""
+    
+    def test_misses_computed_concurrently(self):
+        """Test that every widget is computed outside the request thread."""
+        import threading
+        from unittest import mock
+        from . import dashboard
+        
+        category = Category.objects.create(name='Bread', slug='bread')
+        Product.objects.create(
+            name='Bread', slug='bread', description='Test', price=Decimal('100.00'),
+            category=category, stock_quantity=0
+        )
+        threads = set()
+        compute = dashboard._compute
+        
+        def tracking_compute(name, today):
+            threads.add(threading.get_ident())
+            return compute(name, today)
+        
+        with mock.patch.object(dashboard, '_compute', tracking_compute):
+            widgets = dashboard.dashboard_widgets(list(dashboard.WIDGETS))
+        
+        self.assertNotIn(threading.get_ident(), threads)
+        self.assertEqual(widgets['products']['data']['products']['out_of_stock'], 1)
+    
+    def test_workers_limited_by_pool_headroom(self):
+        """Test that widget threads only use pool connections the request threads do not need."""
+        from unittest import mock
+        from django.conf import settings
+        from django.test import override_settings
+        from .dashboard import _widget_workers
+        
+        def with_pool(max_size, threads):
+            options = {'pool': {'min_size': 1, 'max_size': max_size}}
+            with mock.patch.dict(settings.DATABASES['default'], OPTIONS=options):
+                with override_settings(GUNICORN_THREADS=threads, DASHBOARD_WIDGET_WORKERS=4):
+                    return _widget_workers(7)
+        
+        with override_settings(DASHBOARD_WIDGET_WORKERS=4):
+            self.assertEqual(_widget_workers(7), 4)
+            self.assertEqual(_widget_workers(2), 2)
+        # Пул размером в число потоков gunicorn — свободных соединений нет, считаем последовательно
+        self.assertEqual(with_pool(max_size=4, threads=4), 1)
+        self.assertEqual(with_pool(max_size=6, threads=4), 2)
+        self.assertEqual(with_pool(max_size=10, threads=4), 4)
+
+
+class TestAnalyticsEventStream(TestCase):
+    """Test the real-time event bus, its signal feeds and the SSE endpoint."""
+    
+    def setUp(self):
+        """Set up a customer, an admin and a product on an empty event bus."""
+        from django.core.cache import cache
+        
+        # Шина событий живёт в кэше — номера событий не должны тянуться из других тестов
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.customer = User.objects.create_user(
+            username='customer', email='customer@test.com', password='testpass123'
+        )
+        self.admin_user = User.objects.create_user(
+            username='admin', email='admin@test.com', password='testpass123', is_staff=True
+        )
+        category = Category.objects.create(name='Bread', slug='bread')
+        self.product = Product.objects.create(
+            name='Bread', slug='bread', description='Test', price=Decimal('100.00'),
+            category=category, stock_quantity=2
+        )
+    
+    def _events(self):
+        from asgiref.sync import async_to_sync
+        from .events import read_events
+        events, _ = async_to_sync(read_events)(0)
+        return [(event['type'], event['data']) for event in events]
+    
+    def test_signals_publish_after_commit(self):
+        """Test order, payment, cart and stock-out events."""
+        from orders.models import Order
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(
+                user=self.customer, order_number='ORD-EVT-1', total_amount=Decimal('200.00'),
+                shipping_address='Test Address'
+            )
+            self.assertEqual(self._events(), [])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.get(id=order.id)
+            order.payment_status = 'paid'
+            order.save()
+            # Повторное сохранение оплаченного заказа — не новая оплата
+            order.save()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            cart = Cart.objects.create(user=self.customer)
+            item = CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+            item.quantity = 3
+            item.save()
+            item.quantity = 2
+            item.save()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.reserve(1)
+            self.product.deduct_stock(2)
+        
+        self.assertEqual([event_type for event_type, _ in self._events()], [
+            'order.created', 'order.paid', 'cart.item_added', 'cart.item_added', 'product.out_of_stock'
+        ])
+        self.assertEqual(self._events()[3][1], {'product_id': self.product.id, 'quantity': 2})
+    
+    def test_bulk_transition_publishes_payment(self):
+        """Test that set-based payment transitions are published too."""
+        from orders.models import Order
+        from orders.state_machine import transition_orders
+        
+        order = Order.objects.create(
+            user=self.customer, order_number='ORD-EVT-2', total_amount=Decimal('200.00'),
+            shipping_address='Test Address'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_orders([order.id], {'payment_status': 'paid'})
+        
+        self.assertIn(('order.paid', {'id': order.id}), self._events())
+    
+    def test_read_events_waits_for_unstored_event(self):
+        """Test that a taken but not yet stored sequence number stops the batch."""
+        from asgiref.sync import async_to_sync
+        from django.core.cache import cache
+        from .events import SEQ_KEY, publish, read_events
+        
+        publish('order.created', {'id': 1})
+        cache.incr(SEQ_KEY)
+        publish('order.created', {'id': 3})
+        
+        events, last = async_to_sync(read_events)(0)
+        self.assertEqual(([event['id'] for event in events], last), ([1], 1))
+    
+    async def test_stream_endpoint(self):
+        """Test auth, replay after Last-Event-ID and live delivery."""
+        import asyncio
+        from asgiref.sync import sync_to_async
+        from django.test import AsyncClient, override_settings
+        from rest_framework_simplejwt.tokens import AccessToken
+        from .events import publish
+        
+        customer_token = await sync_to_async(AccessToken.for_user)(self.customer)
+        admin_token = await sync_to_async(AccessToken.for_user)(self.admin_user)
+        client = AsyncClient()
+        
+        response = await client.get('/api/analytics/events/')
+        self.assertEqual(response.status_code, 401)
+        response = await client.get(
+            '/api/analytics/events/', headers={'Authorization': f'Bearer {customer_token}'}
+        )
+        self.assertEqual(response.status_code, 403)
+        
+        await sync_to_async(publish)('order.created', {'id': 1})
+        with override_settings(EVENT_STREAM_POLL_INTERVAL=0.01, EVENT_STREAM_MAX_SECONDS=0.5):
+            response = await client.get(
+                '/api/analytics/events/',
+                headers={'Authorization': f'Bearer {admin_token}', 'Last-Event-ID': '0'}
+            )
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            asyncio.get_running_loop().call_later(0.1, publish, 'product.out_of_stock', {'id': 7})
+            body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        
+        self.assertIn('id: 1\nevent: order.created\n', body)
+        self.assertIn('id: 2\nevent: product.out_of_stock\n', body)
+
+
+class TestReplicaRouting(TransactionTestCase):
+    """Test read routing with a second database alias pointing at the test database."""
+    
+    # ``replica`` нет в настройках, поэтому тест-раннер о нём не знает: алиас
+    # добавляется и разрешается классу уже после подготовки тестовых БД
+    databases = {'default'}
+    
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Отдельное соединение к той же тестовой БД — данные закоммичены, реплика их видит
+        cls._add_replica()
+        cls.databases = cls.databases | {'replica'}
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls._drop_replica()
+        super().tearDownClass()
+    
+    @staticmethod
+    def _add_replica():
+        from django.db import connections
+        default = connections.settings['default']
+        # Зеркало default: очистка БД между тестами его пропускает
+        connections.settings['replica'] = {**default, 'TEST': {**default['TEST'], 'MIRROR': 'default'}}
+    
+    @staticmethod
+    def _drop_replica():
+        from django.db import connections
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+    
+    def setUp(self):
+        """Set up a manager and a product."""
+        self.manager = User.objects.create_user(
+            username='manager', email='manager@test.com', password='testpass123', role='manager'
+        )
+        category = Category.objects.create(name='Bread', slug='bread')
+        self.product = Product.objects.create(
+            name='Bread', slug='bread', description='Test', price=Decimal('100.00'),
+            category=category, stock_quantity=5
+        )
+    
+    def _run(self, func):
+        """Run ``func`` in a fresh context, like a new request, capturing queries per alias."""
+        import contextvars
+        from django.db import connections
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections['replica']) as replica:
+                result = contextvars.Context().run(func)
+        return result, len(primary), len(replica)
+    
+    def test_only_opted_in_reads_use_replica(self):
+        """Test reads inside ``replica_reads`` and writes of objects read from the replica."""
+        from pkubg_ecommerce.db_router import replica_reads
+        
+        def read_and_save():
+            with replica_reads():
+                product = Product.objects.get(id=self.product.id)
+            Product.objects.count()
+            product.name = 'Rye bread'
+            product.save()
+            return product
+        
+        product, primary, replica = self._run(read_and_save)
+        # С реплики — только get; count, UPDATE и запросы сигналов — в основной
+        self.assertEqual(replica, 1)
+        self.assertGreaterEqual(primary, 2)
+        self.assertEqual(product._state.db, 'default')
+        self.assertEqual(Product.objects.get(id=product.id).name, 'Rye bread')
+    
+    def test_read_your_writes(self):
+        """Test that reads after a write in the same context stay on primary."""
+        from pkubg_ecommerce.db_router import replica_reads
+        
+        def write_then_read():
+            Product.objects.filter(id=self.product.id).update(stock_quantity=4)
+            with replica_reads():
+                return Product.objects.get(id=self.product.id).stock_quantity
+        
+        stock, primary, replica = self._run(write_then_read)
+        self.assertEqual((stock, replica), (4, 0))
+    
+    def test_lagging_or_missing_replica_falls_back(self):
+        """Test fallback to primary when the replica lags or is not configured."""
+        from unittest import mock
+        from django.test import override_settings
+        from pkubg_ecommerce import db_router
+        
+        def read():
+            with db_router.replica_reads():
+                return Product.objects.all().db
+        
+        with override_settings(REPLICA_MAX_LAG=1), mock.patch.object(db_router, '_measure_lag', return_value=5.0):
+            self.assertEqual(self._run(read)[0], 'default')
+        
+        self._drop_replica()
+        try:
+            self.assertEqual(read(), 'default')
+        finally:
+            self._add_replica()
+    
+    def test_requests_stick_to_primary_after_write(self):
+        """Test reporting endpoints on the replica and the sticky cookie after a write."""
+        from django.db import connections
+        from django.test.utils import CaptureQueriesContext
+        from pkubg_ecommerce.db_router import STICKY_COOKIE
+        
+        client = APIClient()
+        client.force_authenticate(user=self.manager)
+        
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = client.get('/api/orders/admin/statistics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(len(replica), 0)
+        
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(client.get('/sitemap.xml').status_code, status.HTTP_200_OK)
+        self.assertGreater(len(replica), 0)
+        
+        response = client.post('/api/orders/cart/add/', {'product_id': self.product.id, 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(client.get('/api/orders/admin/statistics/').status_code, status.HTTP_200_OK)
+        self.assertEqual(len(replica), 0)
+
+
 @pytest.mark.property_tests
 class TestAnalyticsProperties:
     """Property-based tests for analytics functionality."""
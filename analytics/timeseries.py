@@ -0,0 +1,242 @@
+"""
+Revenue / orders time series with arbitrary granularity and dimensions.
+
+Without dimensions, day/week/month series come from ``DailySales`` (one
+grouped query over the rollup). Hourly series and dimensional breakdowns run
+one grouped query over the raw tables, restricted by the indexed
+``created_at`` range. Gaps are zero-filled.
+
+Each bucket is cached separately under a per-bucket version. When a day's
+rollups are refreshed, ``invalidate_series_buckets`` bumps the versions of
+only the buckets containing that day, so cached history stays valid and a
+request recomputes just the missing span.
+"""
+import time as time_module
+from calendar import monthrange
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDay, TruncHour, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from .models import DailySales
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+
+# Измерение -> (уровень запроса, поле)
+DIMENSIONS = {
+    'category': ('item', 'product__category__name'),
+    'manufacturer': ('item', 'product__manufacturer'),
+    'delivery_method': ('order', 'delivery_method'),
+    'payment_status': ('order', 'payment_status'),
+}
+
+MAX_BUCKETS = 1000
+
+_TRUNC = {'hour': TruncHour, 'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+
+class SeriesError(ValueError):
+    """Invalid range, granularity or dimension."""
+
+
+def bucket_floor(moment, granularity):
+    """Naive local start of the bucket containing ``moment`` (date or naive datetime)."""
+    if not isinstance(moment, datetime):
+        moment = datetime.combine(moment, time.min)
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = datetime.combine(moment.date(), time.min)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, granularity):
+    if granularity == 'hour':
+        return start + timedelta(hours=1)
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    return start + timedelta(days=monthrange(start.year, start.month)[1])
+
+
+def bucket_range(date_from, date_to, granularity):
+    """Bucket starts covering the days ``date_from``..``date_to`` inclusive."""
+    buckets = []
+    current = bucket_floor(date_from, granularity)
+    end = datetime.combine(date_to + timedelta(days=1), time.min)
+    while current < end:
+        buckets.append(current)
+        if len(buckets) > MAX_BUCKETS:
+            raise SeriesError(f'Слишком много интервалов (больше {MAX_BUCKETS}), увеличьте granularity')
+        current = next_bucket(current, granularity)
+    return buckets
+
+
+def parse_dimensions(raw):
+    dims = [dim.strip() for dim in (raw or '').split(',') if dim.strip()]
+    unknown = [dim for dim in dims if dim not in DIMENSIONS]
+    if unknown:
+        raise SeriesError(f'Неизвестные измерения: {", ".join(unknown)}')
+    return sorted(set(dims))
+
+
+def _local_naive(value):
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.replace(tzinfo=None)
+    return datetime.combine(value, time.min)
+
+
+def _query_rollups(start, end, granularity):
+    queryset = DailySales.objects.filter(date__gte=start.date(), date__lt=end.date())
+    if granularity == 'day':
+        queryset = queryset.annotate(bucket=F('date'))
+    else:
+        queryset = queryset.annotate(bucket=_TRUNC[granularity]('date'))
+    rows = (
+        queryset
+        .values('bucket')
+        .annotate(orders=Sum('orders_count'), revenue=Sum('revenue'))
+        .order_by()
+    )
+    for row in rows:
+        yield _local_naive(row['bucket']), (), row['orders'], row['revenue']
+
+
+def _query_raw(start, end, granularity, dims):
+    aware_start, aware_end = timezone.make_aware(start), timezone.make_aware(end)
+    money = DecimalField(max_digits=14, decimal_places=2)
+    levels = {DIMENSIONS[dim][0] for dim in dims}
+
+    if 'item' in levels:
+        fields = [
+            DIMENSIONS[dim][1] if DIMENSIONS[dim][0] == 'item' else f'order__{DIMENSIONS[dim][1]}'
+            for dim in dims
+        ]
+        queryset = OrderItem.objects.filter(
+            order__created_at__gte=aware_start, order__created_at__lt=aware_end
+        ).annotate(bucket=_TRUNC[granularity]('order__created_at'))
+        metrics = {
+            'orders': Count('order_id', distinct=True),
+            'revenue': Coalesce(
+                Sum(F('quantity') * F('price'), filter=Q(order__payment_status='paid'), output_field=money),
+                0, output_field=money
+            ),
+        }
+    else:
+        fields = [DIMENSIONS[dim][1] for dim in dims]
+        queryset = Order.objects.filter(
+            created_at__gte=aware_start, created_at__lt=aware_end
+        ).annotate(bucket=_TRUNC[granularity]('created_at'))
+        metrics = {
+            'orders': Count('id'),
+            'revenue': Coalesce(
+                Sum('total_amount', filter=Q(payment_status='paid')), 0, output_field=money
+            ),
+        }
+
+    rows = queryset.values('bucket', *fields).annotate(**metrics).order_by()
+    for row in rows:
+        key = tuple(row[field] if row[field] not in (None, '') else 'none' for field in fields)
+        yield _local_naive(row['bucket']), key, row['orders'], row['revenue']
+
+
+def _compute(start, end, granularity, dims):
+    """``{bucket: {dim_key: (orders, revenue)}}`` for ``[start, end)``."""
+    if dims or granularity == 'hour':
+        rows = _query_raw(start, end, granularity, dims)
+    else:
+        rows = _query_rollups(start, end, granularity)
+
+    result = {}
+    for bucket, key, orders, revenue in rows:
+        result.setdefault(bucket, {})[key] = (orders or 0, float(revenue or 0))
+    return result
+
+
+def _version_key(granularity, bucket):
+    return f'analytics:series-version:{granularity}:{bucket.isoformat()}'
+
+
+def _value_key(granularity, bucket, dims, version):
+    return f'analytics:series:{granularity}:{bucket.isoformat()}:{",".join(dims)}:{version}'
+
+
+def invalidate_series_buckets(days):
+    """Bump the cache version of every bucket that contains one of ``days``."""
+    version = str(time_module.time_ns())
+    keys = {}
+    for day in days:
+        start = datetime.combine(day, time.min)
+        for granularity in ('day', 'week', 'month'):
+            keys[_version_key(granularity, bucket_floor(start, granularity))] = version
+        for hour in range(24):
+            keys[_version_key('hour', start + timedelta(hours=hour))] = version
+    if keys:
+        cache.set_many(keys, None)
+
+
+def revenue_series(date_from, date_to, granularity='day', dims=()):
+    """
+    Zero-filled series of ``{'bucket', 'orders', 'revenue'}`` (plus dimension values).
+
+    Cached per bucket; only buckets without a current cached value are queried,
+    with one grouped query over their span.
+    """
+    if granularity not in GRANULARITIES:
+        raise SeriesError('granularity должен быть hour, day, week или month')
+    if date_from > date_to:
+        raise SeriesError('from позже to')
+    dims = list(dims)
+    buckets = bucket_range(date_from, date_to, granularity)
+
+    versions = cache.get_many([_version_key(granularity, bucket) for bucket in buckets])
+    value_keys = {
+        bucket: _value_key(
+            granularity, bucket, dims, versions.get(_version_key(granularity, bucket), '0')
+        )
+        for bucket in buckets
+    }
+    cached = cache.get_many(value_keys.values())
+    values = {
+        bucket: cached[key] for bucket, key in value_keys.items() if key in cached
+    }
+
+    missing = [bucket for bucket in buckets if bucket not in values]
+    if missing:
+        computed = _compute(missing[0], next_bucket(missing[-1], granularity), granularity, dims)
+        fresh = {bucket: computed.get(bucket, {}) for bucket in missing}
+        values.update(fresh)
+        cache.set_many(
+            {value_keys[bucket]: data for bucket, data in fresh.items()},
+            getattr(settings, 'REVENUE_SERIES_CACHE_TTL', 24 * 60 * 60)
+        )
+
+    # Все сочетания измерений, встретившиеся в диапазоне, — в каждом интервале
+    keys = sorted({key for data in values.values() for key in data}) or [()]
+    series = []
+    for bucket in buckets:
+        for key in keys:
+            orders, revenue = values[bucket].get(key, (0, 0.0))
+            point = {'bucket': bucket.isoformat(), 'orders': orders, 'revenue': revenue}
+            point.update(zip(dims, key))
+            series.append(point)
+    return series
+
+
+def parse_day(value, default):
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise SeriesError(f'Неверная дата: {value}, ожидается YYYY-MM-DD')
@@ -4,5 +4,11 @@ from . import views
 urlpatterns = [
     path('cart-statistics/', views.cart_statistics, name='cart-statistics'),
     path('real-time-cart/', views.real_time_cart_stats, name='real-time-cart'),
+    path('cart-trends/', views.cart_trends_view, name='cart-trends'),
+    path('cohorts/', views.cohort_analytics, name='cohort-analytics'),
+    path('revenue-series/', views.revenue_timeseries, name='revenue-series'),
+    path('inventory/', views.inventory_report, name='inventory-report'),
     path('dashboard/', views.DashboardAnalyticsView.as_view(), name='dashboard-analytics'),
-]
\ No newline at end of file
+    path('events/', views.analytics_event_stream, name='event-stream'),
+    path('dashboard/<str:name>/', views.dashboard_widget, name='dashboard-widget'),
+]
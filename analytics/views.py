@@ -1,239 +1,292 @@
 """
 Analytics views for cart statistics and dashboard.
 """
+import asyncio
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Sum, Count, Avg, F
-from django.db.models.functions import TruncDate
+from django.conf import settings
+from django.db.models import Count, F, Max
 from django.utils import timezone
 from datetime import timedelta
 
-from orders.models import Cart, CartItem, Order, OrderItem
-from products.models import Product, Category
-from django.contrib.auth import get_user_model
+from pkubg_ecommerce.async_views import async_jwt_required
+from pkubg_ecommerce.db_router import replica_reads
+from products.permissions import IsAdminOrManager
+from .cohorts import MAX_COHORT_MONTHS, cohort_report
+from .dashboard import WIDGETS, dashboard_widgets
+from .events import get_hub, read_events
+from .timeseries import SeriesError, parse_day, parse_dimensions, revenue_series
+from .cart_snapshots import GRANULARITIES, bucket_start, cart_trends, live_cart_stats
+from .inventory import REORDER_STATUSES, forecast_payload, inventory_settings
+from .models import InventoryForecast
+
 
-User = get_user_model()
+def _cart_stats_payload(stats):
+    return {
+        'total_carts': stats['total_carts'],
+        'total_items': stats['total_items'],
+        'total_value': float(stats['total_value']),
+        'abandoned_carts': stats['abandoned_carts'],
+        'abandoned_items': stats['abandoned_items'],
+        'abandoned_value': float(stats['abandoned_value']),
+        'computed_at': stats['computed_at'].isoformat(),
+    }
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
+@replica_reads()
 def cart_statistics(request):
-    active_carts = Cart.objects.filter(items__isnull=False).distinct()
-    total_items = CartItem.objects.aggregate(total=Sum('quantity'))['total'] or 0
-    total_value = sum(cart.total_amount for cart in active_carts)
-    total_carts = active_carts.count()
+    payload = _cart_stats_payload(live_cart_stats())
+    payload['timestamp'] = request.META.get('HTTP_DATE', None)
+    return Response(payload, status=status.HTTP_200_OK)
+
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@replica_reads()
+def real_time_cart_stats(request):
+    payload = _cart_stats_payload(live_cart_stats())
+    payload['timestamp'] = request.META.get('HTTP_DATE', None)
+    return Response(payload, status=status.HTTP_200_OK)
+
+
+# Сколько дней истории отдаёт cart_trends по умолчанию и максимум
+CART_TRENDS_DEFAULT_DAYS = {'hour': 2, 'day': 30}
+CART_TRENDS_MAX_DAYS = 366
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@replica_reads()
+def cart_trends_view(request):
+    """
+    Cart snapshots over time: abandoned-cart value and basket size.
+
+    Query params: ``granularity=hour|day`` (default ``day``), ``days``.
+    """
+    granularity = request.query_params.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return Response(
+            {'error': 'granularity должен быть hour или day'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        days = int(request.query_params.get('days', CART_TRENDS_DEFAULT_DAYS[granularity]))
+    except ValueError:
+        return Response({'error': 'days должен быть числом'}, status=status.HTTP_400_BAD_REQUEST)
+    days = min(max(days, 1), CART_TRENDS_MAX_DAYS)
+    
+    since = bucket_start(timezone.now() - timedelta(days=days), granularity)
     return Response({
-        'total_carts': total_carts,
-        'total_items': total_items,
-        'total_value': float(total_value),
-        'timestamp': request.META.get('HTTP_DATE', None)
-    }, status=status.HTTP_200_OK)
+        'granularity': granularity,
+        'days': days,
+        'results': cart_trends(granularity, since),
+    })
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
-def real_time_cart_stats(request):
-    return cart_statistics(request)
+@replica_reads()
+def cohort_analytics(request):
+    """
+    Signup-month cohorts: conversion, repeat rate, time to first order,
+    retention and LTV by month since signup. Query param: ``months`` (default 12).
+    """
+    try:
+        months = int(request.query_params.get('months', 12))
+    except ValueError:
+        return Response({'error': 'months должен быть числом'}, status=status.HTTP_400_BAD_REQUEST)
+    months = min(max(months, 1), MAX_COHORT_MONTHS)
+    
+    return Response(cohort_report(months))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@replica_reads()
+def revenue_timeseries(request):
+    """
+    Orders and paid revenue over time.
+
+    Query params: ``from``/``to`` (YYYY-MM-DD, default last 30 days),
+    ``granularity=hour|day|week|month`` (default ``day``) and ``dims`` — any of
+    ``category,manufacturer,delivery_method,payment_status``.
+    """
+    today = timezone.localdate()
+    try:
+        date_from = parse_day(request.query_params.get('from'), today - timedelta(days=29))
+        date_to = parse_day(request.query_params.get('to'), today)
+        dims = parse_dimensions(request.query_params.get('dims'))
+        granularity = request.query_params.get('granularity', 'day')
+        series = revenue_series(date_from, date_to, granularity, dims)
+    except SeriesError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'granularity': granularity,
+        'dims': dims,
+        'results': series,
+    })
+
+
+INVENTORY_REPORT_DEFAULT_LIMIT = 100
+INVENTORY_REPORT_MAX_LIMIT = 500
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminOrManager])
+@replica_reads()
+def inventory_report(request):
+    """
+    Stored inventory forecasts: velocity, days of cover and reorder quantity.
+
+    Query params: ``status`` (comma-separated; default: products needing a
+    reorder), ``limit``. Most urgent first.
+    """
+    valid = {value for value, _ in InventoryForecast.STATUS_CHOICES}
+    raw = request.query_params.get('status')
+    statuses = [value.strip() for value in raw.split(',') if value.strip()] if raw else list(REORDER_STATUSES)
+    unknown = [value for value in statuses if value not in valid]
+    if unknown:
+        return Response(
+            {'error': f'Неизвестный статус: {", ".join(unknown)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        limit = int(request.query_params.get('limit', INVENTORY_REPORT_DEFAULT_LIMIT))
+    except ValueError:
+        return Response({'error': 'limit должен быть числом'}, status=status.HTTP_400_BAD_REQUEST)
+    limit = min(max(limit, 1), INVENTORY_REPORT_MAX_LIMIT)
+    
+    forecasts = InventoryForecast.objects.filter(product__is_active=True)
+    summary = dict(
+        forecasts.values('status').annotate(count=Count('id')).order_by().values_list('status', 'count')
+    )
+    rows = (
+        forecasts.filter(status__in=statuses)
+        .select_related('product')
+        .order_by(F('days_of_cover').asc(nulls_last=True), '-daily_velocity', 'product_id')[:limit]
+    )
+    return Response({
+        'computed_at': forecasts.aggregate(last=Max('computed_at'))['last'],
+        'settings': inventory_settings(),
+        'summary': {value: summary.get(value, 0) for value in sorted(valid)},
+        'results': [forecast_payload(forecast) for forecast in rows],
+    })
+
+
+def _server_timing(widgets):
+    return ', '.join(
+        f'{name};dur={widget["ms"]};desc="{"cached" if widget["cached"] else "computed"}"'
+        for name, widget in widgets.items()
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@replica_reads()
+def dashboard_widget(request, name):
+    """One dashboard section with its own cache (see ``analytics.dashboard``)."""
+    if name not in WIDGETS:
+        return Response({'error': f'Неизвестный виджет: {name}'}, status=status.HTTP_404_NOT_FOUND)
+    
+    widget = dashboard_widgets([name])[name]
+    response = Response({
+        'widget': name,
+        'cached': widget['cached'],
+        'ms': widget['ms'],
+        'computed_at': widget['computed_at'],
+        **widget['data'],
+    })
+    response['Server-Timing'] = _server_timing({name: widget})
+    return response
 
 
 class DashboardAnalyticsView(APIView):
+    """All dashboard widgets in one response, plus per-widget timings."""
     permission_classes = [IsAuthenticated, IsAdminUser]
 
+    @replica_reads()
     def get(self, request):
-        now = timezone.now()
-        today = now.date()
-        week_ago = today - timedelta(days=7)
-        month_ago = today - timedelta(days=30)
-        prev_month_start = today - timedelta(days=60)
-        prev_month_end = today - timedelta(days=30)
-
-        # ═══ ЗАКАЗЫ ═══
-        all_orders = Order.objects.all()
-        orders_today = all_orders.filter(created_at__date=today).count()
-        orders_week = all_orders.filter(created_at__date__gte=week_ago).count()
-        orders_month = all_orders.filter(created_at__date__gte=month_ago).count()
-        orders_total = all_orders.count()
-
-        # Выручка (только оплаченные)
-        paid_orders = all_orders.filter(payment_status='paid')
-
-        revenue_month = float(
-            paid_orders.filter(created_at__date__gte=month_ago)
-            .aggregate(total=Sum('total_amount'))['total'] or 0
-        )
+        widgets = dashboard_widgets(list(WIDGETS))
 
-        revenue_prev_month = float(
-            paid_orders.filter(
-                created_at__date__gte=prev_month_start,
-                created_at__date__lt=prev_month_end
-            ).aggregate(total=Sum('total_amount'))['total'] or 0
-        )
+        payload = {}
+        for widget in widgets.values():
+            payload.update(widget['data'])
+        payload['widgets'] = {
+            name: {'cached': widget['cached'], 'ms': widget['ms'], 'computed_at': widget['computed_at']}
+            for name, widget in widgets.items()
+        }
+        response = Response(payload)
+        response['Server-Timing'] = _server_timing(widgets)
+        return response
 
-        revenue_total = float(
-            paid_orders.aggregate(total=Sum('total_amount'))['total'] or 0
-        )
 
-        avg_order = float(
-            paid_orders.aggregate(avg=Avg('total_amount'))['avg'] or 0
-        )
+def _sse(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
 
-        # Выручка по дням
-        revenue_by_day = []
-        raw_revenue = (
-            paid_orders
-            .filter(created_at__date__gte=month_ago)
-            .annotate(date=TruncDate('created_at'))
-            .values('date')
-            .annotate(revenue=Sum('total_amount'), count=Count('id'))
-            .order_by('date')
-        )
-        for item in raw_revenue:
-            revenue_by_day.append({
-                'date': item['date'].isoformat(),
-                'revenue': float(item['revenue']),
-                'count': item['count'],
-            })
-
-        # Заказы по статусам
-        orders_by_status = {}
-        for entry in all_orders.values('status').annotate(cnt=Count('id')):
-            orders_by_status[entry['status']] = entry['cnt']
-
-        # Заказы по статусу оплаты
-        orders_by_payment = {}
-        for entry in all_orders.values('payment_status').annotate(cnt=Count('id')):
-            orders_by_payment[entry['payment_status']] = entry['cnt']
-
-        # ═══ ТОП ТОВАРОВ ═══
-        top_products = []
-        raw_top = (
-            OrderItem.objects
-            .values('product__id', 'product__name')
-            .annotate(
-                total_sold=Sum('quantity'),
-                total_revenue=Sum(F('quantity') * F('price'))
-            )
-            .order_by('-total_sold')[:10]
+
+@require_GET
+@async_jwt_required
+async def analytics_event_stream(request):
+    """
+    Server-Sent Events: new orders, payments, cart adds and stock-outs.
+
+    Events missed since ``Last-Event-ID`` are replayed while they are still
+    on the bus. The stream ends after ``EVENT_STREAM_MAX_SECONDS``; the client
+    reconnects.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'detail': 'You do not have permission to perform this action.'}, status=403)
+    # Под WSGI Django дочитывает асинхронный поток целиком перед отправкой
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'Поток событий работает только под ASGI (SERVER_PROFILE=asgi)'}, status=501
         )
-        for p in raw_top:
-            top_products.append({
-                'product__id': p['product__id'],
-                'product__name': p['product__name'],
-                'total_sold': p['total_sold'],
-                'total_revenue': float(p['total_revenue'] or 0),
-            })
-
-        # ═══ ТОВАРЫ ═══
-        products = Product.objects.all()
-        products_total = products.count()
-        products_active = products.filter(is_active=True).count()
-        products_out_of_stock = products.filter(stock_quantity=0).count()
-        products_low_stock = products.filter(stock_quantity__gt=0, stock_quantity__lt=10).count()
-
-        low_stock_list = []
-        for p in products.filter(stock_quantity__gt=0, stock_quantity__lt=10).order_by('stock_quantity')[:10]:
-            low_stock_list.append({
-                'id': p.id,
-                'name': p.name,
-                'stock_quantity': p.stock_quantity,
-                'price': float(p.price),
-            })
-
-        out_of_stock_list = []
-        for p in products.filter(stock_quantity=0)[:10]:
-            out_of_stock_list.append({
-                'id': p.id,
-                'name': p.name,
-                'price': float(p.price),
-            })
-
-        # Товары по категориям
-        products_by_category = []
-        for cat in Category.objects.annotate(product_count=Count('product')).order_by('-product_count'):
-            products_by_category.append({
-                'id': cat.id,
-                'name': cat.name,
-                'product_count': cat.product_count,
-            })
-
-        # ═══ ПОЛЬЗОВАТЕЛИ ═══
-        users = User.objects.all()
-        total_users = users.count()
-        new_users_month = users.filter(date_joined__date__gte=month_ago).count()
-        new_users_week = users.filter(date_joined__date__gte=week_ago).count()
-        users_with_orders = all_orders.values('user').distinct().count()
-        conversion_rate = round((users_with_orders / total_users * 100), 1) if total_users > 0 else 0
-
-        # ═══ ПОСЛЕДНИЕ ЗАКАЗЫ ═══
-        recent_orders = []
-        for order in all_orders.select_related('user').order_by('-created_at')[:10]:
-            recent_orders.append({
-                'id': order.id,
-                'order_number': order.order_number,
-                'total_amount': float(order.total_amount),
-                'status': order.status,
-                'payment_status': order.payment_status,
-                'created_at': order.created_at.isoformat(),
-                'user__first_name': order.user.first_name if order.user else '',
-                'user__last_name': order.user.last_name if order.user else '',
-                'user__email': order.user.email if order.user else '',
-            })
-
-        # Рост выручки
-        revenue_growth = 0
-        if revenue_prev_month > 0:
-            revenue_growth = round(
-                ((revenue_month - revenue_prev_month) / revenue_prev_month) * 100, 1
-            )
-
-        # ═══ КОРЗИНЫ ═══
-        active_carts = Cart.objects.filter(items__isnull=False).distinct()
-        cart_total_items = CartItem.objects.aggregate(total=Sum('quantity'))['total'] or 0
-        cart_total_value = float(sum(cart.total_amount for cart in active_carts))
-
-        return Response({
-            'orders': {
-                'total': orders_total,
-                'today': orders_today,
-                'week': orders_week,
-                'month': orders_month,
-                'by_status': orders_by_status,
-                'by_payment': orders_by_payment,
-            },
-            'revenue': {
-                'total': revenue_total,
-                'month': revenue_month,
-                'prev_month': revenue_prev_month,
-                'growth_percent': revenue_growth,
-                'average_order': round(avg_order, 2),
-                'by_day': revenue_by_day,
-            },
-            'products': {
-                'total': products_total,
-                'active': products_active,
-                'out_of_stock': products_out_of_stock,
-                'low_stock': products_low_stock,
-                'categories_count': Category.objects.count(),
-                'low_stock_list': low_stock_list,
-                'out_of_stock_list': out_of_stock_list,
-                'by_category': products_by_category,
-            },
-            'top_products': top_products,
-            'users': {
-                'total': total_users,
-                'new_week': new_users_week,
-                'new_month': new_users_month,
-                'with_orders': users_with_orders,
-                'conversion_rate': conversion_rate,
-            },
-            'carts': {
-                'total_carts': active_carts.count(),
-                'total_items': cart_total_items,
-                'total_value': cart_total_value,
-            },
-            'recent_orders': recent_orders,
-        })
\ No newline at end of file
+    
+    hub = get_hub()
+    queue = await hub.subscribe()
+    upto = hub.last_seq
+    
+    missed = []
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    if last_event_id.isdigit():
+        missed, _ = await read_events(int(last_event_id), upto)
+    
+    heartbeat = getattr(settings, 'EVENT_STREAM_HEARTBEAT', 15)
+    
+    async def stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + getattr(settings, 'EVENT_STREAM_MAX_SECONDS', 10 * 60)
+        try:
+            yield 'retry: 3000\n\n'
+            for event in missed:
+                yield _sse(event)
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    # Комментарий держит соединение через прокси
+                    yield ': ping\n\n'
+                    continue
+                yield _sse(event)
+        finally:
+            hub.unsubscribe(queue)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
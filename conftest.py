@@ -17,6 +17,15 @@ if not settings.configured:
     django.setup()
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Start every test with an empty cache so cached snapshots don't leak between tests."""
+    from django.core.cache import cache
+    cache.clear()
+    yield
+    cache.clear()
+
+
 @pytest.fixture
 def api_client():
     """Fixture for Django REST framework test client."""
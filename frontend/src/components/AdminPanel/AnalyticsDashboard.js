@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useSelector } from 'react-redux';
 import { Link } from 'react-router-dom';
 import api from '../../utils/api';
+import { analyticsService } from '../../services/apiService';
 import './AnalyticsDashboard.css';
 
 const AnalyticsDashboard = () => {
@@ -13,8 +14,36 @@ const AnalyticsDashboard = () => {
 
   useEffect(() => {
     fetchAnalytics();
-    const interval = setInterval(fetchAnalytics, 60000);
-    return () => clearInterval(interval);
+    const interval = setInterval(fetchAnalytics, 5 * 60000);
+
+    // События заказов, оплат, корзин и остатков — перезагрузка не чаще раза в 5 секунд
+    const controller = new AbortController();
+    let reloadTimer = null;
+    const onEvent = () => {
+      if (!reloadTimer) {
+        reloadTimer = setTimeout(() => {
+          reloadTimer = null;
+          fetchAnalytics();
+        }, 5000);
+      }
+    };
+    const listen = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          await analyticsService.streamEvents(onEvent, controller.signal);
+        } catch (err) {
+          if (controller.signal.aborted) return;
+          await new Promise(resolve => setTimeout(resolve, 30000));
+        }
+      }
+    };
+    listen();
+
+    return () => {
+      clearInterval(interval);
+      clearTimeout(reloadTimer);
+      controller.abort();
+    };
   }, []);
 
   const fetchAnalytics = async () => {
@@ -269,7 +298,7 @@ const AnalyticsDashboard = () => {
             <div className="analytics-card">
               <div className="card-header">
                 <h3>🏆 Топ-10 товаров</h3>
-                <span className="card-subtitle">По количеству продаж</span>
+                <span className="card-subtitle">По количеству продаж за 30 дней</span>
               </div>
               <div className="card-content">
                 {data.top_products.length > 0 ? (
@@ -332,7 +361,9 @@ const AnalyticsDashboard = () => {
                         <Link to={`/products/${p.id}`} className="stock-product-name">
                           {p.name}
                         </Link>
-                        <span className="stock-badge warning">{p.stock_quantity} шт.</span>
+                        <span className="stock-badge warning">
+                          {p.available_quantity} шт. · ~{p.days_of_cover} дн.
+                        </span>
                       </div>
                     ))}
                   </div>
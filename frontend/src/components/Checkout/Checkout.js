@@ -29,6 +29,8 @@ const Checkout = () => {
   const addressInputRef = useRef(null);
   const suggestionsRef = useRef(null);
   const debounceTimerRef = useRef(null);
+  // Один ключ на попытку оформления — повторы и двойные клики не создают дубли заказа
+  const idempotencyKeyRef = useRef(null);
 
   useEffect(() => {
     if (!isAuthenticated) {
@@ -110,6 +112,10 @@ const Checkout = () => {
         setShowSuggestions(false);
       }
     } catch (error) {
+      // 429 — слишком частые запросы, оставляем текущие подсказки
+      if (error.response?.status === 429) {
+        return;
+      }
       console.error('Ошибка получения подсказок адресов:', error);
       console.error('Error details:', error.response?.data);
       setAddressSuggestions([]);
@@ -295,11 +301,19 @@ const Checkout = () => {
       }
 
       // Создаем заказ
+      if (!idempotencyKeyRef.current) {
+        idempotencyKeyRef.current = window.crypto?.randomUUID
+          ? window.crypto.randomUUID()
+          : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+      }
       const orderResponse = await api.post('/orders/create/', {
         shipping_address: orderData.shipping_address,
         notes: orderData.notes,
         delivery_method: 'courier'
+      }, {
+        headers: { 'Idempotency-Key': idempotencyKeyRef.current }
       });
+      idempotencyKeyRef.current = null;
 
       const createdOrderId = orderResponse.data.order_id;
       setOrderId(createdOrderId);
@@ -321,6 +335,10 @@ const Checkout = () => {
 
     } catch (err) {
       console.error('Checkout error:', err);
+      // Ответ сервера с ошибкой клиента — следующая попытка будет новым запросом
+      if (err.response && err.response.status < 500) {
+        idempotencyKeyRef.current = null;
+      }
       setError(
         err.response?.data?.error ||
         'Произошла ошибка при оформлении заказа. Попробуйте еще раз.'
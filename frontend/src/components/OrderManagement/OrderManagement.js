@@ -22,6 +22,9 @@ const OrderManagement = () => {
   });
   const [selectedOrder, setSelectedOrder] = useState(null);
   const [showDetailModal, setShowDetailModal] = useState(false);
+  const [selectedIds, setSelectedIds] = useState([]);
+  const [bulkStatus, setBulkStatus] = useState('');
+  const [bulkPaymentStatus, setBulkPaymentStatus] = useState('');
 
   useEffect(() => {
     fetchOrders();
@@ -94,11 +97,48 @@ const OrderManagement = () => {
 
       alert('Статус заказа обновлен');
     } catch (err) {
-      alert('Ошибка обновления статуса');
+      alert(err.response?.data?.error || 'Ошибка обновления статуса');
       console.error('Error updating order status:', err);
     }
   };
 
+  const toggleSelected = (orderId) => {
+    setSelectedIds(prev =>
+      prev.includes(orderId) ? prev.filter(id => id !== orderId) : [...prev, orderId]
+    );
+  };
+
+  // Один запрос на все выбранные заказы
+  const handleBulkUpdate = async () => {
+    if (selectedIds.length === 0 || (!bulkStatus && !bulkPaymentStatus)) return;
+
+    try {
+      const response = await apiHelpers.post('/orders/admin/bulk/', {
+        orders: selectedIds.map(id => ({
+          id,
+          ...(bulkStatus && { status: bulkStatus }),
+          ...(bulkPaymentStatus && { payment_status: bulkPaymentStatus })
+        }))
+      });
+      const { updated, rejected } = response.data;
+
+      setSelectedIds([]);
+      fetchOrders();
+
+      if (rejected.length > 0) {
+        alert(
+          `Обновлено: ${updated.length}. Не обновлено: ${rejected.length}\n` +
+          rejected.map(row => `#${row.id}: ${row.error}`).join('\n')
+        );
+      } else {
+        alert(`Обновлено заказов: ${updated.length}`);
+      }
+    } catch (err) {
+      alert(err.response?.data?.error || 'Ошибка массового обновления');
+      console.error('Error in bulk order update:', err);
+    }
+  };
+
   const getStatusBadgeClass = (status) => {
     const statusClasses = {
       pending: 'status-pending',
@@ -199,11 +239,54 @@ const OrderManagement = () => {
             <p>Найдено заказов: <strong>{pagination.total}</strong></p>
           </div>
 
+          {selectedIds.length > 0 && (
+            <div className="bulk-actions">
+              <span>Выбрано: <strong>{selectedIds.length}</strong></span>
+              <select
+                value={bulkStatus}
+                onChange={(e) => setBulkStatus(e.target.value)}
+                className="filter-select"
+              >
+                <option value="">Статус заказа</option>
+                <option value="processing">В обработке</option>
+                <option value="shipped">Отправлен</option>
+                <option value="delivered">Доставлен</option>
+                <option value="cancelled">Отменен</option>
+              </select>
+              <select
+                value={bulkPaymentStatus}
+                onChange={(e) => setBulkPaymentStatus(e.target.value)}
+                className="filter-select"
+              >
+                <option value="">Статус оплаты</option>
+                <option value="paid">Оплачен</option>
+                <option value="failed">Ошибка оплаты</option>
+                <option value="refunded">Возврат</option>
+              </select>
+              <button
+                onClick={handleBulkUpdate}
+                disabled={!bulkStatus && !bulkPaymentStatus}
+                className="btn-details"
+              >
+                Применить
+              </button>
+              <button onClick={() => setSelectedIds([])} className="btn-details">
+                Сбросить
+              </button>
+            </div>
+          )}
+
           <div className="orders-list">
             {orders.map((order) => (
               <div key={order.id} className="order-card">
                 <div className="order-card-header">
                   <div className="order-number">
+                    <input
+                      type="checkbox"
+                      checked={selectedIds.includes(order.id)}
+                      onChange={() => toggleSelected(order.id)}
+                      aria-label={`Выбрать заказ ${order.order_number}`}
+                    />
                     <h3>Заказ #{order.order_number}</h3>
                     <span className="order-date">{formatDate(order.created_at)}</span>
                   </div>
@@ -16,6 +16,7 @@ const UserProfile = () => {
     dietary_preferences: {}
   });
   const [orders, setOrders] = useState([]);
+  const [nextOrdersUrl, setNextOrdersUrl] = useState(null);
   const [loading, setLoading] = useState(true);
   const [updating, setUpdating] = useState(false);
   const [error, setError] = useState(null);
@@ -91,9 +92,22 @@ const UserProfile = () => {
     try {
       const response = await api.get('/orders/');
       setOrders(response.data.orders || []);
+      setNextOrdersUrl(response.data.next || null);
     } catch (error) {
       console.error('Ошибка загрузки заказов:', error);
       setOrders([]);
+      setNextOrdersUrl(null);
+    }
+  };
+
+  const fetchMoreOrders = async () => {
+    if (!nextOrdersUrl) return;
+    try {
+      const response = await api.get(nextOrdersUrl);
+      setOrders(prev => [...prev, ...(response.data.orders || [])]);
+      setNextOrdersUrl(response.data.next || null);
+    } catch (error) {
+      console.error('Ошибка загрузки заказов:', error);
     }
   };
 
@@ -501,6 +515,15 @@ const UserProfile = () => {
                     )}
                   </div>
                 ))}
+                {nextOrdersUrl && (
+                  <button
+                    type="button"
+                    className="btn btn-secondary"
+                    onClick={fetchMoreOrders}
+                  >
+                    Показать ещё
+                  </button>
+                )}
               </div>
             )}
           </section>
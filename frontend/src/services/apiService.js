@@ -1,4 +1,5 @@
 import { apiHelpers } from '../utils/api';
+import config from '../config/config';
 
 /**
  * Centralized API service layer following RESTful principles
@@ -71,6 +72,33 @@ export const articleService = {
 // Analytics services
 export const analyticsService = {
   getCartStats: () => apiHelpers.get('/analytics/cart-stats/'),
+  getCartTrends: (params = {}) => apiHelpers.get('/analytics/cart-trends/', params),
+  getCohorts: (params = {}) => apiHelpers.get('/analytics/cohorts/', params),
+  getInventoryReport: (params = {}) => apiHelpers.get('/analytics/inventory/', params),
+  // Поток событий (SSE) через fetch — EventSource не умеет передавать Authorization
+  streamEvents: async (onEvent, signal) => {
+    const response = await fetch(`${config.api.baseURL}/analytics/events/`, {
+      headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+      signal,
+    });
+    if (!response.ok) {
+      throw new Error(`Event stream failed: ${response.status}`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) return;
+      buffer += decoder.decode(value, { stream: true });
+      const messages = buffer.split('\n\n');
+      buffer = messages.pop();
+      messages.forEach((message) => {
+        const data = message.split('\n').find(line => line.startsWith('data: '));
+        if (data) onEvent(JSON.parse(data.slice(6)));
+      });
+    }
+  },
   getOrderStats: (params = {}) => apiHelpers.get('/analytics/order-stats/', params),
   getProductStats: (params = {}) => apiHelpers.get('/analytics/product-stats/', params),
   getUserStats: (params = {}) => apiHelpers.get('/analytics/user-stats/', params),
@@ -97,6 +97,28 @@ export const removeFromCart = createAsyncThunk(
   }
 );
 
+// Sync the whole cart in one request (restored local cart, merge after login)
+export const syncCart = createAsyncThunk(
+  'cart/syncCart',
+  async ({ items, merge = false }, { rejectWithValue }) => {
+    try {
+      const response = await api.put('/orders/cart/sync/', {
+        items: items.map(item => ({
+          product_id: item.product.id,
+          quantity: item.quantity
+        })),
+        merge
+      });
+      return response.data;
+    } catch (error) {
+      return rejectWithValue(error.response?.data || {
+        message: 'Ошибка сети. Проверьте подключение к интернету.',
+        type: 'NETWORK_ERROR'
+      });
+    }
+  }
+);
+
 export const updateLocalCartItemAsync = createAsyncThunk(
   'cart/updateLocalCartItemAsync',
   async ({ itemId, quantity }, { rejectWithValue, getState }) => {
@@ -270,6 +292,27 @@ const cartSlice = createSlice({
         state.loading = false;
         state.error = action.payload;
       })
+      // Sync cart
+      .addCase(syncCart.pending, (state) => {
+        state.loading = true;
+      })
+      .addCase(syncCart.fulfilled, (state, action) => {
+        state.loading = false;
+        state.items = action.payload.items || [];
+        state.total = action.payload.total || 0;
+        state.count = action.payload.count || 0;
+        state.error = action.payload.adjustments?.length
+          ? {
+              message: 'Часть товаров недоступна в нужном количестве',
+              type: 'INSUFFICIENT_STOCK',
+              adjustments: action.payload.adjustments
+            }
+          : null;
+      })
+      .addCase(syncCart.rejected, (state, action) => {
+        state.loading = false;
+        state.error = action.payload;
+      })
       // Update local cart item async
       .addCase(updateLocalCartItemAsync.fulfilled, (state, action) => {
         const { itemId, quantity } = action.payload;
@@ -19,6 +19,12 @@ api.interceptors.request.use(
       reqConfig.headers.Authorization = `Bearer ${token}`;
     }
     
+    // Токен гостевой корзины — сервер переносит её в корзину пользователя при входе
+    const cartToken = localStorage.getItem('cartToken');
+    if (cartToken) {
+      reqConfig.headers['X-Cart-Token'] = cartToken;
+    }
+    
     reqConfig.metadata = { startTime: new Date() };
     
     return reqConfig;
@@ -32,6 +38,15 @@ api.interceptors.request.use(
 // Response interceptor
 api.interceptors.response.use(
   (response) => {
+    const cartToken = response.headers?.['x-cart-token'];
+    if (cartToken) {
+      localStorage.setItem('cartToken', cartToken);
+    }
+    // Гостевая корзина перенесена при входе — токен больше не отправляем
+    if (response.headers?.['x-cart-token-clear']) {
+      localStorage.removeItem('cartToken');
+    }
+    
     if (response.config.metadata) {
       const duration = new Date() - response.config.metadata.startTime;
       if (duration > 2000) {
@@ -13,6 +13,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from orders.models import Order
+from orders.idempotency import idempotent
 from .robokassa_service import RobokassaService, PaymentError
 from .models import PaymentTransaction
 
@@ -21,6 +22,7 @@ logger = logging.getLogger(__name__)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('create_payment')
 def create_payment(request):
     """Create payment for order using Robokassa."""
     try:
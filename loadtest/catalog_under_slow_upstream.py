@@ -0,0 +1,178 @@
+"""
+Load test: catalog throughput while an outbound upstream (Dadata) is slow.
+
+The script starts a fake Dadata endpoint that answers after ``--upstream-delay``
+seconds, then measures the catalog endpoint twice: alone, and while
+``--slow-clients`` clients keep calling ``/api/address-suggestions/``.
+
+Start the server under test pointed at the fake upstream, e.g. the ASGI profile:
+
+    DADATA_API_KEY=test DADATA_SUGGEST_URL=http://127.0.0.1:8765/ SERVER_PROFILE=asgi \\
+        gunicorn pkubg_ecommerce.asgi:application -k uvicorn.workers.UvicornWorker -w 3
+
+or the WSGI profile for comparison:
+
+    DADATA_API_KEY=test DADATA_SUGGEST_URL=http://127.0.0.1:8765/ \\
+        gunicorn pkubg_ecommerce.wsgi:application -k gthread --threads 4 -w 3
+
+then run:
+
+    python loadtest/catalog_under_slow_upstream.py --base-url http://127.0.0.1:8000
+
+Every slow client registers its own throwaway user (so the per-user burst
+limit does not turn its calls into 429s) and sends a fresh query on every
+call (so neither the caches nor request coalescing hide the upstream delay).
+
+The exit code is 1 when catalog throughput under slow upstream calls drops
+below ``--min-ratio`` of the baseline.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+
+import httpx
+
+CATALOG_PATH = '/api/products/products/'
+SUGGEST_PATH = '/api/address-suggestions/'
+LOGIN_PATH = '/api/auth/login/'
+REGISTER_PATH = '/api/auth/register/'
+
+
+async def run_fake_upstream(port, delay):
+    """Minimal HTTP server that answers every request after ``delay`` seconds."""
+    body = json.dumps({'suggestions': []}).encode()
+
+    async def handle(reader, writer):
+        try:
+            headers = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in headers.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            if length:
+                await reader.readexactly(length)
+            await asyncio.sleep(delay)
+            writer.write(
+                b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                b'Content-Length: ' + str(len(body)).encode() + b'\r\nConnection: close\r\n\r\n' + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, '127.0.0.1', port)
+
+
+async def hammer(client, method, path, deadline, latencies, errors, make_body=None, **kwargs):
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        if make_body is not None:
+            kwargs['json'] = make_body()
+        try:
+            response = await client.request(method, path, **kwargs)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+            else:
+                latencies.append(time.monotonic() - start)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+
+
+def unique_query():
+    # Случайное начало: ни один закэшированный запрос не станет префиксом следующего
+    return {'query': f'{uuid.uuid4().hex} Москва, Тверская'}
+
+
+async def create_slow_client_tokens(client, count):
+    """Register one throwaway user per slow client and return their access tokens."""
+    run = uuid.uuid4().hex[:8]
+    password = uuid.uuid4().hex
+    tokens = []
+    for index in range(count):
+        email = f'loadtest-{run}-{index}@example.com'
+        response = await client.post(REGISTER_PATH, json={
+            'email': email, 'password': password, 'password_confirm': password
+        })
+        response.raise_for_status()
+        response = await client.post(LOGIN_PATH, json={'email': email, 'password': password})
+        response.raise_for_status()
+        tokens.append(response.json()['access'])
+    return tokens
+
+
+async def measure_catalog(client, concurrency, duration, tokens=()):
+    """Catalog requests per second and latency percentiles for one phase."""
+    deadline = time.monotonic() + duration
+    latencies, errors = [], []
+    slow_latencies, slow_errors = [], []
+
+    tasks = [
+        hammer(client, 'GET', CATALOG_PATH, deadline, latencies, errors)
+        for _ in range(concurrency)
+    ]
+    tasks += [
+        hammer(
+            client, 'POST', SUGGEST_PATH, deadline, slow_latencies, slow_errors,
+            make_body=unique_query,
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        for token in tokens
+    ]
+    await asyncio.gather(*tasks)
+
+    ordered = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(statistics.median(ordered) * 1000, 1) if ordered else None,
+        'p95_ms': round(ordered[int(len(ordered) * 0.95) - 1] * 1000, 1) if ordered else None,
+        'errors': len(errors),
+        'slow_calls_completed': len(slow_latencies),
+        'slow_call_errors': len(slow_errors),
+    }
+
+
+async def main(args):
+    upstream = await run_fake_upstream(args.upstream_port, args.upstream_delay)
+
+    async with httpx.AsyncClient(
+        base_url=args.base_url,
+        timeout=args.upstream_delay + 30,
+        limits=httpx.Limits(max_connections=args.concurrency + args.slow_clients + 5),
+    ) as client:
+        tokens = await create_slow_client_tokens(client, args.slow_clients)
+
+        baseline = await measure_catalog(client, args.concurrency, args.duration)
+        print('baseline          ', baseline)
+
+        loaded = await measure_catalog(client, args.concurrency, args.duration, tokens=tokens)
+        print('with slow upstream', loaded)
+
+    upstream.close()
+    await upstream.wait_closed()
+
+    ratio = loaded['rps'] / baseline['rps'] if baseline['rps'] else 0
+    print(f'catalog throughput ratio: {ratio:.2f} (minimum {args.min_ratio})')
+    return 0 if ratio >= args.min_ratio else 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=20, help='catalog clients')
+    parser.add_argument('--slow-clients', type=int, default=30, help='clients calling the slow upstream')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per phase')
+    parser.add_argument('--upstream-port', type=int, default=8765)
+    parser.add_argument('--upstream-delay', type=float, default=3.0, help='fake Dadata latency, seconds')
+    parser.add_argument('--min-ratio', type=float, default=0.8)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main(parse_args())))
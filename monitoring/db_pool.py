@@ -0,0 +1,65 @@
+"""
+Database connection settings and psycopg pool statistics.
+
+Pool statistics are per process: each gunicorn worker has its own pool, so
+the numbers describe the worker that served the monitoring request.
+"""
+from django.conf import settings
+from django.db import connections
+
+# Счётчики пула, которые отдаём в Prometheus
+POOL_METRICS = [
+    ('pool_size', 'gauge', 'Connections currently managed by the pool'),
+    ('pool_available', 'gauge', 'Idle connections in the pool'),
+    ('requests_waiting', 'gauge', 'Requests waiting for a connection'),
+    ('requests_num', 'counter', 'Connection requests served'),
+    ('requests_queued', 'counter', 'Connection requests that had to wait'),
+    ('requests_wait_ms', 'counter', 'Total time spent waiting for a connection, ms'),
+    ('requests_errors', 'counter', 'Connection requests that timed out or failed'),
+    ('usage_ms', 'counter', 'Total time connections were checked out, ms'),
+    ('connections_num', 'counter', 'Connections opened'),
+    ('connections_lost', 'counter', 'Connections found broken by health checks'),
+]
+
+
+def get_db_pool_stats(alias='default'):
+    """Connection mode for ``alias`` plus pool statistics when the psycopg pool is enabled."""
+    db_settings = settings.DATABASES[alias]
+    pool_options = db_settings.get('OPTIONS', {}).get('pool')
+
+    stats = {
+        'engine': db_settings['ENGINE'].rsplit('.', 1)[-1],
+        'mode': 'pool' if pool_options else ('persistent' if db_settings.get('CONN_MAX_AGE') else 'none'),
+        'conn_max_age': db_settings.get('CONN_MAX_AGE', 0),
+        'health_checks': db_settings.get('CONN_HEALTH_CHECKS', False),
+        'pool': None,
+    }
+
+    pool = getattr(connections[alias], 'pool', None) if pool_options else None
+    if pool is not None:
+        pool_stats = pool.get_stats()
+        stats['pool'] = {
+            'min_size': pool.min_size,
+            'max_size': pool.max_size,
+            'timeout': pool.timeout,
+            **{name: pool_stats.get(name, 0) for name, _, _ in POOL_METRICS},
+        }
+        requests = stats['pool']['requests_num']
+        stats['pool']['avg_wait_ms'] = round(stats['pool']['requests_wait_ms'] / requests, 2) if requests else 0.0
+
+    return stats
+
+
+def prometheus_pool_lines(alias='default'):
+    """Prometheus exposition lines for the pool (empty without a pool)."""
+    pool = get_db_pool_stats(alias)['pool']
+    if pool is None:
+        return []
+
+    lines = []
+    for name, metric_type, description in POOL_METRICS:
+        metric = f'db_pool_{name}'
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} {metric_type}')
+        lines.append(f'{metric} {pool[name]}')
+    return lines
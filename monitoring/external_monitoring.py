@@ -1,12 +1,16 @@
 """
 External monitoring integrations (Prometheus, Grafana, Uptime monitoring)
 """
+import asyncio
 import requests
+import httpx
 import json
 import logging
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from asgiref.sync import async_to_sync
+from pkubg_ecommerce.http_client import outbound_client
 
 logger = logging.getLogger(__name__)
 
@@ -21,11 +25,11 @@ class UptimeMonitor:
             'https://pkubg.ru/monitoring/health/',
         ]
     
-    def check_url(self, url, timeout=10):
+    async def acheck_url(self, client, url, timeout=10):
         """Check if URL is accessible"""
         try:
             start_time = datetime.now()
-            response = requests.get(url, timeout=timeout)
+            response = await client.get(url, timeout=timeout)
             end_time = datetime.now()
             
             response_time = (end_time - start_time).total_seconds() * 1000
@@ -38,26 +42,38 @@ class UptimeMonitor:
                 'timestamp': datetime.now().isoformat(),
                 'error': None
             }
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             return {
                 'url': url,
                 'status': 'down',
                 'status_code': None,
                 'response_time_ms': None,
                 'timestamp': datetime.now().isoformat(),
-                'error': str(e)
+                'error': str(e) or e.__class__.__name__
             }
     
+    async def acheck_all_urls(self):
+        """Check all monitored URLs concurrently"""
+        async with outbound_client() as client:
+            return await asyncio.gather(*[
+                self.acheck_url(client, url) for url in self.urls_to_monitor
+            ])
+    
+    def check_url(self, url, timeout=10):
+        """Check if URL is accessible"""
+        async def check():
+            async with outbound_client() as client:
+                return await self.acheck_url(client, url, timeout=timeout)
+        return async_to_sync(check)()
+    
     def check_all_urls(self):
         """Check all monitored URLs"""
-        results = []
-        for url in self.urls_to_monitor:
-            result = self.check_url(url)
-            results.append(result)
-            
+        results = list(async_to_sync(self.acheck_all_urls)())
+        
+        for result in results:
             # Log if service is down
             if result['status'] == 'down':
-                logger.error(f"Service down: {url} - {result['error']}")
+                logger.error(f"Service down: {result['url']} - {result['error']}")
         
         return results
 
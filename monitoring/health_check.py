@@ -10,6 +10,7 @@ from django.db import connection
 from django.core.cache import cache
 from django.conf import settings
 from django.utils import timezone
+from .db_pool import get_db_pool_stats
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
@@ -107,7 +108,8 @@ class DetailedHealthCheckView(View):
             return {
                 'healthy': True,
                 'response_time_ms': round(response_time, 2),
-                'migrations_count': result[0] if result else 0
+                'migrations_count': result[0] if result else 0,
+                'connections': get_db_pool_stats()
             }
         except Exception as e:
             return {
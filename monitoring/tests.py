@@ -0,0 +1,98 @@
+"""
+Tests for monitoring app.
+"""
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+
+class FakePool:
+    """Stands in for a psycopg ``ConnectionPool``."""
+
+    min_size = 1
+    max_size = 4
+    timeout = 10.0
+
+    def get_stats(self):
+        return {'pool_size': 3, 'pool_available': 1, 'requests_num': 4, 'requests_wait_ms': 10}
+
+
+class TestDbPoolStats(SimpleTestCase):
+    """Test connection mode detection and pool statistics."""
+
+    def _patch_default(self, **db_settings):
+        patcher = mock.patch.dict(settings.DATABASES['default'], db_settings)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_mode_detection(self):
+        """Test none, persistent and pool modes."""
+        from .db_pool import get_db_pool_stats
+
+        self._patch_default(CONN_MAX_AGE=0)
+        self.assertEqual(get_db_pool_stats()['mode'], 'none')
+
+        self._patch_default(CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True)
+        stats = get_db_pool_stats()
+        self.assertEqual(stats['mode'], 'persistent')
+        self.assertEqual(stats['conn_max_age'], 60)
+        self.assertTrue(stats['health_checks'])
+        self.assertIsNone(stats['pool'])
+
+        self._patch_default(CONN_MAX_AGE=0, OPTIONS={'pool': {'max_size': 4}})
+        with mock.patch('monitoring.db_pool.connections', {'default': SimpleNamespace(pool=None)}):
+            stats = get_db_pool_stats()
+        # Пул настроен, но ещё не открыт в этом процессе
+        self.assertEqual(stats['mode'], 'pool')
+        self.assertIsNone(stats['pool'])
+
+    def test_pool_stats_shape(self):
+        """Test that every pool metric is reported, missing counters as zero."""
+        from .db_pool import POOL_METRICS, get_db_pool_stats
+
+        self._patch_default(CONN_MAX_AGE=0, OPTIONS={'pool': {'max_size': 4}})
+        with mock.patch('monitoring.db_pool.connections', {'default': SimpleNamespace(pool=FakePool())}):
+            pool = get_db_pool_stats()['pool']
+
+        self.assertEqual(
+            set(pool),
+            {name for name, _, _ in POOL_METRICS} | {'min_size', 'max_size', 'timeout', 'avg_wait_ms'}
+        )
+        self.assertEqual((pool['min_size'], pool['max_size'], pool['timeout']), (1, 4, 10.0))
+        self.assertEqual(pool['pool_size'], 3)
+        self.assertEqual(pool['requests_errors'], 0)
+        self.assertEqual(pool['avg_wait_ms'], 2.5)
+
+    def test_prometheus_lines(self):
+        """Test HELP/TYPE/value triples per metric, and no lines without a pool."""
+        from .db_pool import POOL_METRICS, prometheus_pool_lines
+
+        self._patch_default(CONN_MAX_AGE=60)
+        self.assertEqual(prometheus_pool_lines(), [])
+
+        self._patch_default(CONN_MAX_AGE=0, OPTIONS={'pool': {'max_size': 4}})
+        with mock.patch('monitoring.db_pool.connections', {'default': SimpleNamespace(pool=FakePool())}):
+            lines = prometheus_pool_lines()
+
+        self.assertEqual(len(lines), 3 * len(POOL_METRICS))
+        self.assertIn('# TYPE db_pool_pool_size gauge', lines)
+        self.assertIn('# TYPE db_pool_requests_num counter', lines)
+        self.assertIn('db_pool_pool_size 3', lines)
+        self.assertIn('db_pool_requests_errors 0', lines)
+
+    def test_unknown_pool_mode_is_rejected(self):
+        """Test that settings refuse an unknown DB_POOL_MODE."""
+        env = {**os.environ, 'SECRET_KEY': 'x', 'DEBUG': 'False', 'DB_POOL_MODE': 'pgbouncer'}
+        result = subprocess.run(
+            [sys.executable, '-c', 'import pkubg_ecommerce.settings'],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+        )
+
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('ImproperlyConfigured', result.stderr)
+        self.assertIn('pgbouncer', result.stderr)
@@ -11,6 +11,7 @@ from django.utils.decorators import method_decorator
 from django.utils import timezone
 from .metrics import metrics_collector, alert_manager
 from .health_check import DetailedHealthCheckView
+from .db_pool import get_db_pool_stats, prometheus_pool_lines
 
 
 @method_decorator(staff_member_required, name='dispatch')
@@ -44,6 +45,7 @@ class MetricsAPIView(View):
             'api_metrics': api_metrics,
             'error_metrics': error_metrics,
             'system_metrics': system_metrics,
+            'database_connections': get_db_pool_stats(),
             'alerts': alerts
         })
     
@@ -111,6 +113,9 @@ class PrometheusMetricsView(View):
         except Exception:
             pass
         
+        # Пул соединений с БД (этого воркера)
+        metrics_lines.extend(prometheus_pool_lines())
+        
         return JsonResponse(
             '\n'.join(metrics_lines),
             content_type='text/plain; version=0.0.4; charset=utf-8',
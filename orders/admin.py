@@ -1,6 +1,8 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.html import format_html
-from .models import Cart, CartItem, Order, OrderItem
+from .models import Cart, CartItem, Order, OrderItem, OrderStatusHistory
+from .search import search_orders
+from .state_machine import TransitionError, transition_orders
 
 
 class CartItemInline(admin.TabularInline):
@@ -25,7 +27,8 @@ class CartAdmin(admin.ModelAdmin):
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
-    readonly_fields = ('product', 'quantity', 'price', 'get_subtotal')
+    fields = ('product_name', 'quantity', 'price', 'get_subtotal')
+    readonly_fields = fields
     can_delete = False
     
     def get_subtotal(self, obj):
@@ -34,6 +37,17 @@ class OrderItemInline(admin.TabularInline):
     get_subtotal.short_description = 'Подытог'
 
 
+class OrderStatusHistoryInline(admin.TabularInline):
+    model = OrderStatusHistory
+    extra = 0
+    fields = ('created_at', 'field', 'from_state', 'to_state', 'changed_by', 'stock_returned')
+    readonly_fields = fields
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = (
@@ -46,13 +60,9 @@ class OrderAdmin(admin.ModelAdmin):
         'created_at'
     )
     list_filter = ('status', 'payment_status', 'delivery_method', 'created_at')
-    search_fields = (
-        'order_number', 
-        'user__email', 
-        'user__first_name', 
-        'user__last_name',
-        'shipping_address'
-    )
+    # Номер, покупатель, телефон и адрес ищутся по search_document
+    search_fields = ('search_document',)
+    search_help_text = 'Номер заказа, имя, email, телефон или адрес'
     readonly_fields = (
         'order_number', 
         'user', 
@@ -61,7 +71,7 @@ class OrderAdmin(admin.ModelAdmin):
         'updated_at',
         'get_items_count'
     )
-    inlines = [OrderItemInline]
+    inlines = [OrderItemInline, OrderStatusHistoryInline]
     
     fieldsets = (
         ('Информация о заказе', {
@@ -122,6 +132,34 @@ class OrderAdmin(admin.ModelAdmin):
         return sum(item.quantity for item in obj.items.all())
     get_items_count.short_description = 'Количество товаров'
     
+    def save_model(self, request, obj, form, change):
+        """Save the form, routing status changes through the order state machine."""
+        changes = {}
+        if change:
+            for field in ('status', 'payment_status'):
+                if field in form.changed_data:
+                    changes[field] = getattr(obj, field)
+                    setattr(obj, field, form.initial[field])
+        
+        super().save_model(request, obj, form, change)
+        if not changes:
+            return
+        
+        try:
+            _, rejected = transition_orders([obj.id], changes, changed_by=request.user)
+        except TransitionError as e:
+            rejected = [{'error': str(e)}]
+        if rejected:
+            self.message_user(request, rejected[0]['error'], level=messages.ERROR)
+        else:
+            obj.refresh_from_db(fields=list(changes))
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Search through the indexed order search document."""
+        if not search_term:
+            return queryset, False
+        return search_orders(queryset, search_term), False
+    
     def has_add_permission(self, request):
         """Disable adding orders through admin."""
         return False
@@ -0,0 +1,138 @@
+"""
+Per-user cart snapshot cache.
+
+The cart payload shown in the header badge and cart page is cached as a plain
+dict in the Django cache backend. Every cart write rebuilds the snapshot
+(write-through) and bumps a per-user version stamp; a snapshot is only served
+when its version matches the current stamp, so a slow writer can never
+overwrite a newer cart with an older one.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from products.models import ProductImage
+from .models import Cart
+
+
+def _snapshot_key(user_id):
+    return f'cart:snapshot:{user_id}'
+
+
+def _version_key(user_id):
+    return f'cart:version:{user_id}'
+
+
+def _get_ttl():
+    return getattr(settings, 'CART_CACHE_TTL', 300)
+
+
+def _current_version(user_id):
+    return cache.get(_version_key(user_id), 0)
+
+
+def _bump_version(user_id):
+    key = _version_key(user_id)
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Ключ вытеснен между add и incr
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def primary_first_images():
+    """Image queryset for prefetching: the primary image (or the oldest) comes first."""
+    return ProductImage.objects.order_by('-is_primary', 'id')
+
+
+def serialize_cart_line(line_id, product, quantity):
+    """Cart line payload; ``product.images`` must be prefetched with ``primary_first_images``."""
+    images = list(product.images.all())
+    primary_image = images[0] if images else None
+
+    return {
+        'id': line_id,
+        'product': {
+            'id': product.id,
+            'name': product.name,
+            'price': float(product.price),
+            'slug': product.slug,
+            'is_gluten_free': product.is_gluten_free,
+            'is_low_protein': product.is_low_protein,
+            'is_lactose_free': product.is_lactose_free,
+            'is_egg_free': product.is_egg_free,
+            'stock_quantity': product.stock_quantity,
+            'available_quantity': product.available_quantity,
+            'images': [{
+                'image': primary_image.image.url if primary_image.image else None,
+                'alt_text': primary_image.alt_text,
+                'is_primary': True
+            }] if primary_image else []
+        },
+        'quantity': quantity,
+        'price': float(product.price),
+        'subtotal': float(quantity * product.price)
+    }
+
+
+def summarize_cart_lines(lines):
+    """Wrap serialized lines with count and total."""
+    count = 0
+    total = Decimal('0.00')
+    for line in lines:
+        count += line['quantity']
+        total += line['quantity'] * Decimal(str(line['price']))
+
+    return {
+        'items': lines,
+        'count': count,
+        'total': float(total),
+    }
+
+
+def build_cart_snapshot(user_id):
+    """Build the cart payload from the database without creating a cart row."""
+    cart = Cart.objects.filter(user_id=user_id).first()
+    if cart is None:
+        return summarize_cart_lines([])
+
+    items = cart.items.select_related('product').prefetch_related(
+        Prefetch('product__images', queryset=primary_first_images())
+    ).order_by('added_at', 'id')
+
+    return summarize_cart_lines([
+        serialize_cart_line(item.id, item.product, item.quantity)
+        for item in items
+    ])
+
+
+def refresh_cart_cache(user_id):
+    """Rebuild and store the snapshot after a cart write. Returns the snapshot."""
+    version = _bump_version(user_id)
+    snapshot = build_cart_snapshot(user_id)
+    snapshot['version'] = version
+    cache.set(_snapshot_key(user_id), snapshot, _get_ttl())
+    return snapshot
+
+
+def invalidate_cart_cache(user_id):
+    """Drop the snapshot; the next read rebuilds it."""
+    _bump_version(user_id)
+    cache.delete(_snapshot_key(user_id))
+
+
+def get_cart_snapshot(user_id):
+    """Return the cached snapshot, rebuilding it if missing or stale."""
+    version = _current_version(user_id)
+    snapshot = cache.get(_snapshot_key(user_id))
+    if snapshot is not None and snapshot.get('version') == version:
+        return snapshot
+
+    snapshot = build_cart_snapshot(user_id)
+    snapshot['version'] = version
+    cache.set(_snapshot_key(user_id), snapshot, _get_ttl())
+    return snapshot
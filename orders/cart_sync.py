@@ -0,0 +1,132 @@
+"""
+Bulk cart reconciliation.
+
+Applies a whole desired cart state in one transaction: the cart row is locked
+first, so concurrent syncs of one cart run one after another and each reads
+the lines the previous one wrote; every product involved is then locked once
+(in id order, so concurrent syncs cannot deadlock), the
+reservation deltas are written with a single ``bulk_update`` and cart rows are
+created, updated and deleted in batches.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Product
+from products.availability import invalidate_availability
+from .models import Cart, CartItem
+
+
+def normalize_cart_lines(lines):
+    """
+    Turn ``[{'product_id': .., 'quantity': ..}, ...]`` into ``{product_id: quantity}``.
+
+    Repeated products are summed. Raises ``ValueError`` on malformed input or
+    more than ``CART_SYNC_MAX_LINES`` lines.
+    """
+    if not isinstance(lines, list):
+        raise ValueError('Items must be a list')
+    # Каждый товар блокируется на время синхронизации — размер запроса ограничен
+    max_lines = getattr(settings, 'CART_SYNC_MAX_LINES', 100)
+    if len(lines) > max_lines:
+        raise ValueError(f'Не больше {max_lines} позиций за раз')
+
+    desired = {}
+    for line in lines:
+        if not isinstance(line, dict):
+            raise ValueError('Each item must be an object')
+        try:
+            product_id = int(line.get('product_id'))
+            quantity = int(line.get('quantity', 0))
+        except (ValueError, TypeError):
+            raise ValueError('Invalid product_id or quantity')
+        if quantity < 0:
+            raise ValueError('Quantity cannot be negative')
+        desired[product_id] = desired.get(product_id, 0) + quantity
+    return desired
+
+
+def apply_cart_state(cart, desired, merge=False):
+    """
+    Reconcile ``cart`` with ``desired`` ({product_id: quantity}).
+
+    With ``merge=False`` the cart becomes exactly ``desired`` (products not
+    listed are removed). With ``merge=True`` quantities are added to what the
+    cart already holds. Quantities are capped by available stock.
+
+    Returns a list of adjustments for lines that could not be filled in full.
+    """
+    adjustments = []
+
+    with transaction.atomic():
+        # Строка корзины — замок на всю синхронизацию: параллельная ждёт и читает уже новые строки
+        Cart.objects.select_for_update().only('id').get(pk=cart.pk)
+        current = {
+            item.product_id: item
+            for item in CartItem.objects.select_for_update().filter(cart=cart)
+        }
+        product_ids = sorted(set(current) | set(desired))
+        products = {
+            product.id: product
+            for product in Product.objects.select_for_update().filter(id__in=product_ids).order_by('id')
+        }
+
+        changed_products = []
+        items_to_create = []
+        items_to_update = []
+        item_ids_to_delete = []
+
+        for product_id in product_ids:
+            item = current.get(product_id)
+            old_quantity = item.quantity if item else 0
+            requested = desired.get(product_id, 0)
+            if merge:
+                requested += old_quantity
+
+            product = products.get(product_id)
+            if product is None or not product.is_active:
+                target = 0
+                if requested:
+                    adjustments.append({
+                        'product_id': product_id,
+                        'requested': requested,
+                        'quantity': 0,
+                        'type': 'PRODUCT_UNAVAILABLE'
+                    })
+            else:
+                # Своё резервирование уже учтено в reserved_quantity
+                target = min(requested, old_quantity + product.available_quantity)
+                if target < requested:
+                    adjustments.append({
+                        'product_id': product_id,
+                        'requested': requested,
+                        'quantity': target,
+                        'type': 'INSUFFICIENT_STOCK' if target else 'STOCK_UNAVAILABLE'
+                    })
+
+            diff = target - old_quantity
+            if diff and product is not None:
+                product.reserved_quantity = max(0, product.reserved_quantity + diff)
+                changed_products.append(product)
+
+            if item and target == 0:
+                item_ids_to_delete.append(item.id)
+            elif item and target != old_quantity:
+                item.quantity = target
+                items_to_update.append(item)
+            elif not item and target > 0:
+                items_to_create.append(CartItem(cart=cart, product=product, quantity=target))
+
+        if changed_products:
+            Product.objects.bulk_update(changed_products, ['reserved_quantity'])
+            invalidate_availability([product.id for product in changed_products])
+        if item_ids_to_delete:
+            CartItem.objects.filter(id__in=item_ids_to_delete).delete()
+        if items_to_update:
+            CartItem.objects.bulk_update(items_to_update, ['quantity'])
+        if items_to_create:
+            CartItem.objects.bulk_create(items_to_create)
+
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+    return adjustments
@@ -0,0 +1,130 @@
+"""
+Streaming order export for accounting.
+
+One row per order line with the order and customer columns repeated. Rows come
+from a single server-side cursor (``iterator(chunk_size=...)``) and are
+encoded and optionally gzip-compressed chunk by chunk, so memory use does not
+depend on the size of the date range.
+"""
+import csv
+import json
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import OrderItem
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+CHUNK_SIZE = 2000
+# Отдаём клиенту куски примерно такого размера
+FLUSH_BYTES = 64 * 1024
+
+EXPORT_COLUMNS = [
+    ('order_number', 'order__order_number'),
+    ('created_at', 'order__created_at'),
+    ('status', 'order__status'),
+    ('payment_status', 'order__payment_status'),
+    ('customer_first_name', 'order__user__first_name'),
+    ('customer_last_name', 'order__user__last_name'),
+    ('customer_email', 'order__user__email'),
+    ('customer_phone', 'order__user__phone'),
+    ('shipping_address', 'order__shipping_address'),
+    ('delivery_method', 'order__delivery_method'),
+    ('delivery_tracking', 'order__delivery_tracking'),
+    ('order_total', 'order__total_amount'),
+    ('product_id', 'product_id'),
+    ('product_name', 'product_name'),
+    ('quantity', 'quantity'),
+    ('price', 'price'),
+]
+HEADER = [name for name, _ in EXPORT_COLUMNS] + ['line_total']
+
+
+def date_range_bounds(date_from, date_to):
+    """Aware ``[start, end)`` datetimes covering whole days ``date_from``..``date_to``."""
+    start = timezone.make_aware(datetime.combine(date_from, time.min))
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+    return start, end
+
+
+def export_rows(date_from, date_to, order_status=None):
+    """Yield export rows (lists, header excluded) for orders created in the range."""
+    start, end = date_range_bounds(date_from, date_to)
+    lines = OrderItem.objects.filter(order__created_at__gte=start, order__created_at__lt=end)
+    if order_status:
+        lines = lines.filter(order__status=order_status)
+
+    lines = lines.order_by('order__created_at', 'order_id', 'id').values_list(
+        *[lookup for _, lookup in EXPORT_COLUMNS]
+    )
+    for row in lines.iterator(chunk_size=CHUNK_SIZE):
+        row = list(row)
+        row[1] = timezone.localtime(row[1]).isoformat()
+        quantity, price = row[-2], row[-1]
+        row.append(quantity * price)
+        yield row
+
+
+class _Echo:
+    """File-like object for ``csv.writer`` that returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+# С этих символов Excel и LibreOffice начинают формулу
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_safe(value):
+    """Text cells that a spreadsheet would run as a formula get a leading ``'``."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _encode_csv(rows):
+    writer = csv.writer(_Echo())
+    # BOM — чтобы Excel открыл кириллицу без выбора кодировки
+    yield '\ufeff' + writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow([_csv_safe(value) for value in row])
+
+
+def _encode_jsonl(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(HEADER, row)), ensure_ascii=False, default=str) + '\n'
+
+
+def _buffered(lines):
+    """Join encoded lines into bytes chunks of about ``FLUSH_BYTES``."""
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= FLUSH_BYTES:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(date_from, date_to, file_format='csv', compress=False, order_status=None):
+    """Byte chunks of the export in ``file_format``, gzip-compressed if ``compress``."""
+    rows = export_rows(date_from, date_to, order_status=order_status)
+    encode = _encode_csv if file_format == 'csv' else _encode_jsonl
+    chunks = _buffered(encode(rows))
+    return _gzipped(chunks) if compress else chunks
@@ -0,0 +1,170 @@
+"""
+Guest (anonymous) carts kept in the cache backend.
+
+A guest cart is identified by a signed token that the client sends back in the
+``X-Cart-Token`` header. Its lines live only in the cache — no ``Cart`` rows
+and no product row locks. Each line places a *soft* hold on the product with a
+short TTL, so guests see stock that other guests are already holding, while
+real reservations are only made when the cart is merged into a user's cart.
+After a merge the server sends ``X-Cart-Token-Clear`` so the client drops the
+token it no longer needs.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from products.models import Product
+from products.availability import get_available_quantities
+from .cart_cache import primary_first_images, serialize_cart_line, summarize_cart_lines
+from .cart_sync import apply_cart_state
+from .models import Cart
+
+CART_TOKEN_HEADER = 'HTTP_X_CART_TOKEN'
+CLEAR_TOKEN_HEADER = 'X-Cart-Token-Clear'
+TOKEN_SALT = 'orders.guest_cart'
+
+
+def _get_cart_ttl():
+    return getattr(settings, 'GUEST_CART_TTL', 7 * 24 * 60 * 60)
+
+
+def _get_hold_ttl():
+    return getattr(settings, 'GUEST_RESERVATION_TTL', 15 * 60)
+
+
+def _cart_key(cart_id):
+    return f'guest_cart:{cart_id}'
+
+
+def _holds_key(product_id):
+    return f'guest_holds:{product_id}'
+
+
+def issue_token():
+    """Create a new guest cart id and its signed token."""
+    cart_id = uuid.uuid4().hex
+    return cart_id, signing.dumps(cart_id, salt=TOKEN_SALT)
+
+
+def read_token(token):
+    """Return the cart id for a valid token, or ``None``."""
+    if not token:
+        return None
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=_get_cart_ttl())
+    except signing.BadSignature:
+        return None
+
+
+def get_request_token(request):
+    token = request.META.get(CART_TOKEN_HEADER)
+    # Тело может быть JSON-массивом (синхронизация корзины) — тогда токен только в заголовке
+    if not token and isinstance(request.data, dict):
+        token = request.data.get('cart_token')
+    return token
+
+
+def load_lines(cart_id):
+    """Guest cart lines as ``{product_id: quantity}``."""
+    return dict(cache.get(_cart_key(cart_id), {}))
+
+
+def save_lines(cart_id, lines):
+    cache.set(_cart_key(cart_id), lines, _get_cart_ttl())
+
+
+def _live_holds(product_id, now):
+    holds = cache.get(_holds_key(product_id), {})
+    return {
+        cart_id: (quantity, expires_at)
+        for cart_id, (quantity, expires_at) in holds.items()
+        if expires_at > now
+    }
+
+
+def held_by_others(product_id, cart_id):
+    """Quantity of ``product_id`` softly held by other guest carts."""
+    holds = _live_holds(product_id, time.time())
+    return sum(quantity for holder, (quantity, _) in holds.items() if holder != cart_id)
+
+
+def set_hold(product_id, cart_id, quantity):
+    """Place, refresh or drop this cart's soft hold on a product (best effort)."""
+    now = time.time()
+    holds = _live_holds(product_id, now)
+    if quantity > 0:
+        holds[cart_id] = (quantity, now + _get_hold_ttl())
+    else:
+        holds.pop(cart_id, None)
+
+    if holds:
+        cache.set(_holds_key(product_id), holds, _get_hold_ttl())
+    else:
+        cache.delete(_holds_key(product_id))
+
+
+def guest_available_quantity(product_id, cart_id):
+    """
+    Stock a guest may put in their cart: free stock minus other guests' holds.
+
+    Returns ``None`` for unknown products.
+    """
+    available = get_available_quantities([product_id]).get(product_id)
+    if available is None:
+        return None
+    return max(0, available - held_by_others(product_id, cart_id))
+
+
+def build_guest_cart(cart_id):
+    """Cart payload for a guest cart; line ids are product ids."""
+    lines = load_lines(cart_id)
+    if not lines:
+        return summarize_cart_lines([])
+
+    products = Product.objects.filter(
+        id__in=lines.keys(), is_active=True
+    ).prefetch_related(
+        Prefetch('images', queryset=primary_first_images())
+    ).order_by('id')
+
+    return summarize_cart_lines([
+        serialize_cart_line(product.id, product, lines[product.id])
+        for product in products
+    ])
+
+
+def drop_client_token(response):
+    """Tell the client to forget its guest cart token."""
+    response[CLEAR_TOKEN_HEADER] = '1'
+    return response
+
+
+def clear_guest_cart(cart_id):
+    for product_id in load_lines(cart_id):
+        set_hold(product_id, cart_id, 0)
+    cache.delete(_cart_key(cart_id))
+
+
+def merge_guest_cart(user, token):
+    """
+    Move a guest cart into the user's DB cart in one bulk operation.
+
+    Returns the list of adjustments from ``apply_cart_state`` or ``None`` when
+    the token is invalid or the guest cart is empty (no user cart is created then).
+    """
+    cart_id = read_token(token)
+    if cart_id is None:
+        return None
+
+    lines = load_lines(cart_id)
+    if not lines:
+        return None
+
+    cart, _ = Cart.objects.get_or_create(user=user)
+    adjustments = apply_cart_state(cart, lines, merge=True)
+    clear_guest_cart(cart_id)
+    return adjustments
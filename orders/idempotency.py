@@ -0,0 +1,185 @@
+"""
+Idempotency-Key support for checkout endpoints.
+
+A client may send an ``Idempotency-Key`` header with a state-changing request.
+The first request with a given key claims a row in ``IdempotencyKey`` before
+the view runs; the rendered response is stored on that row and replayed
+byte-for-byte for retries. Concurrent duplicates wait for the first request
+to finish instead of entering the checkout transaction themselves.
+
+A ``processing`` row is a lease: if the worker that claimed it died mid-request
+(OOM, worker timeout, deploy), the row is reclaimed after
+``IDEMPOTENCY_PROCESSING_TIMEOUT`` seconds so retries are not locked out until
+the key expires.
+"""
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def _get_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def _get_processing_timeout():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_PROCESSING_TIMEOUT', 5 * 60))
+
+
+def _request_fingerprint(request):
+    """Hash of method, path and payload — a reused key must carry the same request."""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps(data, sort_keys=True, default=str)
+    raw = f'{request.method}:{request.path}:{payload}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _claim(user, scope, key, request_hash):
+    """
+    Try to register the key for this request.
+
+    Returns ``(record, True)`` when the caller owns the key and must run the
+    view, or ``(existing_record, False)`` when another request got there first.
+    ``existing_record`` is ``None`` if the owner released the key meanwhile.
+    """
+    now = timezone.now()
+    # Истёкший ключ или брошенная обработка (воркер умер, не освободив ключ)
+    IdempotencyKey.objects.filter(user=user, scope=scope, key=key).filter(
+        Q(expires_at__lte=now) | Q(state='processing', created_at__lte=now - _get_processing_timeout())
+    ).delete()
+
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user,
+                scope=scope,
+                key=key,
+                request_hash=request_hash,
+                expires_at=now + _get_ttl()
+            )
+        return record, True
+    except IntegrityError:
+        existing = IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+        return existing, False
+
+
+def _replay(record):
+    response = HttpResponse(
+        bytes(record.response_body or b''),
+        status=record.status_code,
+        content_type=record.content_type
+    )
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def _store(record, response):
+    """Persist the rendered response and return it in its stored form."""
+    if isinstance(response, Response):
+        content = JSONRenderer().render(response.data)
+        content_type = 'application/json'
+    else:
+        content = response.content
+        content_type = response.get('Content-Type', 'application/json')
+
+    record.state = 'completed'
+    record.status_code = response.status_code
+    record.response_body = content
+    record.content_type = content_type
+    record.save(update_fields=['state', 'status_code', 'response_body', 'content_type'])
+
+    return HttpResponse(content, status=response.status_code, content_type=content_type)
+
+
+def idempotent(scope):
+    """
+    Make a DRF function view idempotent for requests carrying an Idempotency-Key.
+
+    Must be placed below ``@api_view``/``@permission_classes`` so that
+    ``request.user`` is already authenticated. Requests without the header are
+    passed through unchanged. Responses with status >= 500 and unhandled
+    exceptions release the key so the client can retry.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            key = request.META.get(IDEMPOTENCY_HEADER, '').strip()
+            if not key:
+                return view_func(request, *args, **kwargs)
+
+            if len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            request_hash = _request_fingerprint(request)
+            wait_timeout = getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10)
+            poll_interval = getattr(settings, 'IDEMPOTENCY_POLL_INTERVAL', 0.1)
+            deadline = time.monotonic() + wait_timeout
+
+            # Ждём завершения параллельного запроса с тем же ключом
+            while True:
+                record, created = _claim(request.user, scope, key, request_hash)
+                if created:
+                    break
+                if record is not None and record.state == 'completed':
+                    break
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(poll_interval)
+
+            if not created:
+                if record is not None and record.request_hash != request_hash:
+                    return Response(
+                        {
+                            'error': 'Idempotency-Key уже использован для другого запроса',
+                            'type': 'IDEMPOTENCY_KEY_REUSED'
+                        },
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                if record is None or record.state != 'completed':
+                    return Response(
+                        {
+                            'error': 'Запрос с этим Idempotency-Key ещё обрабатывается',
+                            'type': 'IDEMPOTENCY_IN_PROGRESS'
+                        },
+                        status=status.HTTP_409_CONFLICT
+                    )
+                logger.info(f'Replaying {scope} response for idempotency key {key}')
+                return _replay(record)
+
+            try:
+                response = view_func(request, *args, **kwargs)
+            except Exception:
+                record.delete()
+                raise
+
+            if response.status_code >= 500:
+                record.delete()
+                return response
+
+            return _store(record, response)
+        return wrapper
+    return decorator
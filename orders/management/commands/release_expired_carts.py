@@ -4,6 +4,7 @@ from django.db import transaction
 from datetime import timedelta
 
 from orders.models import Cart, CartItem
+from orders.cart_cache import invalidate_cart_cache
 from products.models import Product
 
 
@@ -39,6 +40,8 @@ class Command(BaseCommand):
                 
                 # Очищаем корзину
                 cart.items.all().delete()
+            
+            invalidate_cart_cache(cart.user_id)
         
         self.stdout.write(
             self.style.SUCCESS(
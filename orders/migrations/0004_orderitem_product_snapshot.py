@@ -0,0 +1,100 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SNAPSHOT_FIELDS = [
+    "product_name",
+    "product_slug",
+    "product_image",
+    "is_gluten_free",
+    "is_low_protein",
+    "is_lactose_free",
+    "is_egg_free",
+]
+
+
+def backfill_product_snapshot(apps, schema_editor):
+    OrderItem = apps.get_model("orders", "OrderItem")
+    ProductImage = apps.get_model("products", "ProductImage")
+
+    # Основное изображение (или самое старое) для каждого товара
+    primary_images = {}
+    for image in ProductImage.objects.order_by("product_id", "-is_primary", "id"):
+        primary_images.setdefault(image.product_id, image)
+
+    batch = []
+    items = OrderItem.objects.filter(product__isnull=False).select_related("product")
+    for item in items.iterator(chunk_size=1000):
+        product = item.product
+        image = primary_images.get(product.id)
+        item.product_name = product.name
+        item.product_slug = product.slug
+        item.product_image = image.image.url if image and image.image else ""
+        item.is_gluten_free = product.is_gluten_free
+        item.is_low_protein = product.is_low_protein
+        item.is_lactose_free = product.is_lactose_free
+        item.is_egg_free = product.is_egg_free
+        batch.append(item)
+        if len(batch) >= 1000:
+            OrderItem.objects.bulk_update(batch, SNAPSHOT_FIELDS)
+            batch = []
+    if batch:
+        OrderItem.objects.bulk_update(batch, SNAPSHOT_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0003_idempotencykey"),
+        ("products", "0006_product_reserved_quantity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="is_egg_free",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="is_gluten_free",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="is_lactose_free",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="is_low_protein",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="product_image",
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="product_name",
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="product_slug",
+            field=models.SlugField(blank=True, db_index=False, max_length=200),
+        ),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="product",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="products.product",
+            ),
+        ),
+        migrations.RunPython(backfill_product_snapshot, migrations.RunPython.noop),
+    ]
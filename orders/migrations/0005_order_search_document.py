@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:14
+
+import re
+
+from django.db import migrations, models
+
+SEARCH_INDEX_NAME = "orders_order_search_trgm"
+
+
+def backfill_search_document(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+
+    batch = []
+    for order in Order.objects.select_related("user").iterator(chunk_size=1000):
+        user = order.user
+        parts = [
+            order.order_number,
+            user.first_name,
+            user.last_name,
+            user.email,
+            user.phone,
+            re.sub(r"\D", "", user.phone or ""),
+            order.shipping_address,
+        ]
+        order.search_document = " ".join(part for part in parts if part).lower()
+        batch.append(order)
+        if len(batch) >= 1000:
+            Order.objects.bulk_update(batch, ["search_document"])
+            batch = []
+    if batch:
+        Order.objects.bulk_update(batch, ["search_document"])
+
+
+def create_trigram_index(apps, schema_editor):
+    # Триграммный индекс есть только в PostgreSQL
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX_NAME} "
+        "ON orders_order USING gin (search_document gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {SEARCH_INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0004_orderitem_product_snapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="search_document",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(backfill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
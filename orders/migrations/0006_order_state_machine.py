@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_restocked_orders(apps, schema_editor):
+    # Отменённые и возвращённые заказы уже вернули товар на склад
+    Order = apps.get_model("orders", "Order")
+    Order.objects.filter(
+        models.Q(status="cancelled") | models.Q(payment_status="refunded")
+    ).update(stock_returned=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0005_order_search_document"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="stock_returned",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.CreateModel(
+            name="OrderStatusHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "field",
+                    models.CharField(
+                        choices=[
+                            ("status", "Статус заказа"),
+                            ("payment_status", "Статус оплаты"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("from_state", models.CharField(max_length=20)),
+                ("to_state", models.CharField(max_length=20)),
+                ("stock_returned", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "changed_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="status_history",
+                        to="orders.order",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["created_at", "id"],
+            },
+        ),
+        migrations.RunPython(mark_restocked_orders, migrations.RunPython.noop),
+    ]
@@ -12,6 +12,12 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # release_expired_carts: updated_at < порог
+            models.Index(fields=['updated_at'], name='cart_updated_idx'),
+        ]
+    
     def __str__(self):
         return f"Cart for {self.user.email}"
     
@@ -103,20 +109,144 @@ class Order(models.Model):
     delivery_method = models.CharField(max_length=50, default='courier')
     delivery_tracking = models.CharField(max_length=100, blank=True)
     notes = models.TextField(blank=True, verbose_name='Комментарий к заказу')
+    # Товар уже возвращён на склад (отмена или возврат) — второй раз не возвращаем
+    stock_returned = models.BooleanField(default=False, editable=False)
+    # Номер, покупатель и адрес одной строкой (см. orders.search)
+    search_document = models.TextField(blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # История заказов покупателя (курсор по -created_at, -id)
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            # Список заказов в админке и счётчики за период
+            models.Index(fields=['-created_at'], name='order_created_idx'),
+            # Фильтры админки по статусам
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+            models.Index(fields=['payment_status', '-created_at'], name='order_payment_created_idx'),
+            # Выручка: только оплаченные, сумма берётся из индекса (INCLUDE в PostgreSQL)
+            models.Index(
+                fields=['created_at'],
+                include=['total_amount'],
+                condition=models.Q(payment_status='paid'),
+                name='order_paid_created_idx'
+            ),
+        ]
+    
     def __str__(self):
         return f"Order {self.order_number}"
+    
+    def save(self, *args, **kwargs):
+        from .search import ORDER_SEARCH_FIELDS, build_search_document
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or ORDER_SEARCH_FIELDS & set(update_fields):
+            self.search_document = build_search_document(
+                self.order_number, self.shipping_address, self.user
+            )
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_document'}
+        super().save(*args, **kwargs)
 
 
 class OrderItem(models.Model):
-    """Order item model."""
+    """
+    Order item model.
+    
+    Product name, slug, primary image and dietary flags are copied onto the
+    line when it is created, so an order renders the same after the product
+    is edited or deleted.
+    """
     
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, null=True, blank=True, on_delete=models.SET_NULL)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     
+    # Снимок товара на момент покупки
+    product_name = models.CharField(max_length=200, blank=True)
+    product_slug = models.SlugField(max_length=200, blank=True, db_index=False)
+    product_image = models.CharField(max_length=500, blank=True)
+    is_gluten_free = models.BooleanField(default=False)
+    is_low_protein = models.BooleanField(default=False)
+    is_lactose_free = models.BooleanField(default=False)
+    is_egg_free = models.BooleanField(default=False)
+    
+    def __str__(self):
+        return f"{self.quantity}x {self.product_name} in {self.order.order_number}"
+    
+    def capture_product_snapshot(self, product):
+        """Copy display data from ``product`` (uses prefetched ``images`` if present)."""
+        images = list(product.images.all())
+        primary_image = next((image for image in images if image.is_primary), None)
+        if primary_image is None and images:
+            primary_image = min(images, key=lambda image: image.id)
+        
+        self.product_name = product.name
+        self.product_slug = product.slug
+        self.product_image = primary_image.image.url if primary_image and primary_image.image else ''
+        self.is_gluten_free = product.is_gluten_free
+        self.is_low_protein = product.is_low_protein
+        self.is_lactose_free = product.is_lactose_free
+        self.is_egg_free = product.is_egg_free
+    
+    def save(self, *args, **kwargs):
+        # Снимок пишется один раз — при создании строки
+        if self._state.adding and not self.product_name and self.product is not None:
+            self.capture_product_snapshot(self.product)
+        super().save(*args, **kwargs)
+
+
+class OrderStatusHistory(models.Model):
+    """Append-only log of order status and payment status transitions."""
+    
+    FIELD_CHOICES = [
+        ('status', 'Статус заказа'),
+        ('payment_status', 'Статус оплаты'),
+    ]
+    
+    order = models.ForeignKey(Order, related_name='status_history', on_delete=models.CASCADE)
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    from_state = models.CharField(max_length=20)
+    to_state = models.CharField(max_length=20)
+    changed_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    stock_returned = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['created_at', 'id']
+    
+    def __str__(self):
+        return f"{self.order_id}: {self.field} {self.from_state} → {self.to_state}"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Order status history is append-only')
+        super().save(*args, **kwargs)
+
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a request sent with an Idempotency-Key header."""
+    
+    STATE_CHOICES = [
+        ('processing', 'В обработке'),
+        ('completed', 'Завершен'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default='processing')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.BinaryField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        unique_together = ('user', 'scope', 'key')
+    
     def __str__(self):
-        return f"{self.quantity}x {self.product.name} in {self.order.order_number}"
\ No newline at end of file
+        return f"{self.scope}:{self.key} ({self.state})"
@@ -1,18 +1,19 @@
-import requests
+import asyncio
 import logging
+
+import httpx
+from asgiref.sync import async_to_sync
 from django.conf import settings
 
+from pkubg_ecommerce.http_client import outbound_client
+
 logger = logging.getLogger(__name__)
 
 
-def send_vk_message(user_id, message):
-    """Отправить сообщение через ВК API."""
-    if not settings.VK_GROUP_TOKEN:
-        logger.warning('VK_GROUP_TOKEN не настроен')
-        return False
-
+async def asend_vk_message(client, user_id, message):
+    """Отправить сообщение через ВК API (async, через общий httpx-клиент)."""
     try:
-        response = requests.post(
+        response = await client.post(
             'https://api.vk.com/method/messages.send',
             data={
                 'user_id': user_id,
@@ -21,7 +22,6 @@ def send_vk_message(user_id, message):
                 'access_token': settings.VK_GROUP_TOKEN,
                 'v': '5.131',
             },
-            timeout=10,
         )
 
         result = response.json()
@@ -32,11 +32,29 @@ def send_vk_message(user_id, message):
 
         return True
 
-    except Exception as e:
+    except (httpx.HTTPError, ValueError) as e:
         logger.error(f'VK notification error: {e}')
         return False
 
 
+async def asend_vk_messages(user_ids, message):
+    """Разослать сообщение параллельно — ждём самого медленного, а не сумму."""
+    if not settings.VK_GROUP_TOKEN:
+        logger.warning('VK_GROUP_TOKEN не настроен')
+        return []
+
+    async with outbound_client() as client:
+        return await asyncio.gather(*[
+            asend_vk_message(client, user_id, message) for user_id in user_ids
+        ])
+
+
+def send_vk_message(user_id, message):
+    """Отправить сообщение через ВК API."""
+    results = async_to_sync(asend_vk_messages)([user_id], message)
+    return bool(results and results[0])
+
+
 def notify_new_order(order):
     """Уведомить админов о новом заказе."""
     message = (
@@ -47,8 +65,8 @@ def notify_new_order(order):
         f'📦 Товары:\n'
     )
 
-    for item in order.items.select_related('product'):
-        message += f'  • {item.product.name} × {item.quantity} — {item.price}₽\n'
+    for item in order.items.all():
+        message += f'  • {item.product_name} × {item.quantity} — {item.price}₽\n'
 
     message += (
         f'\n💰 Сумма: {order.total_amount}₽\n'
@@ -60,9 +78,8 @@ def notify_new_order(order):
 
     message += f'\n🔗 Управление: https://pkubg.ru/orders/manage'
 
-    # Отправляем каждому админу
-    for admin_id in settings.VK_ADMIN_IDS:
-        send_vk_message(admin_id, message)
+    # Отправляем всем админам одновременно
+    async_to_sync(asend_vk_messages)(settings.VK_ADMIN_IDS, message)
 
 
 def notify_order_status_changed(order, old_status):
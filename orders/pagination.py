@@ -0,0 +1,13 @@
+"""
+Pagination classes for orders app.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class OrderHistoryPagination(CursorPagination):
+    """Cursor pagination for a customer's order history, newest first."""
+    
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
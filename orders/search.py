@@ -0,0 +1,85 @@
+"""
+Order search document.
+
+Every order carries ``search_document``: one lower-cased line with the order
+number, customer name, email, phone (as typed and digits only) and shipping
+address. It is rebuilt on ``Order.save`` and when the customer's contact data
+changes. On PostgreSQL the column has a ``gin_trgm_ops`` index, so substring
+matches are served by the index and results are ranked by trigram similarity;
+other backends fall back to a plain substring scan of the single column.
+"""
+import re
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+# Поля, от которых зависит документ
+ORDER_SEARCH_FIELDS = {'order_number', 'shipping_address', 'user', 'user_id'}
+USER_SEARCH_FIELDS = {'first_name', 'last_name', 'email', 'phone'}
+
+# Похоже на телефон: только цифры и +()-
+PHONE_TERM = re.compile(r'^[\d+()\-]+$')
+
+
+def _digits(value):
+    return re.sub(r'\D', '', value or '')
+
+
+def build_search_document(order_number, shipping_address, user):
+    """Lower-cased text indexed for admin order search."""
+    parts = [
+        order_number,
+        user.first_name,
+        user.last_name,
+        user.email,
+        user.phone,
+        _digits(user.phone),
+        shipping_address,
+    ]
+    return ' '.join(part for part in parts if part).lower()
+
+
+def refresh_user_order_documents(user):
+    """Rebuild documents of all the user's orders after contact data changes."""
+    from .models import Order
+
+    orders = list(Order.objects.filter(user=user).only('id', 'order_number', 'shipping_address'))
+    for order in orders:
+        order.search_document = build_search_document(order.order_number, order.shipping_address, user)
+    Order.objects.bulk_update(orders, ['search_document'], batch_size=500)
+
+
+def search_orders(queryset, query):
+    """
+    Filter ``queryset`` by ``query`` against the search document, best first.
+
+    Every whitespace-separated term must match. Phone-like terms also match
+    on digits only, so ``+7 (999) 123`` finds ``79991234567``.
+    """
+    terms = query.lower().split()
+    if not terms:
+        return queryset
+
+    for term in terms:
+        digits = _digits(term)
+        if PHONE_TERM.match(term) and len(digits) >= 3 and digits != term:
+            queryset = queryset.filter(
+                Q(search_document__contains=digits) | Q(search_document__contains=term)
+            )
+        else:
+            queryset = queryset.filter(search_document__contains=term)
+
+    # Точное совпадение номера заказа всегда первое
+    exact_number = Case(
+        When(order_number__iexact=query.strip(), then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField()
+    )
+    if connection.vendor == 'postgresql':
+        return queryset.annotate(
+            search_exact=exact_number,
+            search_rank=TrigramWordSimilarity(query.lower(), 'search_document')
+        ).order_by('-search_exact', '-search_rank', '-created_at')
+
+    return queryset.annotate(search_exact=exact_number).order_by('-search_exact', '-created_at')
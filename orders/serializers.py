@@ -6,16 +6,41 @@ from .models import Order, OrderItem, Cart, CartItem
 from products.serializers import ProductSerializer
 
 
+def snapshot_product_data(item, request=None):
+    """Product payload of an order line, built from its purchase-time snapshot."""
+    image_url = item.product_image or None
+    if image_url and request:
+        image_url = request.build_absolute_uri(image_url)
+    
+    return {
+        'id': item.product_id,
+        'name': item.product_name,
+        'slug': item.product_slug,
+        'is_gluten_free': item.is_gluten_free,
+        'is_low_protein': item.is_low_protein,
+        'is_lactose_free': item.is_lactose_free,
+        'is_egg_free': item.is_egg_free,
+        'images': [{
+            'image': image_url,
+            'alt_text': item.product_name,
+            'is_primary': True
+        }] if image_url else []
+    }
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
-    """Serializer for order items."""
+    """Serializer for order items (product data from the line's snapshot)."""
     
-    product = ProductSerializer(read_only=True)
+    product = serializers.SerializerMethodField()
     subtotal = serializers.SerializerMethodField()
     
     class Meta:
         model = OrderItem
         fields = ['id', 'product', 'quantity', 'price', 'subtotal']
     
+    def get_product(self, obj):
+        return snapshot_product_data(obj, self.context.get('request'))
+    
     def get_subtotal(self, obj):
         """Calculate subtotal for this item."""
         return float(obj.quantity * obj.price)
@@ -66,9 +91,79 @@ class AdminOrderSerializer(serializers.ModelSerializer):
     
     def get_items_count(self, obj):
         """Get total number of items in order."""
+        if hasattr(obj, 'items_count'):
+            return obj.items_count or 0
         return sum(item.quantity for item in obj.items.all())
 
 
+class AdminOrderListSerializer(serializers.ModelSerializer):
+    """
+    Summary row for the admin order list.
+    
+    No nested items; ``items_count`` must be annotated on the queryset
+    (see ``admin_order_list_queryset``).
+    """
+    
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    payment_status_display = serializers.CharField(source='get_payment_status_display', read_only=True)
+    user_email = serializers.EmailField(source='user.email', read_only=True)
+    user_name = serializers.SerializerMethodField()
+    user_phone = serializers.CharField(source='user.phone', read_only=True)
+    items_count = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'order_number', 'user_email', 'user_name', 'user_phone',
+            'status', 'status_display', 'payment_status', 'payment_status_display',
+            'total_amount', 'shipping_address', 'delivery_method', 'delivery_tracking',
+            'notes', 'items_count', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+    
+    def get_user_name(self, obj):
+        """Get user's full name."""
+        return f"{obj.user.first_name} {obj.user.last_name}"
+    
+    def get_items_count(self, obj):
+        """Annotated total number of items in order."""
+        return obj.items_count or 0
+
+
+class OrderHistoryItemSerializer(serializers.ModelSerializer):
+    """Lean order line for order history, rendered from the line's snapshot."""
+    
+    product = serializers.SerializerMethodField()
+    price = serializers.FloatField()
+    subtotal = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'product', 'quantity', 'price', 'subtotal']
+    
+    def get_product(self, obj):
+        return snapshot_product_data(obj, self.context.get('request'))
+    
+    def get_subtotal(self, obj):
+        """Calculate subtotal for this item."""
+        return float(obj.quantity * obj.price)
+
+
+class OrderHistorySerializer(serializers.ModelSerializer):
+    """Lean serializer for a customer's order history."""
+    
+    items = OrderHistoryItemSerializer(many=True, read_only=True)
+    total_amount = serializers.FloatField()
+    
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'order_number', 'status', 'payment_status', 'total_amount',
+            'shipping_address', 'delivery_method', 'delivery_tracking',
+            'created_at', 'updated_at', 'items'
+        ]
+
+
 class CartItemSerializer(serializers.ModelSerializer):
     """Serializer for cart items."""
     
@@ -0,0 +1,59 @@
+"""
+Signals for orders app.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from products.models import Product, ProductImage
+from .models import CartItem
+from .cart_cache import invalidate_cart_cache
+from .search import USER_SEARCH_FIELDS, refresh_user_order_documents
+
+# Поля склада меняются при каждом резерве — снимок корзины от них не сбрасываем
+STOCK_FIELDS = {'stock_quantity', 'reserved_quantity'}
+
+# Статусы заказов изменены одним UPDATE (без post_save); аргументы: order_ids, created_at,
+# moves — {(поле, новое значение): [id заказов]}
+orders_transitioned = Signal()
+
+
+def _invalidate_carts_with_product(product_id):
+    user_ids = CartItem.objects.filter(
+        product_id=product_id
+    ).values_list('cart__user_id', flat=True).distinct()
+    for user_id in user_ids:
+        invalidate_cart_cache(user_id)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_carts_on_product_change(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Drop cached cart snapshots that show this product after catalog edits.
+    """
+    if created:
+        return
+    if update_fields and set(update_fields) <= STOCK_FIELDS:
+        return
+    _invalidate_carts_with_product(instance.pk)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_carts_on_image_change(sender, instance, **kwargs):
+    """
+    Drop cached cart snapshots when a product image changes.
+    """
+    _invalidate_carts_with_product(instance.product_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def refresh_order_search_on_user_change(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Keep order search documents in sync with the customer's name, email and phone.
+    """
+    if created:
+        return
+    if update_fields and not USER_SEARCH_FIELDS & set(update_fields):
+        return
+    refresh_user_order_documents(instance)
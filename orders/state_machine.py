@@ -0,0 +1,207 @@
+"""
+Order state machine.
+
+Allowed transitions for ``Order.status`` and ``Order.payment_status`` are
+listed in transition tables. ``apply_transitions`` moves any number of orders
+at once: one ``UPDATE`` per distinct target state, the stock of cancelled
+or refunded orders returned with a single ``UPDATE`` over all affected
+products, and every transition appended to ``OrderStatusHistory``.
+
+An order returns its stock at most once (``Order.stock_returned``), so a
+cancelled order that is later refunded is not restocked twice.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from products.models import Product
+from products.availability import invalidate_availability
+from .models import Order, OrderItem, OrderStatusHistory
+from .signals import orders_transitioned
+
+STATUS_TRANSITIONS = {
+    'pending': {'paid', 'processing', 'cancelled'},
+    'processing': {'paid', 'shipped', 'cancelled'},
+    'paid': {'processing', 'shipped', 'cancelled'},
+    'shipped': {'delivered', 'cancelled'},
+    'delivered': set(),
+    'cancelled': set(),
+}
+
+PAYMENT_STATUS_TRANSITIONS = {
+    'pending': {'paid', 'failed'},
+    'failed': {'pending', 'paid'},
+    'paid': {'refunded'},
+    'refunded': set(),
+}
+
+TRANSITIONS = {
+    'status': STATUS_TRANSITIONS,
+    'payment_status': PAYMENT_STATUS_TRANSITIONS,
+}
+
+# Переходы, после которых товар возвращается на склад
+RESTOCK_TRANSITIONS = {
+    ('status', 'cancelled'),
+    ('payment_status', 'refunded'),
+}
+
+
+class TransitionError(ValueError):
+    """Raised for an unknown state or a transition the table does not allow."""
+
+
+def can_transition(field, current, target):
+    return target in TRANSITIONS[field].get(current, set())
+
+
+def check_transition(field, current, target):
+    """Raise ``TransitionError`` unless ``current → target`` is allowed (same state is a no-op)."""
+    if target not in TRANSITIONS[field]:
+        raise TransitionError(f'Неизвестный статус: {target}')
+    if current != target and not can_transition(field, current, target):
+        raise TransitionError(f'Недопустимый переход: {current} → {target}')
+
+
+def check_changes(changes):
+    """Raise ``TransitionError`` for an unknown field or state in ``changes``."""
+    for field, target in changes.items():
+        if field not in TRANSITIONS:
+            raise TransitionError(f'Неизвестное поле: {field}')
+        if target not in TRANSITIONS[field]:
+            raise TransitionError(f'Неизвестный статус: {target}')
+
+
+def _restock(order_ids):
+    """Return the stock of ``order_ids`` with one UPDATE over all their products."""
+    quantities = dict(
+        OrderItem.objects.filter(
+            order_id__in=order_ids, product__isnull=False
+        ).values('product_id').annotate(
+            total=Sum('quantity')
+        ).values_list('product_id', 'total')
+    )
+    if not quantities:
+        return
+
+    # Блокируем товары в порядке id — параллельные переходы не дают дедлок
+    product_ids = list(
+        Product.objects.select_for_update().filter(
+            id__in=quantities
+        ).order_by('id').values_list('id', flat=True)
+    )
+    Product.objects.filter(id__in=product_ids).update(
+        stock_quantity=F('stock_quantity') + Case(
+            *[When(id=product_id, then=Value(quantities[product_id])) for product_id in product_ids],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+    )
+    invalidate_availability(product_ids)
+
+
+def apply_transitions(changes_by_order, changed_by=None):
+    """
+    Apply per-order changes (``{order_id: {'status': .., 'payment_status': ..}}``).
+
+    Orders are grouped by target state, so there is one ``UPDATE`` per
+    distinct ``(field, state)`` pair however many orders move. Orders whose
+    transition is not allowed are left untouched and reported.
+
+    Returns ``(applied, rejected)``: ``applied`` is a list of
+    ``{'id', 'status', 'payment_status'}`` with the new states, ``rejected``
+    a list of ``{'id', 'error'}``. Must run inside a transaction.
+    """
+    applied = []
+    rejected = []
+
+    orders = {
+        order.id: order
+        for order in Order.objects.select_for_update().filter(
+            id__in=list(changes_by_order)
+        ).only('id', 'status', 'payment_status', 'stock_returned', 'created_at').order_by('id')
+    }
+
+    moves = {}
+    history = []
+    restock_ids = []
+
+    for order_id, changes in changes_by_order.items():
+        order = orders.get(order_id)
+        if order is None:
+            rejected.append({'id': order_id, 'error': 'Заказ не найден'})
+            continue
+
+        try:
+            for field, target in changes.items():
+                if field not in TRANSITIONS:
+                    raise TransitionError(f'Неизвестное поле: {field}')
+                check_transition(field, getattr(order, field), target)
+        except TransitionError as e:
+            rejected.append({'id': order_id, 'error': str(e)})
+            continue
+
+        returns_stock = False
+        for field, target in changes.items():
+            current = getattr(order, field)
+            if current == target:
+                continue
+            moves.setdefault((field, target), []).append(order_id)
+            step_restocks = (field, target) in RESTOCK_TRANSITIONS and not order.stock_returned
+            if step_restocks:
+                returns_stock = True
+                order.stock_returned = True
+            history.append(OrderStatusHistory(
+                order_id=order_id,
+                field=field,
+                from_state=current,
+                to_state=target,
+                changed_by=changed_by,
+                stock_returned=step_restocks
+            ))
+            setattr(order, field, target)
+
+        if returns_stock:
+            restock_ids.append(order_id)
+        applied.append({
+            'id': order_id,
+            'status': order.status,
+            'payment_status': order.payment_status
+        })
+
+    now = timezone.now()
+    for (field, target), ids in moves.items():
+        Order.objects.filter(id__in=ids).update(**{field: target, 'updated_at': now})
+    if moves:
+        moved = {order_id for ids in moves.values() for order_id in ids}
+        orders_transitioned.send(
+            sender=Order,
+            order_ids=moved,
+            created_at=[orders[order_id].created_at for order_id in moved],
+            moves=moves
+        )
+
+    if restock_ids:
+        _restock(restock_ids)
+        Order.objects.filter(id__in=restock_ids).update(stock_returned=True)
+
+    if history:
+        OrderStatusHistory.objects.bulk_create(history)
+
+    return applied, rejected
+
+
+def transition_orders(order_ids, changes, changed_by=None):
+    """
+    Apply the same ``changes`` (``{'status': .., 'payment_status': ..}``) to many orders.
+
+    Raises ``TransitionError`` for an unknown field or state; see
+    ``apply_transitions`` for the return value.
+    """
+    check_changes(changes)
+
+    with transaction.atomic():
+        return apply_transitions(
+            {order_id: changes for order_id in dict.fromkeys(order_ids)},
+            changed_by=changed_by
+        )
@@ -185,6 +185,1104 @@ class TestCartAPI(TestCase):
         self.assertEqual(data['total_amount'], 0.0)
 
 
+class TestCartCache(TestCase):
+    """Test the cached cart snapshot and summary endpoint."""
+    
+    def setUp(self):
+        """Set up test data on an empty cache."""
+        from django.core.cache import cache
+        from rest_framework.test import APIClient
+        
+        # Снимки корзин живут в кэше — не наследуем их от других тестов
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.product = Product.objects.create(
+            name='Test Product',
+            slug='test-product',
+            description='Test description',
+            price=Decimal('100.00'),
+            category=category,
+            stock_quantity=10
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+    
+    def test_get_cart_does_not_create_cart(self):
+        """Test that reading an empty cart does not write a cart row."""
+        from django.urls import reverse
+        
+        response = self.client.get(reverse('orders:get_cart'))
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 0)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+    
+    def test_summary_served_from_cache_after_write(self):
+        """Test that cart writes refresh the snapshot used by the summary endpoint."""
+        from django.urls import reverse
+        
+        self.client.post(reverse('orders:add_to_cart'), {
+            'product_id': self.product.id,
+            'quantity': 3
+        })
+        
+        # Аутентификация принудительная — запросов к БД быть не должно
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('orders:get_cart_summary'))
+        
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['total'], 300.0)
+    
+    def test_version_stamp_rejects_stale_snapshot(self):
+        """Test that a snapshot older than the current version is rebuilt."""
+        from django.urls import reverse
+        from .cart_cache import get_cart_snapshot, invalidate_cart_cache
+        
+        self.client.post(reverse('orders:add_to_cart'), {
+            'product_id': self.product.id,
+            'quantity': 1
+        })
+        version = get_cart_snapshot(self.user.id)['version']
+        
+        CartItem.objects.filter(cart__user=self.user).update(quantity=5)
+        invalidate_cart_cache(self.user.id)
+        
+        snapshot = get_cart_snapshot(self.user.id)
+        self.assertGreater(snapshot['version'], version)
+        self.assertEqual(snapshot['count'], 5)
+    
+    def test_product_edit_invalidates_snapshot(self):
+        """Test that renaming a product refreshes carts that contain it."""
+        from django.urls import reverse
+        
+        self.client.post(reverse('orders:add_to_cart'), {
+            'product_id': self.product.id,
+            'quantity': 1
+        })
+        self.product.name = 'Renamed Product'
+        self.product.save()
+        
+        response = self.client.get(reverse('orders:get_cart'))
+        self.assertEqual(response.json()['items'][0]['product']['name'], 'Renamed Product')
+
+
+class TestAddToCartPrecheck(TestCase):
+    """Test that out-of-stock adds are rejected before any locking."""
+    
+    def test_out_of_stock_rejected_from_cache(self):
+        """Test that a sold-out product is rejected without touching the database."""
+        from rest_framework.test import APIClient
+        from django.urls import reverse
+        from products.availability import get_available_quantities
+        
+        user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        product = Product.objects.create(
+            name='Test Product',
+            slug='test-product',
+            description='Test description',
+            price=Decimal('100.00'),
+            category=category,
+            stock_quantity=0
+        )
+        get_available_quantities([product.id])
+        
+        client = APIClient()
+        client.force_authenticate(user=user)
+        
+        with self.assertNumQueries(0):
+            response = client.post(reverse('orders:add_to_cart'), {
+                'product_id': product.id,
+                'quantity': 1
+            })
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['type'], 'STOCK_UNAVAILABLE')
+    
+    def test_inactive_product_is_not_found(self):
+        """Test that an inactive product still answers 404, from the cache."""
+        from rest_framework.test import APIClient
+        from django.urls import reverse
+        from products.availability import get_available_quantities
+        
+        user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        product = Product.objects.create(
+            name='Test Product',
+            slug='test-product',
+            description='Test description',
+            price=Decimal('100.00'),
+            category=category,
+            stock_quantity=5,
+            is_active=False
+        )
+        self.assertEqual(get_available_quantities([product.id]), {product.id: 0})
+        
+        client = APIClient()
+        client.force_authenticate(user=user)
+        
+        with self.assertNumQueries(0):
+            response = client.post(reverse('orders:add_to_cart'), {
+                'product_id': product.id,
+                'quantity': 1
+            })
+        
+        self.assertEqual(response.status_code, 404)
+
+
+class TestCartSync(TestCase):
+    """Test bulk cart reconciliation."""
+    
+    def setUp(self):
+        """Set up test data."""
+        from rest_framework.test import APIClient
+        
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.products = [
+            Product.objects.create(
+                name=f'Test Product {i}',
+                slug=f'test-product-{i}',
+                description='Test description',
+                price=Decimal('100.00'),
+                category=category,
+                stock_quantity=5
+            )
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+    
+    def _sync(self, items, merge=False):
+        from django.urls import reverse
+        return self.client.put(reverse('orders:sync_cart'), {
+            'items': [{'product_id': p.id, 'quantity': q} for p, q in items],
+            'merge': merge
+        }, format='json')
+    
+    def test_sync_rejects_oversized_payload(self):
+        """Test that too many lines, or a non-object body, are rejected before locking anything."""
+        from django.test import override_settings
+        from django.urls import reverse
+        
+        with override_settings(CART_SYNC_MAX_LINES=2):
+            response = self._sync([(product, 1) for product in self.products])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+        
+        response = self.client.put(reverse('orders:sync_cart'), [], format='json')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_sync_applies_full_state_with_partial_fill(self):
+        """Test that sync creates, updates and removes lines and caps by stock."""
+        first, second, third = self.products
+        self._sync([(first, 2), (second, 1)])
+        
+        response = self._sync([(first, 4), (third, 9)])
+        self.assertEqual(response.status_code, 200)
+        
+        data = response.json()
+        quantities = {item['product']['id']: item['quantity'] for item in data['items']}
+        self.assertEqual(quantities, {first.id: 4, third.id: 5})
+        self.assertEqual(data['adjustments'], [{
+            'product_id': third.id,
+            'requested': 9,
+            'quantity': 5,
+            'type': 'INSUFFICIENT_STOCK'
+        }])
+        
+        reserved = dict(Product.objects.values_list('id', 'reserved_quantity'))
+        self.assertEqual(reserved, {first.id: 4, second.id: 0, third.id: 5})
+    
+    def test_sync_merge_adds_to_existing(self):
+        """Test that merge mode adds quantities to the current cart."""
+        first = self.products[0]
+        self._sync([(first, 2)])
+        
+        data = self._sync([(first, 1)], merge=True).json()
+        
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['adjustments'], [])
+    
+    def test_sync_locks_cart_before_reading_lines(self):
+        """Test that the cart row is locked before its lines are read."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .cart_sync import apply_cart_state
+        from .models import Cart
+        
+        cart = Cart.objects.create(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            apply_cart_state(cart, {self.products[0].id: 1})
+        
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        self.assertIn('FROM "orders_cart" ', selects[0])
+        self.assertIn('FROM "orders_cartitem"', selects[1])
+    
+    def test_sync_rejects_invalid_payload(self):
+        """Test validation of sync payload."""
+        from django.urls import reverse
+        
+        response = self.client.put(reverse('orders:sync_cart'), {
+            'items': [{'product_id': self.products[0].id, 'quantity': -1}]
+        }, format='json')
+        
+        self.assertEqual(response.status_code, 400)
+
+
+class TestGuestCart(TestCase):
+    """Test cache-backed guest carts and merge at login."""
+    
+    def setUp(self):
+        """Set up test data on an empty cache."""
+        from django.core.cache import cache
+        from rest_framework.test import APIClient
+        
+        # Гостевые корзины и мягкие резервы живут в кэше
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.product = Product.objects.create(
+            name='Test Product',
+            slug='test-product',
+            description='Test description',
+            price=Decimal('100.00'),
+            category=category,
+            stock_quantity=5
+        )
+        self.client = APIClient()
+    
+    def _add(self, quantity, token=None):
+        from django.urls import reverse
+        extra = {'HTTP_X_CART_TOKEN': token} if token else {}
+        return self.client.post(reverse('orders:update_guest_cart'), {
+            'product_id': self.product.id,
+            'quantity': quantity
+        }, format='json', **extra)
+    
+    def test_guest_add_creates_no_rows_or_reservations(self):
+        """Test that guest cart lines live only in the cache."""
+        response = self._add(2)
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertTrue(data['cart_token'])
+        self.assertEqual(Cart.objects.count(), 0)
+        
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_quantity, 0)
+    
+    def test_soft_holds_limit_other_guests(self):
+        """Test that one guest's soft hold reduces what another guest can add."""
+        self._add(4)
+        
+        response = self._add(3)
+        
+        self.assertEqual(response.json()['quantity'], 1)
+    
+    def test_login_merges_guest_cart(self):
+        """Test that logging in with a cart token moves the cart in one bulk operation."""
+        from django.urls import reverse
+        
+        token = self._add(2).json()['cart_token']
+        
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'email': 'test@example.com',
+            'password': 'testpass123'
+        }, format='json', HTTP_X_CART_TOKEN=token)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cart_merge'], {'adjustments': []})
+        self.assertEqual(response['X-Cart-Token-Clear'], '1')
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).quantity, 2)
+        
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_quantity, 2)
+        
+        guest = self.client.get(reverse('orders:get_guest_cart'), HTTP_X_CART_TOKEN=token)
+        self.assertEqual(guest.json()['count'], 0)
+    
+    def test_merge_with_list_body_is_rejected(self):
+        """Test that a JSON array body is a bad request, not a server error."""
+        from django.urls import reverse
+        
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('orders:merge_guest_cart'), [1, 2], format='json')
+        
+        self.assertEqual(response.status_code, 400)
+    
+    def test_login_with_empty_guest_cart_creates_no_cart(self):
+        """Test that an emptied guest cart creates no user cart but still clears the token."""
+        from django.urls import reverse
+        
+        token = self._add(2).json()['cart_token']
+        self.client.put(reverse('orders:update_guest_cart'), {
+            'product_id': self.product.id,
+            'quantity': 0
+        }, format='json', HTTP_X_CART_TOKEN=token)
+        
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'email': 'test@example.com',
+            'password': 'testpass123'
+        }, format='json', HTTP_X_CART_TOKEN=token)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('cart_merge', response.json())
+        self.assertEqual(response['X-Cart-Token-Clear'], '1')
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+
+class TestUserOrderHistory(TestCase):
+    """Test the paginated order history endpoint."""
+    
+    def setUp(self):
+        """Set up test data."""
+        from rest_framework.test import APIClient
+        
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.product = Product.objects.create(
+            name='Test Product',
+            slug='test-product',
+            description='Test description',
+            price=Decimal('100.00'),
+            category=category,
+            stock_quantity=10
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+    
+    def _create_orders(self, count):
+        from .models import Order, OrderItem
+        
+        for i in range(count):
+            order = Order.objects.create(
+                user=self.user,
+                order_number=f'ORD-{self.user.id}-{Order.objects.count()}',
+                total_amount=Decimal('200.00'),
+                shipping_address='Test Address'
+            )
+            OrderItem.objects.create(order=order, product=self.product, quantity=2, price=Decimal('100.00'))
+    
+    def test_query_count_does_not_grow_with_history(self):
+        """Test that orders and their items are fetched with a fixed number of queries."""
+        from django.urls import reverse
+        
+        # Заказы, их строки и общее число заказов
+        self._create_orders(2)
+        with self.assertNumQueries(3):
+            self.client.get(reverse('orders:get_user_orders'))
+        
+        self._create_orders(8)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('orders:get_user_orders'))
+        
+        data = response.json()
+        self.assertEqual(data['count'], 10)
+        self.assertEqual(data['orders'][0]['items'][0]['product']['name'], 'Test Product')
+    
+    def test_cursor_pagination(self):
+        """Test that history is split into cursor pages."""
+        from django.urls import reverse
+        
+        self._create_orders(3)
+        response = self.client.get(reverse('orders:get_user_orders'), {'page_size': 2})
+        data = response.json()
+        
+        self.assertEqual(len(data['orders']), 2)
+        self.assertEqual(data['count'], 3)
+        self.assertIsNotNone(data['next'])
+        
+        second = self.client.get(data['next']).json()
+        self.assertEqual(len(second['orders']), 1)
+        self.assertEqual(second['count'], 3)
+        self.assertIsNone(second['next'])
+
+
+class TestAdminOrderList(TestCase):
+    """Test the admin order list summary rows."""
+    
+    def setUp(self):
+        """Set up test data."""
+        from rest_framework.test import APIClient
+        from .models import Order, OrderItem
+        
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@example.com',
+            password='testpass123',
+            role='manager'
+        )
+        customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='testpass123'
+        )
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        products = [
+            Product.objects.create(
+                name=f'Test Product {i}',
+                slug=f'test-product-{i}',
+                description='Test description',
+                price=Decimal('100.00'),
+                category=category,
+                stock_quantity=10
+            )
+            for i in range(3)
+        ]
+        for i in range(5):
+            order = Order.objects.create(
+                user=customer,
+                order_number=f'ORD-LIST-{i}',
+                total_amount=Decimal('600.00'),
+                shipping_address='Test Address'
+            )
+            for product in products:
+                OrderItem.objects.create(order=order, product=product, quantity=2, price=Decimal('100.00'))
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+    
+    def test_list_rows_have_annotated_counts_and_no_items(self):
+        """Test that the list uses a count query plus one page query."""
+        from django.urls import reverse
+        
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('orders:admin_get_all_orders'))
+        
+        data = response.json()
+        self.assertEqual(data['total'], 5)
+        row = data['orders'][0]
+        self.assertEqual(row['items_count'], 6)
+        self.assertEqual(row['user_email'], 'customer@example.com')
+        self.assertNotIn('items', row)
+    
+    def test_detail_keeps_full_items(self):
+        """Test that the detail endpoint still returns nested items."""
+        from django.urls import reverse
+        from .models import Order
+        
+        order = Order.objects.first()
+        response = self.client.get(reverse('orders:admin_get_order_detail', args=[order.id]))
+        
+        data = response.json()
+        self.assertEqual(len(data['items']), 3)
+        self.assertEqual(data['items_count'], 6)
+
+
+class TestOrderItemSnapshot(TestCase):
+    """Test that order lines keep product data from the time of purchase."""
+    
+    def setUp(self):
+        """Set up user with a filled cart."""
+        from rest_framework.test import APIClient
+        
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.product = Product.objects.create(
+            name='Test Product',
+            slug='test-product',
+            description='Test description',
+            price=Decimal('100.00'),
+            category=category,
+            stock_quantity=10,
+            is_gluten_free=True
+        )
+        cart = Cart.objects.create(user=self.user)
+        cart.add_item(self.product, 2)
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+    
+    def test_checkout_writes_snapshot(self):
+        """Test that checkout copies name, slug and dietary flags onto the line."""
+        from django.urls import reverse
+        from .models import OrderItem
+        
+        response = self.client.post(
+            reverse('orders:create_order'), {'shipping_address': 'Test Address'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        
+        item = OrderItem.objects.get(order_id=response.data['order_id'])
+        self.assertEqual(item.product_name, 'Test Product')
+        self.assertEqual(item.product_slug, 'test-product')
+        self.assertTrue(item.is_gluten_free)
+        self.assertFalse(item.is_egg_free)
+    
+    def test_history_survives_product_rename_and_delete(self):
+        """Test that order history renders the purchased name after catalog changes."""
+        from django.urls import reverse
+        from .models import OrderItem
+        
+        self.client.post(
+            reverse('orders:create_order'), {'shipping_address': 'Test Address'}, format='json'
+        )
+        self.product.name = 'Renamed Product'
+        self.product.save()
+        
+        data = self.client.get(reverse('orders:get_user_orders')).json()
+        self.assertEqual(data['orders'][0]['items'][0]['product']['name'], 'Test Product')
+        
+        self.product.delete()
+        item = OrderItem.objects.get()
+        self.assertIsNone(item.product_id)
+        
+        data = self.client.get(reverse('orders:get_user_orders')).json()
+        line = data['orders'][0]['items'][0]
+        self.assertEqual(line['product']['name'], 'Test Product')
+        self.assertEqual(line['subtotal'], 200.0)
+
+
+class TestAdminOrderSearch(TestCase):
+    """Test admin order search over the search document."""
+    
+    def setUp(self):
+        """Set up test data."""
+        from rest_framework.test import APIClient
+        from .models import Order
+        
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@example.com',
+            password='testpass123',
+            role='manager'
+        )
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='ivan@example.com',
+            password='testpass123',
+            first_name='Иван',
+            last_name='Петров',
+            phone='+7 (999) 123-45-67'
+        )
+        other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='testpass123'
+        )
+        Order.objects.create(
+            user=self.customer,
+            order_number='ORD-SEARCH-1',
+            total_amount=Decimal('100.00'),
+            shipping_address='Москва, ул. Ленина, 1'
+        )
+        Order.objects.create(
+            user=other,
+            order_number='ORD-SEARCH-2',
+            total_amount=Decimal('100.00'),
+            shipping_address='Казань, ул. Баумана, 5'
+        )
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+    
+    def _search(self, query):
+        from django.urls import reverse
+        response = self.client.get(reverse('orders:admin_get_all_orders'), {'search': query})
+        return [order['order_number'] for order in response.json()['orders']]
+    
+    def test_search_by_customer_phone_and_address(self):
+        """Test that name, phone digits and address all find the order."""
+        self.assertEqual(self._search('иван петров'), ['ORD-SEARCH-1'])
+        self.assertEqual(self._search('9991234567'), ['ORD-SEARCH-1'])
+        self.assertEqual(self._search('+7 999 123'), ['ORD-SEARCH-1'])
+        self.assertEqual(self._search('Баумана'), ['ORD-SEARCH-2'])
+        self.assertEqual(self._search('ord-search'), ['ORD-SEARCH-2', 'ORD-SEARCH-1'])
+    
+    def test_search_by_hex_order_number_and_email(self):
+        """Test that terms mixing letters and digits are matched as typed."""
+        from .models import Order
+        
+        customer = User.objects.create_user(
+            username='ivan123',
+            email='ivan123@example.com',
+            password='testpass123'
+        )
+        Order.objects.create(
+            user=customer,
+            order_number='ORD-3F2A91B4',
+            total_amount=Decimal('100.00'),
+            shipping_address='Тверь, ул. Советская, 12'
+        )
+        
+        self.assertEqual(self._search('ORD-3F2A91B4'), ['ORD-3F2A91B4'])
+        self.assertEqual(self._search('3f2a91'), ['ORD-3F2A91B4'])
+        self.assertEqual(self._search('ivan123@'), ['ORD-3F2A91B4'])
+        # Цифры номера подряд не идут — по одним цифрам не находится
+        self.assertEqual(self._search('3291'), [])
+    
+    def test_document_follows_customer_changes(self):
+        """Test that renaming the customer updates their orders' documents."""
+        self.customer.last_name = 'Сидоров'
+        self.customer.save()
+        
+        self.assertEqual(self._search('сидоров'), ['ORD-SEARCH-1'])
+        self.assertEqual(self._search('петров'), [])
+
+
+class TestOrderStateMachine(TestCase):
+    """Test order transitions, batched restocking and history."""
+    
+    def setUp(self):
+        """Set up manager and paid orders."""
+        from rest_framework.test import APIClient
+        from .models import Order, OrderItem
+        
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@example.com',
+            password='testpass123',
+            role='manager'
+        )
+        customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='testpass123'
+        )
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.products = [
+            Product.objects.create(
+                name=f'Test Product {i}',
+                slug=f'test-product-{i}',
+                description='Test description',
+                price=Decimal('100.00'),
+                category=category,
+                stock_quantity=10
+            )
+            for i in range(2)
+        ]
+        self.orders = []
+        for i in range(3):
+            order = Order.objects.create(
+                user=customer,
+                order_number=f'ORD-FSM-{i}',
+                total_amount=Decimal('300.00'),
+                shipping_address='Test Address',
+                status='paid',
+                payment_status='paid'
+            )
+            OrderItem.objects.create(order=order, product=self.products[0], quantity=1, price=Decimal('100.00'))
+            OrderItem.objects.create(order=order, product=self.products[1], quantity=2, price=Decimal('100.00'))
+            self.orders.append(order)
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+    
+    def _update(self, order, **data):
+        from django.urls import reverse
+        return self.client.patch(
+            reverse('orders:admin_update_order_status', args=[order.id]), data, format='json'
+        )
+    
+    def test_cancel_then_refund_returns_stock_once(self):
+        """Test that a cancelled order is not restocked again on refund."""
+        self.assertEqual(self._update(self.orders[0], status='cancelled').status_code, 200)
+        self.assertEqual(self._update(self.orders[0], payment_status='refunded').status_code, 200)
+        
+        self.products[1].refresh_from_db()
+        self.assertEqual(self.products[1].stock_quantity, 12)
+        
+        history = list(self.orders[0].status_history.values_list('field', 'to_state', 'stock_returned'))
+        self.assertEqual(history, [('status', 'cancelled', True), ('payment_status', 'refunded', False)])
+    
+    def test_disallowed_transition_is_rejected(self):
+        """Test that a transition missing from the table returns 400 and changes nothing."""
+        self._update(self.orders[0], status='cancelled')
+        response = self._update(self.orders[0], status='shipped')
+        
+        self.assertEqual(response.status_code, 400)
+        self.orders[0].refresh_from_db()
+        self.assertEqual(self.orders[0].status, 'cancelled')
+    
+    def test_bulk_transition_batches_updates(self):
+        """Test that many orders move with a fixed number of queries."""
+        from django.urls import reverse
+        
+        self._update(self.orders[2], status='cancelled')
+        
+        order_ids = [order.id for order in self.orders]
+        with self.assertNumQueries(9):
+            response = self.client.post(
+                reverse('orders:admin_bulk_transition'),
+                {'order_ids': order_ids, 'status': 'cancelled'},
+                format='json'
+            )
+        
+        data = response.json()
+        self.assertEqual([row['id'] for row in data['updated']], order_ids)
+        self.assertEqual(data['rejected'], [])
+        
+        # Третий заказ уже был отменён — его товар не возвращается повторно
+        self.products[0].refresh_from_db()
+        self.products[1].refresh_from_db()
+        self.assertEqual(self.products[0].stock_quantity, 13)
+        self.assertEqual(self.products[1].stock_quantity, 16)
+    
+    def test_bulk_actions_with_tracking(self):
+        """Test per-order targets and tracking numbers in one request with a lean response."""
+        from django.urls import reverse
+        from .models import Order
+        
+        response = self.client.post(
+            reverse('orders:admin_bulk_update_orders'),
+            {'orders': [
+                {'id': self.orders[0].id, 'status': 'shipped', 'delivery_tracking': 'RB001'},
+                {'id': self.orders[1].id, 'status': 'shipped', 'delivery_tracking': 'RB002'},
+                {'id': self.orders[2].id, 'payment_status': 'pending'},
+                {'id': 999999, 'status': 'shipped'},
+            ]},
+            format='json'
+        )
+        
+        data = response.json()
+        self.assertEqual(data['updated'], [
+            {'id': self.orders[0].id, 'status': 'shipped', 'payment_status': 'paid', 'delivery_tracking': 'RB001'},
+            {'id': self.orders[1].id, 'status': 'shipped', 'payment_status': 'paid', 'delivery_tracking': 'RB002'},
+        ])
+        self.assertEqual([row['id'] for row in data['rejected']], [self.orders[2].id, 999999])
+        self.assertEqual(Order.objects.get(id=self.orders[1].id).delivery_tracking, 'RB002')
+        self.assertEqual(Order.objects.get(id=self.orders[2].id).payment_status, 'paid')
+
+    def test_bulk_actions_reject_duplicates_and_unknown_states(self):
+        """Test that a repeated order id or an unknown state fails the whole request."""
+        from django.urls import reverse
+        from .models import Order
+
+        for rows in (
+            [{'id': self.orders[0].id, 'status': 'shipped'}, {'id': self.orders[0].id, 'status': 'cancelled'}],
+            [{'id': self.orders[0].id, 'status': 'shipped'}, {'id': self.orders[1].id, 'status': 'lost'}],
+        ):
+            response = self.client.post(reverse('orders:admin_bulk_update_orders'), {'orders': rows}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(Order.objects.get(id=self.orders[0].id).status, self.orders[0].status)
+
+
+class TestOrderExport(TestCase):
+    """Test the streaming accounting export."""
+    
+    def setUp(self):
+        """Set up manager and two orders with lines."""
+        from rest_framework.test import APIClient
+        from .models import Order, OrderItem
+        
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@example.com',
+            password='testpass123',
+            role='manager'
+        )
+        customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='testpass123',
+            first_name='Иван'
+        )
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        product = Product.objects.create(
+            name='Хлеб безглютеновый',
+            slug='test-product',
+            description='Test description',
+            price=Decimal('150.00'),
+            category=category,
+            stock_quantity=10
+        )
+        for i in range(2):
+            order = Order.objects.create(
+                user=customer,
+                order_number=f'ORD-EXP-{i}',
+                total_amount=Decimal('300.00'),
+                shipping_address='Test Address'
+            )
+            OrderItem.objects.create(order=order, product=product, quantity=2, price=Decimal('150.00'))
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+        from django.utils import timezone
+        self.today = timezone.localdate().isoformat()
+    
+    def _export(self, **params):
+        from django.urls import reverse
+        return self.client.get(
+            reverse('orders:admin_export_orders'),
+            {'date_from': self.today, 'date_to': self.today, **params}
+        )
+    
+    def test_csv_export_streams_lines(self):
+        """Test that CSV is streamed with a header and one row per line."""
+        import csv
+        import io
+        
+        response = self._export()
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0][0], 'order_number')
+        self.assertEqual([row[0] for row in rows[1:]], ['ORD-EXP-0', 'ORD-EXP-1'])
+        self.assertEqual(rows[1][rows[0].index('product_name')], 'Хлеб безглютеновый')
+        self.assertEqual(rows[1][-1], '300.00')
+    
+    def test_gzipped_jsonl_export(self):
+        """Test that JSONL output can be gzip-compressed."""
+        import gzip
+        import json
+        
+        response = self._export(file_format='jsonl', gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])['customer_first_name'], 'Иван')
+
+    def test_csv_neutralises_formulas(self):
+        """Test that text cells starting with a formula character are prefixed with a quote."""
+        import csv
+        import io
+        import json
+        from .models import Order
+
+        Order.objects.update(shipping_address='=HYPERLINK("http://evil")')
+        User.objects.filter(email='customer@example.com').update(phone='+79990000000', last_name='@SUM(A1)')
+
+        content = b''.join(self._export().streaming_content).decode('utf-8-sig')
+        header, row = list(csv.reader(io.StringIO(content)))[:2]
+        self.assertEqual(row[header.index('shipping_address')], '\'=HYPERLINK("http://evil")')
+        self.assertEqual(row[header.index('customer_phone')], "'+79990000000")
+        self.assertEqual(row[header.index('customer_last_name')], "'@SUM(A1)")
+        self.assertEqual(row[header.index('customer_first_name')], 'Иван')
+
+        # В JSONL значения не меняются
+        lines = b''.join(self._export(file_format='jsonl').streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(json.loads(lines[0])['customer_phone'], '+79990000000')
+
+    def test_date_range_is_required(self):
+        """Test that a missing range is rejected."""
+        from django.urls import reverse
+        
+        response = self.client.get(reverse('orders:admin_export_orders'))
+        self.assertEqual(response.status_code, 400)
+
+
+class TestQueryPlans(TestCase):
+    """Regression test: hot order and cart queries must be served by an index."""
+    
+    def setUp(self):
+        from django.db import connection
+        
+        if connection.vendor == 'postgresql':
+            # На пустых таблицах планировщик и так выберет Seq Scan
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+    
+    def assertUsesIndex(self, queryset):
+        import re
+        from django.db import connection
+        
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan', plan)
+        elif connection.vendor == 'sqlite':
+            self.assertIsNone(re.search(r'\bSCAN \w+\b(?! USING)', plan), plan)
+    
+    def test_hot_query_shapes(self):
+        """Test order history, admin list/filters, revenue, cart sweep and cart line lookup."""
+        from django.utils import timezone
+        from .models import Order
+        
+        now = timezone.now()
+        self.assertUsesIndex(Order.objects.filter(user_id=1).order_by('-created_at', '-id')[:21])
+        self.assertUsesIndex(Order.objects.order_by('-created_at')[:20])
+        self.assertUsesIndex(Order.objects.filter(status='shipped').order_by('-created_at')[:20])
+        self.assertUsesIndex(Order.objects.filter(payment_status='paid').order_by('-created_at')[:20])
+        self.assertUsesIndex(Order.objects.filter(payment_status='paid', created_at__gte=now))
+        self.assertUsesIndex(Order.objects.filter(created_at__gte=now))
+        self.assertUsesIndex(Cart.objects.filter(updated_at__lt=now))
+        self.assertUsesIndex(CartItem.objects.filter(cart_id=1, product_id=1))
+
+
+class TestVKNotifications(TestCase):
+    """Test that admin notifications are sent concurrently through the async client."""
+    
+    def test_messages_sent_concurrently(self):
+        """Test that three slow sends take about as long as one."""
+        import asyncio
+        import time
+        from contextlib import asynccontextmanager
+        from unittest.mock import patch
+        
+        import httpx
+        from asgiref.sync import async_to_sync
+        from django.test import override_settings
+        from .notifications import asend_vk_messages
+        
+        async def handler(request):
+            await asyncio.sleep(0.3)
+            return httpx.Response(200, json={'response': 1})
+        
+        @asynccontextmanager
+        async def fake_client():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                yield client
+        
+        with override_settings(VK_GROUP_TOKEN='token'), \
+                patch('orders.notifications.outbound_client', fake_client):
+            start = time.monotonic()
+            results = async_to_sync(asend_vk_messages)([1, 2, 3], 'Новый заказ')
+            elapsed = time.monotonic() - start
+        
+        self.assertEqual(results, [True, True, True])
+        self.assertLess(elapsed, 0.8)
+
+
+class TestIdempotentCheckout(TestCase):
+    """Test Idempotency-Key handling on order creation."""
+    
+    def setUp(self):
+        """Set up user with a filled cart."""
+        from rest_framework.test import APIClient
+        
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.product = Product.objects.create(
+            name='Test Product',
+            slug='test-product',
+            description='Test description',
+            price=Decimal('100.00'),
+            category=category,
+            stock_quantity=10
+        )
+        cart = Cart.objects.create(user=self.user)
+        cart.add_item(self.product, 2)
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+    
+    def _create_order(self, key, address='Test Address'):
+        from django.urls import reverse
+        return self.client.post(
+            reverse('orders:create_order'),
+            {'shipping_address': address},
+            format='json',
+            HTTP_IDEMPOTENCY_KEY=key
+        )
+    
+    def test_retry_replays_stored_response(self):
+        """Test that a retry with the same key returns the first response byte-for-byte."""
+        from .models import Order
+        
+        first = self._create_order('checkout-1')
+        second = self._create_order('checkout-1')
+        
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+        
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 8)
+    
+    def test_key_reuse_with_different_payload(self):
+        """Test that a key cannot be reused for a different request."""
+        self._create_order('checkout-2')
+        response = self._create_order('checkout-2', address='Other Address')
+        
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()['type'], 'IDEMPOTENCY_KEY_REUSED')
+    
+    def test_in_progress_duplicate_does_not_checkout(self):
+        """Test that a duplicate does not run checkout while the first request is in flight."""
+        import hashlib
+        import json
+        from datetime import timedelta
+        from django.test import override_settings
+        from django.utils import timezone
+        from .models import IdempotencyKey, Order
+        
+        payload = json.dumps({'shipping_address': 'Test Address'}, sort_keys=True)
+        IdempotencyKey.objects.create(
+            user=self.user,
+            scope='create_order',
+            key='checkout-3',
+            request_hash=hashlib.sha256(
+                f'POST:/api/orders/create/:{payload}'.encode('utf-8')
+            ).hexdigest(),
+            expires_at=timezone.now() + timedelta(hours=1)
+        )
+        
+        with override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0):
+            response = self._create_order('checkout-3')
+        
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['type'], 'IDEMPOTENCY_IN_PROGRESS')
+        self.assertEqual(Order.objects.count(), 0)
+    
+    def test_stale_processing_key_is_reclaimed(self):
+        """Test that a key left in processing by a dead worker is taken over after the lease."""
+        import hashlib
+        import json
+        from datetime import timedelta
+        from django.test import override_settings
+        from django.utils import timezone
+        from .models import IdempotencyKey, Order
+        
+        payload = json.dumps({'shipping_address': 'Test Address'}, sort_keys=True)
+        # Воркер «умер» посреди обработки — ключ остался в processing
+        record = IdempotencyKey.objects.create(
+            user=self.user, scope='create_order', key='checkout-4',
+            request_hash=hashlib.sha256(f'POST:/api/orders/create/:{payload}'.encode('utf-8')).hexdigest(),
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+        
+        with override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0, IDEMPOTENCY_PROCESSING_TIMEOUT=5 * 60):
+            self.assertEqual(self._create_order('checkout-4').status_code, 409)
+            IdempotencyKey.objects.filter(id=record.id).update(created_at=timezone.now() - timedelta(minutes=10))
+            response = self._create_order('checkout-4')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get(key='checkout-4').state, 'completed')
+
+
 @pytest.mark.django_db(transaction=True)
 @pytest.mark.property_tests
 class TestCartProperties:
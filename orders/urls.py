@@ -6,9 +6,17 @@ app_name = 'orders'
 urlpatterns = [
     # Cart API endpoints
     path('cart/', views.get_cart, name='get_cart'),
+    path('cart/summary/', views.get_cart_summary, name='get_cart_summary'),
     path('cart/add/', views.add_to_cart, name='add_to_cart'),
     path('cart/update/', views.update_cart_item, name='update_cart_item'),
     path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('cart/sync/', views.sync_cart, name='sync_cart'),
+    
+    # Guest cart API endpoints (cache-backed, X-Cart-Token)
+    path('cart/guest/', views.get_guest_cart, name='get_guest_cart'),
+    path('cart/guest/items/', views.update_guest_cart, name='update_guest_cart'),
+    path('cart/guest/remove/<int:product_id>/', views.remove_from_guest_cart, name='remove_from_guest_cart'),
+    path('cart/guest/merge/', views.merge_guest_cart, name='merge_guest_cart'),
     
     # Order API endpoints
     path('', views.get_user_orders, name='get_user_orders'),
@@ -18,5 +26,8 @@ urlpatterns = [
     path('admin/all/', views.admin_get_all_orders, name='admin_get_all_orders'),
     path('admin/<int:order_id>/', views.admin_get_order_detail, name='admin_get_order_detail'),
     path('admin/<int:order_id>/update/', views.admin_update_order_status, name='admin_update_order_status'),
+    path('admin/transition/', views.admin_bulk_transition, name='admin_bulk_transition'),
+    path('admin/bulk/', views.admin_bulk_update_orders, name='admin_bulk_update_orders'),
+    path('admin/export/', views.admin_export_orders, name='admin_export_orders'),
     path('admin/statistics/', views.admin_get_order_statistics, name='admin_get_order_statistics'),
 ]
\ No newline at end of file
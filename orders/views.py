@@ -3,66 +3,65 @@ Views for orders app.
 """
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from django.db.models import Q, Count, Sum
+from django.db.models import Case, CharField, Count, Prefetch, Sum, Value, When
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 import logging
 
 from .models import Cart, CartItem, Order, OrderItem
 from .permissions import IsAdminOrManager, IsAdminOrManagerOrOwner
-from .serializers import AdminOrderSerializer
+from .serializers import AdminOrderSerializer, AdminOrderListSerializer, OrderHistorySerializer
+from .pagination import OrderHistoryPagination
 from products.models import Product
+from products.availability import get_availability
+from pkubg_ecommerce.db_router import replica_reads
 from .notifications import notify_new_order
+from .idempotency import idempotent
+from .cart_cache import get_cart_snapshot, refresh_cart_cache, primary_first_images
+from .cart_sync import apply_cart_state, normalize_cart_lines
+from .search import search_orders
+from .export import EXPORT_FORMATS, stream_export
+from .state_machine import TransitionError, apply_transitions, check_changes, transition_orders
+from . import guest_cart
 
 
 logger = logging.getLogger(__name__)
 
+def _absolute_cart_data(request, snapshot):
+    """Copy of a cart snapshot with absolute image URLs for this request."""
+    items = []
+    for item in snapshot['items']:
+        images = [
+            {**image, 'image': request.build_absolute_uri(image['image']) if image['image'] else None}
+            for image in item['product']['images']
+        ]
+        items.append({**item, 'product': {**item['product'], 'images': images}})
+    return {**snapshot, 'items': items}
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_cart(request):
     """Get user's cart contents."""
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    
-    cart_data = {
-        'items': [],
-        'count': cart.total_items,
-        'total': float(cart.total_amount)
-    }
-    
-    for item in cart.items.select_related('product').prefetch_related('product__images'):
-        primary_image = None
-        if item.product.images.exists():
-            primary_image = item.product.images.filter(is_primary=True).first()
-            if not primary_image:
-                primary_image = item.product.images.first()
-        
-        cart_data['items'].append({
-            'id': item.id,
-            'product': {
-                'id': item.product.id,
-                'name': item.product.name,
-                'price': float(item.product.price),
-                'slug': item.product.slug,
-                'is_gluten_free': item.product.is_gluten_free,
-                'is_low_protein': item.product.is_low_protein,
-                'is_lactose_free': item.product.is_lactose_free,
-                'is_egg_free': item.product.is_egg_free,
-                'stock_quantity': item.product.stock_quantity,
-                'available_quantity': item.product.available_quantity,
-                'images': [{
-                    'image': request.build_absolute_uri(primary_image.image.url) if primary_image else None,
-                    'alt_text': primary_image.alt_text if primary_image else item.product.name,
-                    'is_primary': True
-                }] if primary_image else []
-            },
-            'quantity': item.quantity,
-            'price': float(item.product.price),
-            'subtotal': float(item.quantity * item.product.price)
-        })
-    
-    return Response(cart_data)
+    snapshot = get_cart_snapshot(request.user.id)
+    return Response(_absolute_cart_data(request, snapshot))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_cart_summary(request):
+    """Get item count and total for the header badge straight from the cart cache."""
+    snapshot = get_cart_snapshot(request.user.id)
+    return Response({
+        'count': snapshot['count'],
+        'total': snapshot['total'],
+        'version': snapshot['version']
+    })
 
 
 @api_view(['POST'])
@@ -91,11 +90,34 @@ def add_to_cart(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    product = get_object_or_404(Product, id=product_id, is_active=True)
+    try:
+        product_id = int(product_id)
+    except (ValueError, TypeError):
+        return Response(
+            {'error': 'Invalid product ID'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Быстрая проверка по кэшу остатков — без блокировок
+    cached_available, is_active = get_availability([product_id]).get(product_id, (0, False))
+    # Неизвестный или снятый с продажи товар — 404
+    if not is_active:
+        return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    if cached_available <= 0:
+        return Response(
+            {
+                'error': 'Товар недоступен для добавления',
+                'message': 'Доступно: 0 шт.',
+                'type': 'STOCK_UNAVAILABLE'
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
     with transaction.atomic():
         # Блокируем продукт для атомарного обновления
-        product = Product.objects.select_for_update().get(id=product_id)
+        product = Product.objects.select_for_update().filter(id=product_id, is_active=True).first()
+        if product is None:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
         
         cart, created = Cart.objects.get_or_create(user=request.user)
         
@@ -131,12 +153,12 @@ def add_to_cart(request):
                 quantity=actual_quantity
             )
     
-    cart.refresh_from_db()
+    snapshot = refresh_cart_cache(request.user.id)
     
     return Response({
         'message': 'Item added to cart',
-        'count': cart.total_items,
-        'total': float(cart.total_amount)
+        'count': snapshot['count'],
+        'total': snapshot['total']
     })
 
 
@@ -232,12 +254,12 @@ def update_cart_item(request):
         else:
             message = 'No changes'
     
-    cart.refresh_from_db()
+    snapshot = refresh_cart_cache(request.user.id)
     
     return Response({
         'message': message,
-        'count': cart.total_items,
-        'total': float(cart.total_amount)
+        'count': snapshot['count'],
+        'total': snapshot['total']
     })
 
 
@@ -259,15 +281,168 @@ def remove_from_cart(request, item_id):
         except CartItem.DoesNotExist:
             removed = False
     
+    snapshot = refresh_cart_cache(request.user.id) if removed else get_cart_snapshot(request.user.id)
+    
     return Response({
         'message': 'Item removed from cart' if removed else 'Item not found in cart',
-        'count': cart.total_items,
-        'total': float(cart.total_amount)
+        'count': snapshot['count'],
+        'total': snapshot['total']
+    })
+
+
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def sync_cart(request):
+    """
+    Replace cart contents with the full desired state in one transaction.
+    
+    Body: {"items": [{"product_id": 1, "quantity": 2}, ...], "merge": false}
+    With "merge": true quantities are added to the current cart instead.
+    """
+    if not isinstance(request.data, dict):
+        return Response({'error': 'Body must be an object'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        desired = normalize_cart_lines(request.data.get('items', []))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    merge = bool(request.data.get('merge', False))
+    
+    cart, created = Cart.objects.get_or_create(user=request.user)
+    adjustments = apply_cart_state(cart, desired, merge=merge)
+    
+    snapshot = refresh_cart_cache(request.user.id)
+    
+    return Response({
+        **_absolute_cart_data(request, snapshot),
+        'adjustments': adjustments
     })
 
 
+# ═══ GUEST CART ═══
+
+def _guest_cart_id(request):
+    """Cart id and token from the request; a new pair if the token is missing or invalid."""
+    token = guest_cart.get_request_token(request)
+    cart_id = guest_cart.read_token(token)
+    if cart_id is None:
+        cart_id, token = guest_cart.issue_token()
+    return cart_id, token
+
+
+def _guest_cart_response(request, cart_id, token, **extra):
+    data = _absolute_cart_data(request, guest_cart.build_guest_cart(cart_id))
+    response = Response({**data, **extra, 'cart_token': token})
+    response['X-Cart-Token'] = token
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_guest_cart(request):
+    """Get guest cart contents (cache only, no database rows)."""
+    cart_id, token = _guest_cart_id(request)
+    return _guest_cart_response(request, cart_id, token)
+
+
+@api_view(['POST', 'PUT'])
+@permission_classes([AllowAny])
+def update_guest_cart(request):
+    """
+    Add to (POST) or set (PUT) a guest cart line with a soft stock hold.
+    
+    Stock is read from the availability cache without row locks; the hold
+    expires after GUEST_RESERVATION_TTL.
+    """
+    product_id = request.data.get('product_id')
+    quantity = request.data.get('quantity', 1)
+    
+    if not product_id:
+        return Response(
+            {'error': 'Product ID is required'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        product_id = int(product_id)
+        quantity = int(quantity)
+        if quantity < 0 or (request.method == 'POST' and quantity == 0):
+            raise ValueError
+    except (ValueError, TypeError):
+        return Response(
+            {'error': 'Invalid quantity'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    cart_id, token = _guest_cart_id(request)
+    available = guest_cart.guest_available_quantity(product_id, cart_id)
+    if available is None:
+        return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    
+    lines = guest_cart.load_lines(cart_id)
+    current = lines.get(product_id, 0)
+    requested = current + quantity if request.method == 'POST' else quantity
+    
+    target = min(requested, available)
+    
+    if target <= 0 and requested > 0:
+        return Response(
+            {
+                'error': 'Товар недоступен для добавления',
+                'message': f'Доступно: {available} шт.',
+                'type': 'STOCK_UNAVAILABLE'
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if target > 0:
+        lines[product_id] = target
+    else:
+        lines.pop(product_id, None)
+    guest_cart.save_lines(cart_id, lines)
+    guest_cart.set_hold(product_id, cart_id, target)
+    
+    return _guest_cart_response(request, cart_id, token, requested=requested, quantity=target)
+
+
+@api_view(['DELETE'])
+@permission_classes([AllowAny])
+def remove_from_guest_cart(request, product_id):
+    """Remove a line from the guest cart and drop its soft hold."""
+    cart_id, token = _guest_cart_id(request)
+    lines = guest_cart.load_lines(cart_id)
+    
+    if lines.pop(product_id, None) is not None:
+        guest_cart.save_lines(cart_id, lines)
+        guest_cart.set_hold(product_id, cart_id, 0)
+    
+    return _guest_cart_response(request, cart_id, token)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+def merge_guest_cart(request):
+    """Merge a guest cart (X-Cart-Token) into the user's cart in one transaction."""
+    token = guest_cart.get_request_token(request)
+    if not guest_cart.read_token(token):
+        return Response(
+            {'error': 'Invalid cart token'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    adjustments = guest_cart.merge_guest_cart(request.user, token) or []
+    
+    snapshot = refresh_cart_cache(request.user.id)
+    
+    return guest_cart.drop_client_token(Response({
+        **_absolute_cart_data(request, snapshot),
+        'adjustments': adjustments
+    }))
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent('create_order')
 def create_order(request):
     """Create order from cart — deduct stock, clear reservations."""
     import uuid
@@ -305,21 +480,29 @@ def create_order(request):
             )
             
             # Переносим товары из корзины в заказ и списываем со склада
-            for cart_item in cart.items.select_related('product'):
+            cart_items = cart.items.select_related('product').prefetch_related(
+                Prefetch('product__images', queryset=primary_first_images())
+            )
+            for cart_item in cart_items:
                 product = Product.objects.select_for_update().get(id=cart_item.product.id)
                 
                 # Списываем со склада (и снимаем резерв)
                 product.deduct_stock(cart_item.quantity)
                 
-                OrderItem.objects.create(
+                order_item = OrderItem(
                     order=order,
                     product=product,
                     quantity=cart_item.quantity,
                     price=product.price
                 )
+                # Снимок товара: история заказа больше не зависит от каталога
+                order_item.capture_product_snapshot(cart_item.product)
+                order_item.save()
             
             # Очищаем корзину
             cart.items.all().delete()
+        
+        refresh_cart_cache(request.user.id)
 
         # ═══ Уведомление в ВК ═══
         try:
@@ -350,64 +533,54 @@ def create_order(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_orders(request):
-    """Get user's order history."""
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    
-    orders_data = []
-    for order in orders:
-        order_items = []
-        for item in order.items.select_related('product').prefetch_related('product__images'):
-            primary_image = None
-            if item.product.images.exists():
-                primary_image = item.product.images.filter(is_primary=True).first()
-                if not primary_image:
-                    primary_image = item.product.images.first()
-            
-            order_items.append({
-                'id': item.id,
-                'product': {
-                    'id': item.product.id,
-                    'name': item.product.name,
-                    'slug': item.product.slug,
-                    'images': [{
-                        'image': request.build_absolute_uri(primary_image.image.url) if primary_image else None,
-                        'alt_text': primary_image.alt_text if primary_image else item.product.name,
-                        'is_primary': True
-                    }] if primary_image else []
-                },
-                'quantity': item.quantity,
-                'price': float(item.price),
-                'subtotal': float(item.quantity * item.price)
-            })
-        
-        orders_data.append({
-            'id': order.id,
-            'order_number': order.order_number,
-            'status': order.status,
-            'payment_status': order.payment_status,
-            'total_amount': float(order.total_amount),
-            'shipping_address': order.shipping_address,
-            'delivery_method': order.delivery_method,
-            'created_at': order.created_at.isoformat(),
-            'updated_at': order.updated_at.isoformat(),
-            'items': order_items
-        })
+    """
+    Get user's order history, newest first, with cursor pagination.
+    
+    Lines render from their product snapshots, so a page costs one query for
+    orders and one for their items, regardless of history length. ``count``
+    is the user's total number of orders, not the page length.
+    """
+    orders = Order.objects.filter(user=request.user).prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.order_by('id'))
+    )
+    
+    paginator = OrderHistoryPagination()
+    page = paginator.paginate_queryset(orders, request)
+    orders_data = OrderHistorySerializer(page, many=True, context={'request': request}).data
     
     return Response({
         'orders': orders_data,
-        'count': len(orders_data)
+        'count': orders.count(),
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link()
     })
 
 
 # ═══ ADMIN VIEWS ═══
 
+# Колонки, нужные строке списка заказов в админке
+ADMIN_ORDER_LIST_FIELDS = (
+    'id', 'order_number', 'status', 'payment_status', 'total_amount',
+    'shipping_address', 'delivery_method', 'delivery_tracking', 'notes',
+    'created_at', 'updated_at',
+    'user__email', 'user__first_name', 'user__last_name', 'user__phone',
+)
+
+
+def admin_order_list_queryset():
+    """Orders for summary rows: needed columns only, item count annotated in SQL."""
+    return Order.objects.select_related('user').only(
+        *ADMIN_ORDER_LIST_FIELDS
+    ).annotate(
+        items_count=Sum('items__quantity')
+    )
+
+
 @api_view(['GET'])
 @permission_classes([IsAdminOrManager])
 def admin_get_all_orders(request):
-    """Get all orders for admin/manager view."""
-    orders = Order.objects.select_related('user').prefetch_related(
-        'items', 'items__product', 'items__product__images'
-    ).order_by('-created_at')
+    """Get all orders for admin/manager view (summary rows; items via detail)."""
+    orders = admin_order_list_queryset().order_by('-created_at')
     
     status_filter = request.query_params.get('status')
     if status_filter:
@@ -419,12 +592,8 @@ def admin_get_all_orders(request):
     
     search = request.query_params.get('search')
     if search:
-        orders = orders.filter(
-            Q(order_number__icontains=search) |
-            Q(user__email__icontains=search) |
-            Q(user__first_name__icontains=search) |
-            Q(user__last_name__icontains=search)
-        )
+        # Номер, имя, email, телефон и адрес; лучшие совпадения первыми
+        orders = search_orders(orders, search)
     
     page = int(request.query_params.get('page', 1))
     page_size = int(request.query_params.get('page_size', 20))
@@ -434,7 +603,7 @@ def admin_get_all_orders(request):
     total_count = orders.count()
     orders_page = orders[start:end]
     
-    serializer = AdminOrderSerializer(orders_page, many=True)
+    serializer = AdminOrderListSerializer(orders_page, many=True)
     
     return Response({
         'orders': serializer.data,
@@ -450,9 +619,7 @@ def admin_get_all_orders(request):
 def admin_get_order_detail(request, order_id):
     """Get detailed information about a specific order."""
     order = get_object_or_404(
-        Order.objects.select_related('user').prefetch_related(
-            'items', 'items__product', 'items__product__images'
-        ),
+        Order.objects.select_related('user').prefetch_related('items'),
         id=order_id
     )
     
@@ -469,44 +636,31 @@ def admin_get_order_detail(request, order_id):
 @api_view(['PATCH'])
 @permission_classes([IsAdminOrManager])
 def admin_update_order_status(request, order_id):
-    """Update order status with stock management."""
+    """Update order status through the state machine (stock returned on cancel/refund)."""
     order = get_object_or_404(Order, id=order_id)
-    old_status = order.status
-    
-    new_status = request.data.get('status')
-    if new_status and new_status in dict(Order.ORDER_STATUS_CHOICES):
-        # Если заказ отменяется — вернуть товары на склад
-        if new_status == 'cancelled' and old_status != 'cancelled':
-            with transaction.atomic():
-                for item in order.items.select_related('product'):
-                    product = Product.objects.select_for_update().get(id=item.product.id)
-                    product.return_stock(item.quantity)
-                
-                order.status = new_status
-                order.save()
-        else:
-            order.status = new_status
-    
-    new_payment_status = request.data.get('payment_status')
-    if new_payment_status and new_payment_status in dict(Order.PAYMENT_STATUS_CHOICES):
-        # Если возврат — вернуть товары на склад
-        if new_payment_status == 'refunded' and order.payment_status != 'refunded':
-            with transaction.atomic():
-                for item in order.items.select_related('product'):
-                    product = Product.objects.select_for_update().get(id=item.product.id)
-                    product.return_stock(item.quantity)
-                
-                order.payment_status = new_payment_status
-                order.save()
-        else:
-            order.payment_status = new_payment_status
     
+    changes = {
+        field: request.data[field]
+        for field in ('status', 'payment_status')
+        if request.data.get(field)
+    }
     delivery_tracking = request.data.get('delivery_tracking')
-    if delivery_tracking is not None:
-        order.delivery_tracking = delivery_tracking
     
-    order.save()
+    with transaction.atomic():
+        if changes:
+            try:
+                _, rejected = transition_orders([order.id], changes, changed_by=request.user)
+            except TransitionError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if rejected:
+                return Response({'error': rejected[0]['error']}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if delivery_tracking is not None:
+            Order.objects.filter(id=order.id).update(
+                delivery_tracking=delivery_tracking, updated_at=timezone.now()
+            )
     
+    order = Order.objects.select_related('user').prefetch_related('items').get(id=order.id)
     serializer = AdminOrderSerializer(order)
     return Response({
         'message': 'Заказ успешно обновлен',
@@ -514,8 +668,166 @@ def admin_update_order_status(request, order_id):
     })
 
 
+# Не больше заказов за один запрос
+BULK_TRANSITION_LIMIT = 500
+
+
+def _bulk_update_orders(rows, user):
+    """
+    Validate ``rows`` (``[{"id", "status", "payment_status", "delivery_tracking"}]``)
+    and apply them in one transaction; shared by both bulk endpoints.
+    """
+    if len(rows) > BULK_TRANSITION_LIMIT:
+        return Response(
+            {'error': f'Не больше {BULK_TRANSITION_LIMIT} заказов за раз'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    changes_by_order = {}
+    tracking = {}
+    for row in rows:
+        if not isinstance(row, dict):
+            return Response({'error': 'Each order must be an object'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            order_id = int(row.get('id'))
+        except (ValueError, TypeError):
+            return Response({'error': 'Invalid order id'}, status=status.HTTP_400_BAD_REQUEST)
+        # Иначе последняя строка молча перекрыла бы предыдущую
+        if order_id in changes_by_order:
+            return Response({'error': f'Заказ {order_id} указан дважды'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        changes = {
+            field: row[field]
+            for field in ('status', 'payment_status')
+            if row.get(field)
+        }
+        try:
+            check_changes(changes)
+        except TransitionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        changes_by_order[order_id] = changes
+        if row.get('delivery_tracking') is not None:
+            tracking[order_id] = str(row['delivery_tracking'])[:100]
+    
+    with transaction.atomic():
+        applied, rejected = apply_transitions(changes_by_order, changed_by=user)
+        
+        tracking_ids = [row['id'] for row in applied if row['id'] in tracking]
+        if tracking_ids:
+            Order.objects.filter(id__in=tracking_ids).update(
+                delivery_tracking=Case(
+                    *[When(id=order_id, then=Value(tracking[order_id])) for order_id in tracking_ids],
+                    output_field=CharField()
+                ),
+                updated_at=timezone.now()
+            )
+    
+    for row in applied:
+        if row['id'] in tracking:
+            row['delivery_tracking'] = tracking[row['id']]
+    
+    return Response({
+        'updated': applied,
+        'rejected': rejected
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminOrManager])
+def admin_bulk_update_orders(request):
+    """
+    Apply per-order status, payment status and tracking changes in one transaction.
+    
+    Body: ``{"orders": [{"id": 1, "status": "shipped", "delivery_tracking": "RB123"}, ...]}``.
+    One UPDATE runs per distinct target state and one for all tracking numbers.
+    Only ids and new states are returned; each order may appear once.
+    """
+    rows = request.data.get('orders')
+    if not isinstance(rows, list) or not rows:
+        return Response({'error': 'orders must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    return _bulk_update_orders(rows, request.user)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminOrManager])
+def admin_bulk_transition(request):
+    """
+    Move many orders to the same status and/or payment status (``admin/bulk/`` shorthand).
+    
+    Body: ``{"order_ids": [...], "status": "shipped", "payment_status": "paid"}``.
+    Orders whose transition is not allowed are skipped and listed in ``rejected``.
+    """
+    order_ids = request.data.get('order_ids')
+    if not isinstance(order_ids, list) or not order_ids:
+        return Response({'error': 'order_ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    changes = {
+        field: request.data[field]
+        for field in ('status', 'payment_status')
+        if request.data.get(field)
+    }
+    if not changes:
+        return Response({'error': 'status or payment_status is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        order_ids = list(dict.fromkeys(int(order_id) for order_id in order_ids))
+    except (ValueError, TypeError):
+        return Response({'error': 'Invalid order id'}, status=status.HTTP_400_BAD_REQUEST)
+    return _bulk_update_orders([{'id': order_id, **changes} for order_id in order_ids], request.user)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminOrManager])
+def admin_export_orders(request):
+    """
+    Stream orders with their lines for accounting.
+    
+    Query params: ``date_from``/``date_to`` (YYYY-MM-DD, inclusive),
+    ``file_format`` (``csv`` or ``jsonl``), ``gzip=1``, optional ``status``.
+    """
+    date_from = parse_date(request.query_params.get('date_from') or '')
+    date_to = parse_date(request.query_params.get('date_to') or '')
+    if not date_from or not date_to or date_from > date_to:
+        return Response(
+            {'error': 'date_from and date_to (YYYY-MM-DD) are required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    file_format = request.query_params.get('file_format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        return Response(
+            {'error': f'file_format must be one of: {", ".join(EXPORT_FORMATS)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    compress = request.query_params.get('gzip') in ('1', 'true')
+    
+    filename = f'orders_{date_from:%Y%m%d}_{date_to:%Y%m%d}.{file_format}'
+    if compress:
+        filename += '.gz'
+        content_type = 'application/gzip'
+    elif file_format == 'csv':
+        content_type = 'text/csv; charset=utf-8'
+    else:
+        content_type = 'application/x-ndjson; charset=utf-8'
+    
+    response = StreamingHttpResponse(
+        stream_export(
+            date_from, date_to,
+            file_format=file_format,
+            compress=compress,
+            order_status=request.query_params.get('status') or None
+        ),
+        content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Nginx не должен буферизовать выгрузку целиком
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([IsAdminOrManager])
+@replica_reads()
 def admin_get_order_statistics(request):
     """Get order statistics for admin dashboard."""
     from decimal import Decimal
@@ -536,8 +848,8 @@ def admin_get_order_statistics(request):
         total=Sum('total_amount')
     )['total'] or Decimal('0.00')
     
-    recent_orders = Order.objects.select_related('user').order_by('-created_at')[:10]
-    recent_orders_data = AdminOrderSerializer(recent_orders, many=True).data
+    recent_orders = admin_order_list_queryset().order_by('-created_at')[:10]
+    recent_orders_data = AdminOrderListSerializer(recent_orders, many=True).data
     
     return Response({
         'total_orders': total_orders,
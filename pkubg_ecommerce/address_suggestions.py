@@ -1,65 +1,61 @@
 """
 Address suggestions API using Dadata service.
 """
-import requests
+import httpx
 from django.conf import settings
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
-from rest_framework import status
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
 
+from .async_views import async_jwt_required, json_body
+from .dadata import (
+    MIN_QUERY_LENGTH, DadataError, allow_user_request,
+    cached_suggestions, fetch_suggestions, normalize_query
+)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def get_address_suggestions(request):
+
+@require_POST
+@async_jwt_required
+async def get_address_suggestions(request):
     """
     Get address suggestions from Dadata API.
+
+    Served from the LRU/shared cache when possible; only cache misses count
+    towards the per-user burst limit and reach Dadata.
     """
-    query = request.data.get('query', '').strip()
-    
-    if not query or len(query) < 3:
-        return Response({
+    query = normalize_query(json_body(request).get('query', ''))
+
+    if len(query) < MIN_QUERY_LENGTH:
+        return JsonResponse({
             'suggestions': []
         })
-    
-    # Dadata API key from settings
-    api_key = getattr(settings, 'DADATA_API_KEY', None)
-    
-    if not api_key:
-        return Response({
-            'error': 'Dadata API key not configured'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
+
+    suggestions = await cached_suggestions(query)
+    if suggestions is not None:
+        return JsonResponse({
+            'suggestions': suggestions
+        })
+
+    if not await allow_user_request(request.user.id):
+        response = JsonResponse({
+            'error': 'Слишком много запросов подсказок, подождите',
+            'suggestions': []
+        }, status=429)
+        response['Retry-After'] = str(getattr(settings, 'DADATA_BURST_WINDOW', 5))
+        return response
+
     try:
-        # Make request to Dadata API
-        response = requests.post(
-            'https://suggestions.dadata.ru/suggestions/api/4_1/rs/suggest/address',
-            headers={
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'Authorization': f'Token {api_key}'
-            },
-            json={
-                'query': query,
-                'count': 5,
-                'locations': [{'country': '*'}]
-            },
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            return Response({
-                'suggestions': data.get('suggestions', [])
-            })
-        else:
-            return Response({
-                'error': f'Dadata API error: {response.status_code}',
-                'suggestions': []
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-    except requests.exceptions.RequestException as e:
-        return Response({
+        suggestions = await fetch_suggestions(query)
+    except DadataError as e:
+        return JsonResponse({
+            'error': str(e),
+            'suggestions': []
+        }, status=500)
+    except httpx.HTTPError as e:
+        return JsonResponse({
             'error': f'Request failed: {str(e)}',
             'suggestions': []
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=500)
+
+    return JsonResponse({
+        'suggestions': suggestions
+    })
@@ -0,0 +1,46 @@
+"""
+Helpers for native async views that spend their time on outbound I/O.
+
+DRF's ``@api_view`` runs views synchronously, so endpoints that mostly wait on
+upstream services are written as plain Django async views and use these
+helpers for JWT authentication and JSON bodies.
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+def async_jwt_required(view_func):
+    """
+    Async counterpart of ``@permission_classes([IsAuthenticated])`` for JWT clients.
+
+    Sets ``request.user`` and ``request.auth``; responds 401 like DRF otherwise.
+    """
+    @csrf_exempt
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({'detail': str(e.detail)}, status=401)
+
+        if result is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+        request.user, request.auth = result
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def json_body(request):
+    """Request body parsed as a JSON object (``{}`` if empty or malformed)."""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
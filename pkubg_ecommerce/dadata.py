@@ -0,0 +1,244 @@
+"""
+Dadata address suggestions with caching and request coalescing.
+
+Lookups go through three layers:
+
+1. an in-process LRU (sub-millisecond hits for repeated queries);
+2. the shared cache backend, so every worker benefits from every answer;
+3. Dadata itself, through the shared HTTP client (see ``http_client``).
+
+Queries are normalized (case, ``ё``, whitespace) before they become cache
+keys. A cached answer for a shorter prefix that returned fewer than
+``SUGGEST_COUNT`` suggestions is complete, so a longer query is answered by
+narrowing it instead of calling Dadata again.
+
+Identical concurrent misses are coalesced: within an event loop they await
+one future, across workers (and across the threads of a WSGI worker, each
+with its own loop) a short cache lock lets one request call Dadata while the
+others wait for its result to appear in the cache. If the request that owns
+the call is cancelled, its waiters retry on their own.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .http_client import outbound_client
+
+SUGGEST_COUNT = 5
+MIN_QUERY_LENGTH = 3
+# Сколько ждать ответа, который уже запрашивает другой воркер
+COALESCE_WAIT = 3.0
+COALESCE_POLL_INTERVAL = 0.05
+
+_inflight = weakref.WeakKeyDictionary()
+
+
+class DadataError(Exception):
+    """Dadata is not configured or answered with an error."""
+
+
+class _LRUCache:
+    """Small thread-safe LRU with per-entry expiry."""
+
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        ttl = getattr(settings, 'DADATA_LRU_TTL', 60 * 60)
+        max_size = getattr(settings, 'DADATA_LRU_SIZE', 2048)
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_lru = _LRUCache()
+
+
+def normalize_query(query):
+    """Lower-case, ``ё`` → ``е``, single spaces."""
+    return ' '.join(str(query).lower().replace('ё', 'е').split())
+
+
+def _cache_key(normalized):
+    digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+    return f'dadata:suggest:{digest}'
+
+
+def _lock_key(normalized):
+    return _cache_key(normalized).replace('suggest', 'inflight', 1)
+
+
+def _narrow(suggestions, normalized):
+    """Suggestions of a complete prefix answer that still match the longer query."""
+    tokens = normalized.split()
+    return [
+        suggestion for suggestion in suggestions
+        if all(token in normalize_query(suggestion.get('value', '')) for token in tokens)
+    ]
+
+
+def _prefixes(normalized):
+    """Strictly shorter prefixes, longest first."""
+    return [normalized[:cut] for cut in range(len(normalized) - 1, MIN_QUERY_LENGTH - 1, -1)]
+
+
+async def cached_suggestions(normalized):
+    """Answer from the LRU or the shared cache, or ``None`` on a miss."""
+    suggestions = _lru.get(normalized)
+    if suggestions is not None:
+        return suggestions
+
+    for prefix in _prefixes(normalized):
+        entry = _lru.get(prefix)
+        if entry is not None and len(entry) < SUGGEST_COUNT:
+            suggestions = _narrow(entry, normalized)
+            _lru.set(normalized, suggestions)
+            return suggestions
+
+    # Точный запрос и все префиксы — одним обращением к кэшу
+    candidates = [normalized] + _prefixes(normalized)
+    found = await cache.aget_many([_cache_key(candidate) for candidate in candidates])
+
+    exact = found.get(_cache_key(normalized))
+    if exact is not None:
+        _lru.set(normalized, exact)
+        return exact
+
+    for prefix in candidates[1:]:
+        entry = found.get(_cache_key(prefix))
+        if entry is not None and len(entry) < SUGGEST_COUNT:
+            suggestions = _narrow(entry, normalized)
+            _lru.set(normalized, suggestions)
+            return suggestions
+
+    return None
+
+
+async def _request_dadata(normalized):
+    api_key = getattr(settings, 'DADATA_API_KEY', None)
+    if not api_key:
+        raise DadataError('Dadata API key not configured')
+
+    async with outbound_client() as client:
+        response = await client.post(
+            settings.DADATA_SUGGEST_URL,
+            headers={
+                'Content-Type': 'application/json',
+                'Accept': 'application/json',
+                'Authorization': f'Token {api_key}'
+            },
+            json={
+                'query': normalized,
+                'count': SUGGEST_COUNT,
+                'locations': [{'country': '*'}]
+            },
+            timeout=getattr(settings, 'DADATA_TIMEOUT', 3)
+        )
+
+    if response.status_code != 200:
+        raise DadataError(f'Dadata API error: {response.status_code}')
+    return response.json().get('suggestions', [])
+
+
+async def _fetch_and_store(normalized):
+    suggestions = await _request_dadata(normalized)
+    await cache.aset(_cache_key(normalized), suggestions, getattr(settings, 'DADATA_CACHE_TTL', 24 * 60 * 60))
+    _lru.set(normalized, suggestions)
+    return suggestions
+
+
+async def _fetch_across_workers(normalized):
+    lock_key = _lock_key(normalized)
+    if await cache.aadd(lock_key, 1, timeout=int(COALESCE_WAIT) + 1):
+        try:
+            return await _fetch_and_store(normalized)
+        finally:
+            await cache.adelete(lock_key)
+
+    # Этот запрос уже выполняет другой воркер — ждём его ответ в кэше
+    deadline = time.monotonic() + COALESCE_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(COALESCE_POLL_INTERVAL)
+        suggestions = await cache.aget(_cache_key(normalized))
+        if suggestions is not None:
+            _lru.set(normalized, suggestions)
+            return suggestions
+        if await cache.aget(lock_key) is None:
+            break
+    return await _fetch_and_store(normalized)
+
+
+async def fetch_suggestions(normalized):
+    """Ask Dadata, sharing one upstream call between identical concurrent queries."""
+    loop = asyncio.get_running_loop()
+    inflight = _inflight.setdefault(loop, {})
+
+    future = inflight.get(normalized)
+    if future is not None:
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # Отменён сам ожидающий — пробрасываем; отменён владелец — запрашиваем сами
+            if not future.cancelled():
+                raise
+            return await fetch_suggestions(normalized)
+
+    future = loop.create_future()
+    inflight[normalized] = future
+    try:
+        suggestions = await _fetch_across_workers(normalized)
+    except Exception as e:
+        future.set_exception(e)
+        # Ошибку получат ожидающие; без них не шумим в лог
+        future.exception()
+        raise
+    else:
+        future.set_result(suggestions)
+        return suggestions
+    finally:
+        inflight.pop(normalized, None)
+        # Запрос отменён (клиент ушёл) — ожидающие не должны висеть на future
+        if not future.done():
+            future.cancel()
+
+
+async def allow_user_request(user_id):
+    """Per-user burst limit for requests that reach Dadata."""
+    window = getattr(settings, 'DADATA_BURST_WINDOW', 5)
+    limit = getattr(settings, 'DADATA_BURST_LIMIT', 10)
+    key = f'dadata:burst:{user_id}'
+
+    if await cache.aadd(key, 1, timeout=window):
+        return True
+    try:
+        count = await cache.aincr(key)
+    except ValueError:
+        # Окно истекло между add и incr
+        await cache.aset(key, 1, timeout=window)
+        return True
+    return count <= limit
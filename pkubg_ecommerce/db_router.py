@@ -0,0 +1,136 @@
+"""
+Read replica routing for analytics and reporting.
+
+Code that can live with slightly stale data opts in with ``replica_reads``
+(decorator or context manager): analytics endpoints, admin order statistics
+and the sitemap. Everything else, every write and ``select_for_update`` stay
+on ``default``. Opted-in reads still go to ``default`` when:
+
+* no ``replica`` database is configured (``DB_REPLICA_HOST``);
+* the current request has already written, or the client wrote less than
+  ``REPLICA_STICKY_SECONDS`` ago (read-your-writes, tracked with a cookie by
+  ``ReplicaStickinessMiddleware``);
+* the replica is more than ``REPLICA_MAX_LAG`` seconds behind (checked at
+  most every ``REPLICA_LAG_CHECK_INTERVAL`` seconds, result shared via cache).
+"""
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+STICKY_COOKIE = 'db_primary_until'
+LAG_CACHE_KEY = 'db:replica-lag'
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+# Запрос пришёл от клиента, который недавно писал
+_sticky = contextvars.ContextVar('replica_sticky', default=False)
+# В текущем запросе уже была запись
+_wrote = contextvars.ContextVar('replica_wrote', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in connections.settings
+
+
+@contextmanager
+def replica_reads():
+    """Route reads inside the block (or the decorated function) to the replica when possible."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def _measure_lag():
+    connection = connections[REPLICA_ALIAS]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            # Всё полученное применено — отставания нет, даже если мастер давно не писал
+            cursor.execute(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+            )
+            return float(cursor.fetchone()[0] or 0)
+    except DatabaseError:
+        logger.warning('Replica lag check failed, reading from primary', exc_info=True)
+        return float('inf')
+
+
+def replica_lag_ok():
+    max_lag = getattr(settings, 'REPLICA_MAX_LAG', 10)
+    if not max_lag:
+        return True
+    lag = cache.get(LAG_CACHE_KEY)
+    if lag is None:
+        lag = _measure_lag()
+        cache.set(LAG_CACHE_KEY, lag, getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5))
+    return lag <= max_lag
+
+
+def read_alias():
+    """Alias opted-in reads should use right now."""
+    if not replica_configured() or _sticky.get() or _wrote.get():
+        return DEFAULT_DB_ALIAS
+    return REPLICA_ALIAS if replica_lag_ok() else DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """Sends opted-in reads to ``replica``; writes and migrations go to ``default``."""
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get():
+            return read_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        # Явно: объект, прочитанный с реплики, сохраняется в основную БД
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, REPLICA_ALIAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_ALIAS:
+            return False
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """Read-your-writes: after a write, the client reads from primary for ``REPLICA_STICKY_SECONDS``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            primary_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            primary_until = 0
+        sticky_token = _sticky.set(primary_until > time.time())
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() and replica_configured():
+                seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+                response.set_cookie(
+                    STICKY_COOKIE, str(time.time() + seconds),
+                    max_age=seconds, httponly=True, samesite='Lax'
+                )
+            return response
+        finally:
+            _sticky.reset(sticky_token)
+            _wrote.reset(wrote_token)
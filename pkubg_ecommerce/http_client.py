@@ -0,0 +1,90 @@
+"""
+Shared HTTP client for outbound calls (Dadata, VK, uptime checks).
+
+Under the ASGI profile (``SERVER_PROFILE=asgi``) every worker runs one
+long-lived event loop, so one ``httpx.AsyncClient`` per loop is kept and its
+connection pool is reused across requests. Elsewhere (WSGI gthread workers,
+management commands) each ``async_to_sync`` call gets a fresh loop, so a
+per-loop client would open new connections (and TLS handshakes) on every
+call. There the callers get an async facade over one process-wide
+``httpx.Client``, which is thread-safe and keeps its connections alive
+between requests; each call runs in a worker thread.
+"""
+import asyncio
+import threading
+import weakref
+from contextlib import asynccontextmanager
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+_clients = weakref.WeakKeyDictionary()
+_sync_client = None
+_sync_client_lock = threading.Lock()
+
+
+def _client_options():
+    return {
+        'timeout': httpx.Timeout(
+            getattr(settings, 'OUTBOUND_HTTP_TIMEOUT', 10),
+            connect=getattr(settings, 'OUTBOUND_HTTP_CONNECT_TIMEOUT', 3),
+        ),
+        'limits': httpx.Limits(
+            max_connections=getattr(settings, 'OUTBOUND_HTTP_MAX_CONNECTIONS', 100),
+            max_keepalive_connections=20,
+        ),
+        'headers': {'User-Agent': 'pkubg-ecommerce'},
+    }
+
+
+def _shared_clients_enabled():
+    return getattr(settings, 'SERVER_PROFILE', 'wsgi') == 'asgi'
+
+
+def get_async_client():
+    """The shared client of the running event loop (ASGI profile only)."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(**_client_options())
+        _clients[loop] = client
+    return client
+
+
+def get_sync_client():
+    """The process-wide client for WSGI workers and management commands."""
+    global _sync_client
+    with _sync_client_lock:
+        if _sync_client is None or _sync_client.is_closed:
+            _sync_client = httpx.Client(**_client_options())
+        return _sync_client
+
+
+class ThreadedClient:
+    """``get``/``post`` of a sync ``httpx.Client``, awaited from a worker thread."""
+
+    def __init__(self, client):
+        self._client = client
+
+    async def request(self, method, url, **kwargs):
+        # Не в общем потоке sync_to_async — параллельные запросы (gather) не встают в очередь
+        return await sync_to_async(self._client.request, thread_sensitive=False)(method, url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+
+@asynccontextmanager
+async def outbound_client():
+    """
+    ``async with outbound_client() as client:`` — the loop's shared client
+    under ASGI, the process-wide one otherwise.
+    """
+    if _shared_clients_enabled():
+        yield get_async_client()
+    else:
+        yield ThreadedClient(get_sync_client())
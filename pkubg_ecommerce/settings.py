@@ -4,6 +4,7 @@ Django settings for pkubg_ecommerce project.
 
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 from datetime import timedelta
 
 # Patch for DRF format suffix converter issue with Django 5.x
@@ -71,6 +72,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'monitoring.metrics.MetricsMiddleware',
+    'pkubg_ecommerce.db_router.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'pkubg_ecommerce.urls'
@@ -114,6 +116,69 @@ if not DEBUG or config('USE_POSTGRES', default=False, cast=bool):
         }
     }
 
+    # Соединения с БД:
+    #   none       — новое соединение на каждый запрос
+    #   persistent — соединение живёт DB_CONN_MAX_AGE секунд, проверяется перед использованием
+    #   pool       — пул psycopg 3 в каждом воркере gunicorn (Django проверяет соединение при выдаче)
+    DB_POOL_MODE = config('DB_POOL_MODE', default='persistent')
+    # Потоков в воркере gunicorn — столько соединений воркеру может понадобиться одновременно
+    GUNICORN_THREADS = config('GUNICORN_THREADS', default=4, cast=int)
+
+    if DB_POOL_MODE == 'persistent':
+        DATABASES['default']['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=60, cast=int)
+        DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    elif DB_POOL_MODE == 'pool':
+        # Всего соединений: воркеры × DB_POOL_MAX_SIZE — держать ниже max_connections PostgreSQL.
+        # Сверх GUNICORN_THREADS соединения идут на параллельный расчёт виджетов дашборда
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': config('DB_POOL_MIN_SIZE', default=1, cast=int),
+                'max_size': config('DB_POOL_MAX_SIZE', default=GUNICORN_THREADS, cast=int),
+                'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+                'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+            }
+        }
+    elif DB_POOL_MODE != 'none':
+        raise ImproperlyConfigured(
+            f"DB_POOL_MODE must be 'none', 'persistent' or 'pool', got {DB_POOL_MODE!r}"
+        )
+
+# Реплика для чтения аналитики, отчётов и sitemap (см. pkubg_ecommerce/db_router.py);
+# без DB_REPLICA_HOST всё читается из основной БД
+DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+if DB_REPLICA_HOST and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': DB_REPLICA_HOST,
+        'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'OPTIONS': dict(DATABASES['default'].get('OPTIONS', {})),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['pkubg_ecommerce.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)  # чтение из основной после записи
+REPLICA_MAX_LAG = config('REPLICA_MAX_LAG', default=10, cast=float)  # секунды; 0 — не проверять
+REPLICA_LAG_CHECK_INTERVAL = config('REPLICA_LAG_CHECK_INTERVAL', default=5, cast=int)  # секунды
+
+# Cache
+# Общий кэш нужен всем воркерам gunicorn; без REDIS_URL — локальный кэш процесса
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'pkubg',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'pkubg-default',
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -183,6 +248,53 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Заголовки Idempotency-Key (оформление заказа и оплата) и X-Cart-Token (гостевая корзина)
+from corsheaders.defaults import default_headers
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key', 'x-cart-token')
+CORS_EXPOSE_HEADERS = ['x-cart-token', 'x-cart-token-clear']
+
+# Idempotency Settings
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)  # секунды
+IDEMPOTENCY_WAIT_TIMEOUT = config('IDEMPOTENCY_WAIT_TIMEOUT', default=10, cast=int)  # секунды
+# Через сколько секунд незавершённую обработку считать брошенной — больше timeout воркера gunicorn
+IDEMPOTENCY_PROCESSING_TIMEOUT = config('IDEMPOTENCY_PROCESSING_TIMEOUT', default=5 * 60, cast=int)
+
+# Cart cache Settings
+CART_CACHE_TTL = config('CART_CACHE_TTL', default=300, cast=int)  # секунды
+GUEST_CART_TTL = config('GUEST_CART_TTL', default=7 * 24 * 60 * 60, cast=int)  # секунды
+STOCK_CACHE_TTL = config('STOCK_CACHE_TTL', default=10, cast=int)  # кэш остатков, секунды
+GUEST_RESERVATION_TTL = config('GUEST_RESERVATION_TTL', default=15 * 60, cast=int)  # мягкий резерв, секунды
+CART_SYNC_MAX_LINES = config('CART_SYNC_MAX_LINES', default=100, cast=int)  # позиций в одной синхронизации
+
+# Analytics Settings
+CART_ABANDONED_AFTER_HOURS = config('CART_ABANDONED_AFTER_HOURS', default=1, cast=int)  # корзина брошена, часы
+CART_STATS_CACHE_TTL = config('CART_STATS_CACHE_TTL', default=60, cast=int)  # живая статистика, секунды
+COHORT_CACHE_TTL = config('COHORT_CACHE_TTL', default=60 * 60, cast=int)  # когорты, секунды
+# Пересчёт дня агрегатов продаж прямо после записи — не чаще раза за окно, остальное досчитает cron
+ROLLUP_REFRESH_DEBOUNCE = config('ROLLUP_REFRESH_DEBOUNCE', default=60, cast=int)  # секунды
+REVENUE_SERIES_CACHE_TTL = config('REVENUE_SERIES_CACHE_TTL', default=24 * 60 * 60, cast=int)  # интервал ряда, секунды
+# Потоков на расчёт виджетов дашборда — каждый берёт своё соединение с БД.
+# При DB_POOL_MODE=pool не больше DB_POOL_MAX_SIZE - GUNICORN_THREADS (минимум 1 — последовательно):
+# чтобы считать виджеты параллельно, поднимите DB_POOL_MAX_SIZE выше GUNICORN_THREADS
+DASHBOARD_WIDGET_WORKERS = config('DASHBOARD_WIDGET_WORKERS', default=4, cast=int)
+# Поток событий дашборда (SSE, только под ASGI); шина между воркерами — кэш
+EVENT_STREAM_RETENTION = config('EVENT_STREAM_RETENTION', default=5 * 60, cast=int)  # событие в кэше, секунды
+EVENT_STREAM_POLL_INTERVAL = config('EVENT_STREAM_POLL_INTERVAL', default=1.0, cast=float)  # опрос шины, секунды
+EVENT_STREAM_HEARTBEAT = config('EVENT_STREAM_HEARTBEAT', default=15, cast=float)  # секунды
+EVENT_STREAM_MAX_SECONDS = config('EVENT_STREAM_MAX_SECONDS', default=10 * 60, cast=float)  # потом переподключение
+EVENT_STREAM_QUEUE_SIZE = config('EVENT_STREAM_QUEUE_SIZE', default=100, cast=int)  # событий на вкладку
+INVENTORY_VELOCITY_DAYS = config('INVENTORY_VELOCITY_DAYS', default=28, cast=int)  # окно скорости продаж, дни
+INVENTORY_LEAD_TIME_DAYS = config('INVENTORY_LEAD_TIME_DAYS', default=7, cast=int)  # срок поставки, дни
+INVENTORY_SAFETY_DAYS = config('INVENTORY_SAFETY_DAYS', default=3, cast=int)  # страховой запас, дни
+INVENTORY_TARGET_COVER_DAYS = config('INVENTORY_TARGET_COVER_DAYS', default=30, cast=int)  # запас после дозаказа, дни
+
+# Recommendations Settings («с этим товаром покупают»)
+AFFINITY_TOP_N = config('AFFINITY_TOP_N', default=10, cast=int)  # связанных товаров хранится на товар
+AFFINITY_MIN_CO_ORDERS = config('AFFINITY_MIN_CO_ORDERS', default=2, cast=int)  # минимум совместных заказов
+AFFINITY_ORDER_LAG = config('AFFINITY_ORDER_LAG', default=10, cast=int)  # свежие заказы ждут, минуты
+RELATED_PRODUCTS_LIMIT = config('RELATED_PRODUCTS_LIMIT', default=8, cast=int)
+RELATED_PRODUCTS_CACHE_TTL = config('RELATED_PRODUCTS_CACHE_TTL', default=60 * 60, cast=int)  # секунды
+
 # YooKassa Settings (deprecated, use RoboKassa)
 YOOKASSA_SHOP_ID = config('YOOKASSA_SHOP_ID', default='test_shop_id')
 YOOKASSA_SECRET_KEY = config('YOOKASSA_SECRET_KEY', default='test_secret_key')
@@ -196,6 +308,24 @@ ROBOKASSA_TEST_MODE = config('ROBOKASSA_TEST_MODE', default=True, cast=bool)
 
 # Dadata Settings
 DADATA_API_KEY = config('DADATA_API_KEY', default='')
+DADATA_SUGGEST_URL = config(
+    'DADATA_SUGGEST_URL',
+    default='https://suggestions.dadata.ru/suggestions/api/4_1/rs/suggest/address'
+)
+DADATA_TIMEOUT = config('DADATA_TIMEOUT', default=3, cast=float)
+# Кэш подсказок: общий (Redis) и LRU внутри воркера
+DADATA_CACHE_TTL = config('DADATA_CACHE_TTL', default=24 * 60 * 60, cast=int)
+DADATA_LRU_SIZE = config('DADATA_LRU_SIZE', default=2048, cast=int)
+DADATA_LRU_TTL = config('DADATA_LRU_TTL', default=60 * 60, cast=int)
+# Не больше DADATA_BURST_LIMIT запросов к Dadata от пользователя за DADATA_BURST_WINDOW секунд
+DADATA_BURST_LIMIT = config('DADATA_BURST_LIMIT', default=10, cast=int)
+DADATA_BURST_WINDOW = config('DADATA_BURST_WINDOW', default=5, cast=int)
+
+# Outbound HTTP (Dadata, VK, uptime checks)
+# wsgi — gunicorn gthread; asgi — gunicorn + uvicorn workers, общий httpx-клиент на воркер
+SERVER_PROFILE = config('SERVER_PROFILE', default='wsgi')
+OUTBOUND_HTTP_TIMEOUT = config('OUTBOUND_HTTP_TIMEOUT', default=10, cast=float)
+OUTBOUND_HTTP_CONNECT_TIMEOUT = config('OUTBOUND_HTTP_CONNECT_TIMEOUT', default=3, cast=float)
 
 # Logging configuration
 LOGGING = {
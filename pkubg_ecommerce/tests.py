@@ -0,0 +1,319 @@
+"""
+Tests for project-level modules: async view helpers and Dadata suggestions.
+"""
+import asyncio
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+
+User = get_user_model()
+
+
+def _suggestions(*values):
+    return [{'value': value} for value in values]
+
+
+class TestAsyncViewHelpers(TestCase):
+    """Test JWT authentication and JSON parsing for native async views."""
+
+    def test_json_body(self):
+        """Test that only a JSON object is returned, anything else is ``{}``."""
+        from django.test import RequestFactory
+        from .async_views import json_body
+
+        factory = RequestFactory()
+
+        def body(data):
+            return json_body(factory.post('/', data, content_type='application/json'))
+
+        self.assertEqual(body('{"query": "Москва"}'), {'query': 'Москва'})
+        self.assertEqual(body(''), {})
+        self.assertEqual(body('not json'), {})
+        self.assertEqual(body('["Москва"]'), {})
+
+    async def test_async_jwt_required(self):
+        """Test 401 without or with a bad token, and ``request.user`` with a valid one."""
+        from asgiref.sync import sync_to_async
+        from django.http import JsonResponse
+        from django.test import AsyncRequestFactory
+        from rest_framework_simplejwt.tokens import AccessToken
+        from .async_views import async_jwt_required
+
+        @async_jwt_required
+        async def view(request):
+            return JsonResponse({'email': request.user.email})
+
+        user = await sync_to_async(User.objects.create_user)(
+            username='buyer', email='buyer@test.com', password='testpass123'
+        )
+        token = await sync_to_async(AccessToken.for_user)(user)
+        factory = AsyncRequestFactory()
+
+        response = await view(factory.get('/'))
+        self.assertEqual(response.status_code, 401)
+
+        response = await view(factory.get('/', headers={'Authorization': 'Bearer broken'}))
+        self.assertEqual(response.status_code, 401)
+
+        response = await view(factory.get('/', headers={'Authorization': f'Bearer {token}'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertJSONEqual(response.content, {'email': 'buyer@test.com'})
+
+
+class TestOutboundClient(TestCase):
+    """Test that WSGI workers reuse one pooled client across requests."""
+
+    def setUp(self):
+        from . import http_client
+        patcher = mock.patch.object(http_client, '_sync_client', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(SERVER_PROFILE='wsgi')
+    def test_sync_workers_share_one_client(self):
+        """Test that calls from separate event loops go through the same connection pool."""
+        import httpx
+        from . import http_client
+
+        seen = []
+        pooled = httpx.Client(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, json={'path': request.url.path})
+        ))
+        self.addCleanup(pooled.close)
+        http_client._sync_client = pooled
+
+        async def call(path):
+            async with http_client.outbound_client() as client:
+                seen.append(client._client)
+                response = await client.post(f'https://example.com{path}', json={})
+                return response.json()
+
+        # Каждый async_to_sync под WSGI — новый цикл событий
+        self.assertEqual(async_to_sync(call)('/a'), {'path': '/a'})
+        self.assertEqual(async_to_sync(call)('/b'), {'path': '/b'})
+        self.assertEqual(seen, [pooled, pooled])
+        self.assertIs(http_client.get_sync_client(), pooled)
+
+
+class TestAddressSuggestionsView(TestCase):
+    """Test the async address suggestions endpoint."""
+
+    URL = '/api/address-suggestions/'
+
+    def setUp(self):
+        """Start with an empty in-process LRU and shared cache."""
+        from .dadata import _lru
+        # Закэшированный ответ из другого теста обошёл бы подменённый запрос к Dadata
+        for clear in (_lru.clear, cache.clear):
+            clear()
+            self.addCleanup(clear)
+
+    async def _token(self):
+        from asgiref.sync import sync_to_async
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        user = await sync_to_async(User.objects.create_user)(
+            username='buyer', email='buyer@test.com', password='testpass123'
+        )
+        return await sync_to_async(AccessToken.for_user)(user)
+
+    async def test_requires_authentication(self):
+        """Test that anonymous requests get 401."""
+        response = await AsyncClient().post(self.URL, {'query': 'Москва'}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_only_post_is_allowed(self):
+        """Test that GET gets 405."""
+        token = await self._token()
+        response = await AsyncClient().get(self.URL, headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 405)
+
+    @override_settings(DADATA_API_KEY='test')
+    async def test_returns_suggestions(self):
+        """Test 200 with Dadata suggestions, and no upstream call for short queries."""
+        from . import dadata
+
+        token = await self._token()
+        client = AsyncClient()
+        fetch = mock.AsyncMock(return_value=_suggestions('г Москва'))
+
+        with mock.patch.object(dadata, '_request_dadata', fetch):
+            response = await client.post(
+                self.URL, {'query': '  Москва '}, content_type='application/json',
+                headers={'Authorization': f'Bearer {token}'}
+            )
+            short = await client.post(
+                self.URL, {'query': 'Мо'}, content_type='application/json',
+                headers={'Authorization': f'Bearer {token}'}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertJSONEqual(response.content, {'suggestions': _suggestions('г Москва')})
+        fetch.assert_awaited_once_with('москва')
+        self.assertEqual(short.status_code, 200)
+        self.assertJSONEqual(short.content, {'suggestions': []})
+
+
+class TestDadataSuggestions(TestCase):
+    """Test the suggestion caches, request coalescing and the burst limit."""
+
+    def setUp(self):
+        """Start with an empty in-process LRU and shared cache."""
+        from .dadata import _lru
+        # Закэшированный ответ из другого теста обошёл бы подменённый запрос к Dadata
+        for clear in (_lru.clear, cache.clear):
+            clear()
+            self.addCleanup(clear)
+
+    @override_settings(DADATA_LRU_SIZE=2)
+    def test_lru_evicts_least_recently_used(self):
+        """Test that the LRU keeps the most recently used entries."""
+        from .dadata import _LRUCache
+
+        lru = _LRUCache()
+        lru.set('a', 1)
+        lru.set('b', 2)
+        self.assertEqual(lru.get('a'), 1)
+        lru.set('c', 3)
+
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.get('c'), 3)
+
+    @override_settings(DADATA_LRU_TTL=-1)
+    def test_lru_entries_expire(self):
+        """Test that expired LRU entries are dropped."""
+        from .dadata import _LRUCache
+
+        lru = _LRUCache()
+        lru.set('a', 1)
+        self.assertIsNone(lru.get('a'))
+
+    def test_complete_prefix_answer_is_narrowed(self):
+        """Test that a longer query is answered from a complete prefix answer."""
+        from .dadata import _cache_key, cached_suggestions
+
+        cache.set(_cache_key('москва, твер'), _suggestions('г Москва, ул Тверская', 'г Москва, Тверской б-р'))
+
+        self.assertEqual(
+            async_to_sync(cached_suggestions)('москва, тверская'),
+            _suggestions('г Москва, ул Тверская')
+        )
+        # Узкий ответ сохранён в LRU
+        cache.clear()
+        self.assertEqual(
+            async_to_sync(cached_suggestions)('москва, тверская'),
+            _suggestions('г Москва, ул Тверская')
+        )
+
+    def test_full_prefix_answer_is_not_narrowed(self):
+        """Test that a prefix answer cut at SUGGEST_COUNT is not trusted."""
+        from .dadata import SUGGEST_COUNT, _cache_key, cached_suggestions
+
+        cache.set(_cache_key('москва'), _suggestions(*[f'г Москва, ул {n}' for n in range(SUGGEST_COUNT)]))
+
+        self.assertIsNone(async_to_sync(cached_suggestions)('москва, тверская'))
+
+    def test_concurrent_queries_share_one_upstream_call(self):
+        """Test that identical concurrent misses in one worker call Dadata once."""
+        from . import dadata
+
+        async def slow_request(normalized):
+            await asyncio.sleep(0.05)
+            return _suggestions('г Москва')
+
+        async def run():
+            return await asyncio.gather(*[dadata.fetch_suggestions('москва') for _ in range(3)])
+
+        with mock.patch.object(dadata, '_request_dadata', side_effect=slow_request) as request:
+            results = async_to_sync(run)()
+
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(results, [_suggestions('г Москва')] * 3)
+
+    def test_waits_for_answer_fetched_by_another_worker(self):
+        """Test that a query locked by another worker is read from the shared cache."""
+        from . import dadata
+
+        async def run():
+            # Другой воркер держит блокировку и через 0.1 с кладёт ответ в кэш
+            await cache.aset(dadata._lock_key('москва'), 1)
+
+            async def other_worker():
+                await asyncio.sleep(0.1)
+                await cache.aset(dadata._cache_key('москва'), _suggestions('г Москва'))
+
+            results = await asyncio.gather(dadata.fetch_suggestions('москва'), other_worker())
+            return results[0]
+
+        with mock.patch.object(dadata, '_request_dadata') as request:
+            self.assertEqual(async_to_sync(run)(), _suggestions('г Москва'))
+        request.assert_not_called()
+
+    def test_cancelled_owner_does_not_hang_waiters(self):
+        """Test that waiters retry when the request that owns the upstream call is cancelled."""
+        from . import dadata
+
+        calls = []
+
+        async def request(normalized):
+            calls.append(normalized)
+            if len(calls) == 1:
+                await asyncio.sleep(10)
+            return _suggestions('г Москва')
+
+        async def run():
+            owner = asyncio.create_task(dadata.fetch_suggestions('москва'))
+            await asyncio.sleep(0.01)
+            waiter = asyncio.create_task(dadata.fetch_suggestions('москва'))
+            await asyncio.sleep(0.01)
+            owner.cancel()
+            return await asyncio.wait_for(waiter, timeout=2)
+
+        with mock.patch.object(dadata, '_request_dadata', side_effect=request):
+            self.assertEqual(async_to_sync(run)(), _suggestions('г Москва'))
+        self.assertEqual(len(calls), 2)
+
+    @override_settings(DADATA_BURST_LIMIT=2, DADATA_BURST_WINDOW=5)
+    def test_burst_limit_per_user(self):
+        """Test that only DADATA_BURST_LIMIT upstream requests per window are allowed."""
+        from .dadata import allow_user_request
+
+        allowed = [async_to_sync(allow_user_request)(1) for _ in range(3)]
+
+        self.assertEqual(allowed, [True, True, False])
+        self.assertTrue(async_to_sync(allow_user_request)(2))
+
+    @override_settings(DADATA_API_KEY='test', DADATA_BURST_LIMIT=1, DADATA_BURST_WINDOW=5)
+    async def test_view_answers_429_over_burst_limit(self):
+        """Test that cache misses over the burst limit get 429, cache hits do not."""
+        from asgiref.sync import sync_to_async
+        from rest_framework_simplejwt.tokens import AccessToken
+        from . import dadata
+
+        user = await sync_to_async(User.objects.create_user)(
+            username='buyer', email='buyer@test.com', password='testpass123'
+        )
+        token = await sync_to_async(AccessToken.for_user)(user)
+        client = AsyncClient()
+
+        async def post(query):
+            return await client.post(
+                '/api/address-suggestions/', {'query': query}, content_type='application/json',
+                headers={'Authorization': f'Bearer {token}'}
+            )
+
+        fetch = mock.AsyncMock(return_value=_suggestions('г Москва', 'г Москворецк'))
+        with mock.patch.object(dadata, '_request_dadata', fetch):
+            first = await post('Москва')
+            limited = await post('Самара')
+            cached = await post('МОСКВА')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(limited.status_code, 429)
+        self.assertEqual(limited['Retry-After'], '5')
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(fetch.await_count, 1)
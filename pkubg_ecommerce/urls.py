@@ -11,6 +11,7 @@ from django.views.decorators.http import require_POST
 import json
 import logging
 from .address_suggestions import get_address_suggestions
+from .db_router import replica_reads
 
 logger = logging.getLogger(__name__)
 
@@ -62,6 +63,7 @@ Sitemap: https://pkubg.ru/sitemap.xml
     return HttpResponse(content.strip(), content_type='text/plain')
 
 
+@replica_reads()
 def sitemap_xml(request):
     """Карта сайта для поисковиков."""
     from products.models import Product
@@ -0,0 +1,251 @@
+"""
+"Frequently bought together" recommendations.
+
+``update_affinity`` (run by ``build_product_affinity``) folds order lines
+into a sparse co-occurrence matrix (``ProductPairCount``) and keeps the
+top-N related products per product in ``ProductAffinity``:
+
+* confidence = co_orders / orders(product)
+* lift       = co_orders * total_orders / (orders(product) * orders(related))
+
+The build is incremental: only orders past the stored watermark are counted,
+and only the products they touch get their top-N recomputed. Orders younger
+than ``AFFINITY_ORDER_LAG`` minutes are left for the next run so that
+transactions still in flight are not skipped. ``rebuild=True`` starts over.
+
+``related_product_ids`` serves the endpoint from cache, topping up with
+same-category / same-dietary-flag products when there is not enough history.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import combinations
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Q, Value, When
+from django.utils import timezone
+
+from .models import AffinityBuildState, Product, ProductAffinity, ProductPairCount
+
+DIETARY_FLAGS = ('is_gluten_free', 'is_low_protein', 'is_lactose_free', 'is_egg_free')
+
+# Размер пачки id в IN (...) и пачки заказов за один проход
+CHUNK_SIZE = 500
+
+
+def _related_cache_key(product_id):
+    return f'products:related:{product_id}'
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def count_baskets(baskets):
+    """Sparse upper-triangle co-occurrence counts (diagonal = single-product support)."""
+    counts = Counter()
+    for basket in baskets:
+        items = sorted(basket)
+        counts.update((product_id, product_id) for product_id in items)
+        counts.update(combinations(items, 2))
+    return counts
+
+
+def _merge_counts(counts):
+    """Add ``counts`` to ``ProductPairCount`` with one read, one bulk update and one bulk insert per chunk."""
+    by_a = defaultdict(dict)
+    for (a, b), value in counts.items():
+        by_a[a][b] = value
+
+    for product_ids in _chunks(by_a):
+        existing = {
+            (pair.product_a_id, pair.product_b_id): pair
+            for pair in ProductPairCount.objects.filter(product_a_id__in=product_ids)
+        }
+        to_update, to_create = [], []
+        for a in product_ids:
+            for b, value in by_a[a].items():
+                pair = existing.get((a, b))
+                if pair is None:
+                    to_create.append(ProductPairCount(product_a_id=a, product_b_id=b, orders=value))
+                else:
+                    pair.orders += value
+                    to_update.append(pair)
+        ProductPairCount.objects.bulk_update(to_update, ['orders'])
+        ProductPairCount.objects.bulk_create(to_create)
+
+
+def _recompute_top(product_ids, total_orders):
+    """Rebuild ``ProductAffinity`` rows of ``product_ids`` from the pair counts."""
+    top_n = getattr(settings, 'AFFINITY_TOP_N', 10)
+    min_co_orders = getattr(settings, 'AFFINITY_MIN_CO_ORDERS', 2)
+
+    for chunk in _chunks(product_ids):
+        chunk_set = set(chunk)
+        support = {}
+        partners = defaultdict(dict)
+        pairs = ProductPairCount.objects.filter(
+            Q(product_a_id__in=chunk) | Q(product_b_id__in=chunk)
+        ).values_list('product_a_id', 'product_b_id', 'orders')
+        for a, b, value in pairs:
+            if a == b:
+                support[a] = value
+                continue
+            if value < min_co_orders:
+                continue
+            if a in chunk_set:
+                partners[a][b] = value
+            if b in chunk_set:
+                partners[b][a] = value
+
+        missing = {q for scores in partners.values() for q in scores} - support.keys()
+        for ids in _chunks(missing):
+            support.update(
+                ProductPairCount.objects.filter(
+                    product_a_id__in=ids, product_b_id__in=ids
+                ).filter(product_a_id=F('product_b_id')).values_list('product_a_id', 'orders')
+            )
+
+        rows = []
+        for product_id in chunk:
+            own = support.get(product_id)
+            if not own:
+                continue
+            scored = []
+            for related_id, co_orders in partners[product_id].items():
+                other = support.get(related_id)
+                if not other:
+                    continue
+                scored.append((
+                    co_orders / own,
+                    co_orders * total_orders / (own * other),
+                    co_orders,
+                    related_id,
+                ))
+            scored.sort(key=lambda row: (-row[0], -row[1], row[3]))
+            for rank, (confidence, lift, co_orders, related_id) in enumerate(scored[:top_n], start=1):
+                rows.append(ProductAffinity(
+                    product_id=product_id,
+                    related_id=related_id,
+                    rank=rank,
+                    co_orders=co_orders,
+                    confidence=round(confidence, 4),
+                    lift=round(lift, 4),
+                ))
+
+        with transaction.atomic():
+            ProductAffinity.objects.filter(product_id__in=chunk).delete()
+            ProductAffinity.objects.bulk_create(rows)
+
+        cache.delete_many([_related_cache_key(product_id) for product_id in chunk])
+
+
+def update_affinity(rebuild=False, now=None):
+    """
+    Count orders past the watermark and refresh the affected top-N lists.
+
+    Returns ``(orders_processed, products_updated)``.
+    """
+    from orders.models import Order, OrderItem
+
+    cutoff = (now or timezone.now()) - timedelta(minutes=getattr(settings, 'AFFINITY_ORDER_LAG', 10))
+
+    with transaction.atomic():
+        state, _ = AffinityBuildState.objects.select_for_update().get_or_create(pk=1)
+        if rebuild:
+            ProductPairCount.objects.all().delete()
+            ProductAffinity.objects.all().delete()
+            state.last_order_id = 0
+            state.total_orders = 0
+
+        touched = set()
+        processed = 0
+        while True:
+            order_ids = list(
+                Order.objects.filter(id__gt=state.last_order_id, created_at__lt=cutoff)
+                .exclude(status='cancelled')
+                .order_by('id')
+                .values_list('id', flat=True)[:CHUNK_SIZE]
+            )
+            if not order_ids:
+                break
+
+            baskets = defaultdict(set)
+            lines = OrderItem.objects.filter(
+                order_id__in=order_ids, product__isnull=False
+            ).values_list('order_id', 'product_id')
+            for order_id, product_id in lines:
+                baskets[order_id].add(product_id)
+
+            counts = count_baskets(baskets.values())
+            _merge_counts(counts)
+            touched.update(a for a, _ in counts)
+
+            processed += len(baskets)
+            state.total_orders += len(baskets)
+            state.last_order_id = order_ids[-1]
+
+        # Отменённые заказы за обработанным диапазоном водяной знак не держат
+        skipped_to = Order.objects.filter(
+            id__gt=state.last_order_id, created_at__lt=cutoff
+        ).aggregate(last=Max('id'))['last']
+        if skipped_to and not Order.objects.filter(
+            id__gt=state.last_order_id, id__lte=skipped_to
+        ).exclude(status='cancelled').exists():
+            state.last_order_id = skipped_to
+        state.save()
+
+        if touched:
+            _recompute_top(sorted(touched), state.total_orders)
+
+    return processed, len(touched)
+
+
+def _fallback_ids(product, exclude_ids, limit):
+    """Active products from the same category and/or with the same dietary flags."""
+    flags = [flag for flag in DIETARY_FLAGS if getattr(product, flag)]
+    condition = Q(category_id=product.category_id)
+    for flag in flags:
+        condition |= Q(**{flag: True})
+
+    # Категория весит больше любого совпадения по флагам
+    score = Case(
+        When(category_id=product.category_id, then=Value(len(DIETARY_FLAGS) + 1)),
+        default=Value(0),
+        output_field=IntegerField()
+    )
+    for flag in flags:
+        score = score + Case(
+            When(**{flag: True}, then=Value(1)), default=Value(0), output_field=IntegerField()
+        )
+
+    return list(
+        Product.objects.filter(condition, is_active=True)
+        .exclude(id__in=[product.id, *exclude_ids])
+        .annotate(affinity_score=score)
+        .order_by('-affinity_score', '-created_at')
+        .values_list('id', flat=True)[:limit]
+    )
+
+
+def related_product_ids(product):
+    """Ids of products to show next to ``product``, best first (cached)."""
+    key = _related_cache_key(product.id)
+    ids = cache.get(key)
+    if ids is not None:
+        return ids
+
+    limit = getattr(settings, 'RELATED_PRODUCTS_LIMIT', 8)
+    ids = list(
+        ProductAffinity.objects.filter(product=product, related__is_active=True)
+        .order_by('rank')
+        .values_list('related_id', flat=True)[:limit]
+    )
+    if len(ids) < limit:
+        ids += _fallback_ids(product, ids, limit - len(ids))
+
+    cache.set(key, ids, getattr(settings, 'RELATED_PRODUCTS_CACHE_TTL', 60 * 60))
+    return ids
@@ -0,0 +1,72 @@
+"""
+Short-TTL cache of product stock availability.
+
+Used as a lock-free read path: product cards and the add-to-cart pre-check read
+``available_quantity`` from here, and only plausible reservations go on to
+lock the product row. Values may be a few seconds stale; the locked path is
+always the source of truth.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _key(product_id):
+    return f'stock:availability:{product_id}'
+
+
+def _get_ttl():
+    return getattr(settings, 'STOCK_CACHE_TTL', 10)
+
+
+def get_availability(product_ids):
+    """
+    Return ``{product_id: (available_quantity, is_active)}`` for existing products.
+
+    Unknown ids are omitted. Misses are loaded with a single query and written
+    back in one ``set_many``.
+    """
+    from .models import Product
+
+    product_ids = {int(product_id) for product_id in product_ids}
+    if not product_ids:
+        return {}
+
+    keys = {_key(product_id): product_id for product_id in product_ids}
+    cached = cache.get_many(keys.keys())
+    result = {keys[key]: value for key, value in cached.items()}
+
+    missing = product_ids - result.keys()
+    if missing:
+        loaded = {}
+        rows = Product.objects.filter(id__in=missing).values_list(
+            'id', 'stock_quantity', 'reserved_quantity', 'is_active'
+        )
+        for product_id, stock_quantity, reserved_quantity, is_active in rows:
+            loaded[product_id] = (max(0, stock_quantity - reserved_quantity), is_active)
+        cache.set_many({_key(product_id): value for product_id, value in loaded.items()}, _get_ttl())
+        result.update(loaded)
+
+    return result
+
+
+def get_available_quantities(product_ids):
+    """``{product_id: available_quantity}``; inactive products are reported as 0."""
+    return {
+        product_id: available if is_active else 0
+        for product_id, (available, is_active) in get_availability(product_ids).items()
+    }
+
+
+def invalidate_availability(product_ids):
+    """
+    Drop cached availability after stock or reservation changes.
+
+    Deleted now and again on commit, so a reader that refilled the cache from
+    the pre-commit state does not keep a stale value for the whole TTL.
+    """
+    keys = [_key(product_id) for product_id in product_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
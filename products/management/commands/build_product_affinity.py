@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from products.affinity import update_affinity
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет рекомендации «с этим товаром покупают» по новым заказам. '
+        'Запускать по расписанию; --rebuild пересчитывает всю историю '
+        '(учитывает отмены уже посчитанных заказов).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Пересчитать с нуля по всей истории заказов',
+        )
+
+    def handle(self, *args, **options):
+        processed, updated = update_affinity(rebuild=options['rebuild'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано заказов: {processed}, обновлено товаров: {updated}')
+        )
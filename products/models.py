@@ -190,4 +190,52 @@ class ProductImage(models.Model):
     is_primary = models.BooleanField(default=False)
     
     def __str__(self):
-        return f"Image for {self.product.name}"
\ No newline at end of file
+        return f"Image for {self.product.name}"
+
+class ProductPairCount(models.Model):
+    """
+    Sparse co-occurrence matrix of order lines: orders containing both products.
+
+    Stored as the upper triangle (``product_a_id <= product_b_id``); the diagonal
+    (``product_a == product_b``) holds the number of orders with the product.
+    """
+    
+    product_a = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    product_b = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    orders = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('product_a', 'product_b')
+    
+    def __str__(self):
+        return f"{self.product_a_id}+{self.product_b_id}: {self.orders}"
+
+
+class ProductAffinity(models.Model):
+    """Top-N "frequently bought together" products with confidence and lift."""
+    
+    product = models.ForeignKey(Product, related_name='affinities', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    rank = models.PositiveSmallIntegerField()
+    co_orders = models.PositiveIntegerField()
+    # P(related | product) и во сколько раз чаще случайного совпадения
+    confidence = models.FloatField()
+    lift = models.FloatField()
+    
+    class Meta:
+        unique_together = ('product', 'related')
+        ordering = ['product', 'rank']
+    
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} (#{self.rank})"
+
+
+class AffinityBuildState(models.Model):
+    """Watermark of the incremental affinity build (single row)."""
+    
+    last_order_id = models.BigIntegerField(default=0)
+    total_orders = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Affinity built up to order {self.last_order_id}"
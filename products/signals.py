@@ -0,0 +1,17 @@
+"""
+Signals for products app.
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Product
+from .availability import invalidate_availability
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_availability(sender, instance, **kwargs):
+    """
+    Drop cached availability whenever a product's stock, reserve or status is saved.
+    """
+    invalidate_availability([instance.pk])
@@ -16,6 +16,175 @@ class TestProductsBasic(TestCase):
         self.assertEqual(app.name, 'products')
 
 
+class TestStockAvailability(TestCase):
+    """Test the cached stock availability read path."""
+    
+    def setUp(self):
+        """Set up test data."""
+        from decimal import Decimal
+        from .models import Category, Product
+        
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.products = [
+            Product.objects.create(
+                name=f'Test Product {i}',
+                slug=f'test-product-{i}',
+                description='Test description',
+                price=Decimal('100.00'),
+                category=category,
+                stock_quantity=i
+            )
+            for i in range(3)
+        ]
+    
+    def test_bulk_availability_served_from_cache(self):
+        """Test that availability for many products costs one query, then none."""
+        from .availability import get_available_quantities
+        
+        ids = [product.id for product in self.products]
+        
+        with self.assertNumQueries(1):
+            first = get_available_quantities(ids)
+        with self.assertNumQueries(0):
+            second = get_available_quantities(ids)
+        
+        self.assertEqual(first, second)
+        self.assertEqual(first, {product.id: i for i, product in enumerate(self.products)})
+    
+    def test_reservation_invalidates_cached_value(self):
+        """Test that reserving stock drops the cached availability."""
+        from .availability import get_available_quantities
+        
+        product = self.products[2]
+        get_available_quantities([product.id])
+        
+        product.reserve(2)
+        
+        self.assertEqual(get_available_quantities([product.id]), {product.id: 0})
+    
+    def test_availability_endpoint(self):
+        """Test the public bulk availability endpoint."""
+        from rest_framework.test import APIClient
+        
+        ids = ','.join(str(product.id) for product in self.products)
+        response = APIClient().get(f'/api/products/products/availability/?ids={ids}')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[str(self.products[1].id)], 1)
+
+
+class TestProductAffinity(TestCase):
+    """Test the incremental co-occurrence build and the related products endpoint."""
+    
+    def setUp(self):
+        """Set up products and a customer."""
+        from decimal import Decimal
+        from django.contrib.auth import get_user_model
+        from .models import Category, Product
+        
+        self.customer = get_user_model().objects.create_user(
+            username='customer', email='customer@example.com', password='testpass123'
+        )
+        bread = Category.objects.create(name='Bread', slug='bread')
+        pasta = Category.objects.create(name='Pasta', slug='pasta')
+        
+        def product(name, category, **flags):
+            return Product.objects.create(
+                name=name,
+                slug=name.lower(),
+                description='Test description',
+                price=Decimal('100.00'),
+                category=category,
+                stock_quantity=10,
+                **flags
+            )
+        
+        self.bread = product('Bread', bread, is_gluten_free=True)
+        self.butter = product('Butter', pasta)
+        self.jam = product('Jam', pasta)
+        self.rolls = product('Rolls', bread)
+        self.noodles = product('Noodles', pasta, is_gluten_free=True)
+        self.orders = 0
+    
+    def _order(self, *products, status='pending'):
+        from datetime import timedelta
+        from decimal import Decimal
+        from django.utils import timezone
+        from orders.models import Order, OrderItem
+        
+        self.orders += 1
+        order = Order.objects.create(
+            user=self.customer,
+            order_number=f'ORD-AFF-{self.orders}',
+            total_amount=Decimal('100.00'),
+            shipping_address='Test Address',
+            status=status
+        )
+        Order.objects.filter(id=order.id).update(created_at=timezone.now() - timedelta(hours=1))
+        for item in products:
+            OrderItem.objects.create(order=order, product=item, quantity=1, price=Decimal('100.00'))
+        return order
+    
+    def test_count_baskets(self):
+        """Test upper-triangle pair counts with single-product support on the diagonal."""
+        from .affinity import count_baskets
+        
+        counts = count_baskets([{3, 1}, {1, 2, 3}])
+        self.assertEqual(counts[(1, 3)], 2)
+        self.assertEqual(counts[(1, 1)], 2)
+        self.assertEqual(counts[(2, 3)], 1)
+        self.assertNotIn((3, 1), counts)
+    
+    def test_incremental_build(self):
+        """Test scores, and that a second run only counts new orders."""
+        from .affinity import update_affinity
+        from .models import AffinityBuildState, ProductAffinity
+        
+        self._order(self.bread, self.butter)
+        self._order(self.bread, self.butter, self.jam)
+        self._order(self.bread, self.jam)
+        self._order(self.bread, self.jam, status='cancelled')
+        
+        self.assertEqual(update_affinity(), (3, 3))
+        top = list(ProductAffinity.objects.filter(product=self.bread))
+        self.assertEqual([row.related_id for row in top], [self.butter.id, self.jam.id])
+        self.assertAlmostEqual(top[0].confidence, 2 / 3, places=3)
+        self.assertAlmostEqual(top[0].lift, 1.0, places=3)
+        self.assertEqual(ProductAffinity.objects.get(product=self.butter).related_id, self.bread.id)
+        
+        self.assertEqual(update_affinity(), (0, 0))
+        
+        self._order(self.bread, self.jam)
+        self.assertEqual(update_affinity(), (1, 2))
+        self.assertEqual(AffinityBuildState.objects.get().total_orders, 4)
+        self.assertEqual(
+            list(ProductAffinity.objects.filter(product=self.bread).values_list('related_id', flat=True)),
+            [self.jam.id, self.butter.id]
+        )
+    
+    def test_related_endpoint_with_fallback(self):
+        """Test affinity results first, then same-category/dietary products, served from cache."""
+        from rest_framework.test import APIClient
+        from .affinity import update_affinity
+        
+        self._order(self.bread, self.butter)
+        self._order(self.bread, self.butter)
+        update_affinity()
+        
+        client = APIClient()
+        response = client.get(f'/api/products/products/{self.bread.slug}/related/')
+        self.assertEqual(response.status_code, 200)
+        ids = [item['id'] for item in response.json()]
+        # butter — по истории, rolls — та же категория, noodles — тот же флаг
+        self.assertEqual(ids[:3], [self.butter.id, self.rolls.id, self.noodles.id])
+        self.assertNotIn(self.bread.id, ids)
+        
+        self.butter.is_active = False
+        self.butter.save()
+        response = client.get(f'/api/products/products/{self.bread.slug}/related/')
+        self.assertNotIn(self.butter.id, [item['id'] for item in response.json()])
+
+
 @pytest.mark.property_tests
 class TestProductsProperties:
     """Property-based tests for products functionality."""
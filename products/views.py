@@ -19,6 +19,8 @@ from .serializers import (
 )
 from .permissions import IsAdminOrManagerOrReadOnly, IsAdminOrManager
 from .filters import ProductFilter
+from .availability import get_available_quantities
+from .affinity import related_product_ids
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -306,6 +308,24 @@ class ProductViewSet(viewsets.ModelViewSet):
             'product': serializer.data
         })
     
+    @action(detail=True, methods=['get'])
+    def related(self, request, slug=None):
+        """"Frequently bought together" products, topped up with similar ones."""
+        product = self.get_object()
+        ids = related_product_ids(product)
+        
+        products = {
+            item.id: item
+            for item in Product.objects.filter(id__in=ids, is_active=True)
+            .select_related('category').prefetch_related('images')
+        }
+        serializer = ProductListSerializer(
+            [products[product_id] for product_id in ids if product_id in products],
+            many=True,
+            context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+    
     @action(detail=False, methods=['get'])
     def manufacturers(self, request):
         """Get list of unique manufacturers."""
@@ -318,6 +338,25 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         return Response(list(manufacturers))
     
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        """Get live stock for a list of product ids (?ids=1,2,3) from the short-TTL cache."""
+        raw_ids = request.query_params.get('ids', '')
+        try:
+            product_ids = [int(value) for value in raw_ids.split(',') if value.strip()]
+        except ValueError:
+            return Response({'error': 'ids must be a comma-separated list of integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        if len(product_ids) > 200:
+            return Response({'error': 'Too many ids (max 200)'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        availability = get_available_quantities(product_ids)
+        return Response({
+            str(product_id): available for product_id, available in availability.items()
+        })
+    
     @action(detail=False, methods=['get'])
     def search(self, request):
         """Enhanced search endpoint with detailed filtering."""